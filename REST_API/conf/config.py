@@ -3,6 +3,15 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     sqlalchemy_database_url: str
+    sqlalchemy_async_database_url: str | None = None
+    database_async: bool = False
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = -1
+    db_pool_pre_ping: bool = True
+    db_write_returning: bool = True
+    metrics_token: str | None = None
     secret_key: str
     algorithm: str
     mail_username: str
@@ -10,8 +19,54 @@ class Settings(BaseSettings):
     mail_from: str
     mail_port: int
     mail_server: str
+    mail_from_name: str = "Desired Name"
+    mail_starttls: bool = False
+    mail_ssl_tls: bool = True
+    mail_use_credentials: bool = True
+    mail_validate_certs: bool = True
+    mail_timeout: float = 30
+    mail_pool_size: int = 2
+    mail_batch_size: int = 50
+    mail_max_attempts: int = 5
+    mail_retry_delay: float = 30
     redis_host: str = 'localhost'
     redis_port: int = 6379
+    user_cache_size: int = 1024
+    user_cache_ttl: float = 30
+    user_cache_redis_ttl: int = 300
+    access_token_ttl: int = 900
+    refresh_token_ttl: int = 7 * 24 * 3600
+    auth_max_sessions: int = 10
+    token_cache_size: int = 10000
+    token_revocations_size: int = 100000
+    password_hash_workers: int = 4
+    password_hash_max_queue: int = 64
+    birthdays_window_days: int = 7
+    contacts_cache_ttl: int = 60
+    search_cache_ttl: int = 30
+    birthdays_cache_ttl: int = 300
+    import_chunk_size: int = 500
+    import_max_errors: int = 1000
+    batch_max_operations: int = 500
+    export_batch_size: int = 1000
+    contact_changes_retention: int = 10000
+    rate_limit_lease: float = 0.1
+    rate_limit_lease_ttl: float = 5
+    rate_limit_max_leases: int = 10000
+    events_max_connections: int = 10000
+    events_queue_size: int = 64
+    events_heartbeat: float = 15
+    avatar_storage: str = "cloudinary"
+    avatar_max_bytes: int = 5 * 1024 * 1024
+    avatar_chunk_size: int = 64 * 1024
+    avatar_local_dir: str = "media/avatars"
+    avatar_sizes: list[int] = [64, 128, 256]
+    avatar_formats: list[str] = ["webp", "jpeg"]
+    avatar_quality: int = 85
+    avatar_max_pixels: int = 40_000_000
+    avatar_workers: int = 2
+    avatar_max_queue: int = 16
+    avatar_base_url: str = "/media/avatars"
     cloudinary_name: str
     cloudinary_api_key: str
     cloudinary_api_secret: str
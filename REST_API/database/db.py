@@ -1,18 +1,119 @@
+from inspect import isawaitable
+
+import anyio
+from starlette.concurrency import run_in_threadpool
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from ..conf.config import settings
+from .pool import pool_options
+
+# Async drivers used when the application runs in async database mode
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def make_async_url(url: str) -> str:
+    """
+    Converts a synchronous database URL into its async-driver equivalent.
+
+    :param url: The synchronous database URL.
+    :type url: str
+    :return: The same URL using the async driver for its backend.
+    :rtype: str
+    """
+    sa_url = make_url(url)
+    drivername = ASYNC_DRIVERS.get(sa_url.get_backend_name())
+    if drivername is None:
+        raise ValueError(f"No async driver configured for '{sa_url.get_backend_name()}'")
+    return sa_url.set(drivername=drivername).render_as_string(hide_password=False)
+
 
 DATABASE_URL = settings.sqlalchemy_database_url
 
 engine = create_engine(
-    DATABASE_URL
+    DATABASE_URL, **pool_options(DATABASE_URL)
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+if settings.database_async:
+    ASYNC_DATABASE_URL = settings.sqlalchemy_async_database_url or make_async_url(DATABASE_URL)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL, is_async=True))
+    # Objects must stay readable after commit: lazy loads are not possible on an AsyncSession
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+else:
+    ASYNC_DATABASE_URL = None
+    async_engine = None
+    AsyncSessionLocal = None
+
+
+async def maybe_await(value):
+    """
+    Awaits the result of a session call when the session is asynchronous.
+
+    Repositories call ``db.execute``, ``db.commit`` and friends through this helper so the
+    same code works with both ``Session`` and ``AsyncSession``.
+
+    :param value: The value returned by a session method.
+    :return: The resolved value.
+    """
+    if isawaitable(value):
+        return await value
+    return value
+
+
+def supports_returning(db, kind: str) -> bool:
+    """
+    Tells whether writes should fetch their result with ``RETURNING`` instead of a refresh.
+
+    :param db: The database session.
+    :param kind: The statement kind, ``insert`` or ``update``.
+    :type kind: str
+    :return: True if enabled in the settings and supported by the database (SQLite 3.35+, PostgreSQL).
+    :rtype: bool
+    """
+    return settings.db_write_returning and getattr(db.get_bind().dialect, f"{kind}_returning", False) is True
+
+
+def get_session_factory():
+    """
+    Dependency returning the factory of new sessions.
+
+    Streaming responses produce their body after the ``get_db`` dependency has closed its
+    session, so they open a session of their own and close it with :func:`close_session`.
+
+    :return: The ``async_sessionmaker`` in async database mode, the ``sessionmaker`` otherwise.
+    """
+    return AsyncSessionLocal if AsyncSessionLocal is not None else SessionLocal
+
+
+async def close_session(db) -> None:
+    """
+    Closes a ``Session`` or ``AsyncSession``, the former on the thread pool.
+
+    Used by streaming responses once their body is done. The close is shielded, so it
+    completes even when the response is cancelled by a client disconnect.
+
+    :param db: The database session.
+    """
+    with anyio.CancelScope(shield=True):
+        if isinstance(db, AsyncSession):
+            await db.close()
+        else:
+            await run_in_threadpool(db.close)
+
 
 # Dependency
-def get_db():
+async def get_db():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
     db = SessionLocal()
     try:
         yield db
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Boolean
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, Index, PrimaryKeyConstraint, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.schema import ForeignKey
@@ -15,12 +15,48 @@ class Contact(Base):
     email = Column(String, nullable=False, unique=True)
     phone_number = Column(String, nullable=False)
     birthday = Column(Date, nullable=False)
+    # month * 100 + day of the birthday, maintained by the repository
+    birthday_ordinal = Column(Integer, nullable=True)
     additional_info = Column(String, nullable=True)
+    # Normalized "first last email" text, indexed by the search engine
+    search_text = Column(String, nullable=True)
 
     user_id = Column(Integer, ForeignKey('users.id'))
+    # Bumped on every update, used for ETags
+    version = Column(Integer, nullable=False, default=1, server_default='1')
 
     owner = relationship("User", back_populates="contacts")
 
+    __table_args__ = (
+        # Per-user listing and keyset pagination ordered by id
+        Index('ix_contacts_user_id_id', 'user_id', 'id'),
+        # Keyset pagination ordered by last name
+        Index('ix_contacts_user_id_last_name_id', 'user_id', 'last_name', 'id'),
+        # Upcoming birthdays lookup
+        Index('ix_contacts_user_id_birthday_ordinal', 'user_id', 'birthday_ordinal'),
+    )
+
+
+class ContactChange(Base):
+    """
+    Append-only log of contact writes, read by clients syncing incrementally.
+
+    Deleted contacts keep their ``delete`` entry as a tombstone. Sequence numbers are per
+    user and taken from ``User.contacts_version``, so they follow the commit order.
+    """
+    __tablename__ = 'contact_changes'
+
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    seq = Column(Integer, nullable=False, autoincrement=False)
+    # Not a foreign key: the entry outlives the contact
+    contact_id = Column(Integer, nullable=False)
+    op = Column(String(6), nullable=False)
+    changed_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        PrimaryKeyConstraint('user_id', 'seq', name='contact_changes_pkey'),
+    )
+
 
 class User(Base):
     __tablename__ = 'users'
@@ -29,7 +65,11 @@ class User(Base):
     email = Column(String(250), nullable=False, unique=True)
     password = Column(String(255), nullable=False)
 
-    refresh_token = Column(String(255), nullable=True)
+    avatar = Column(String(255), nullable=True)
+    # SHA-256 of the uploaded avatar, its variants are stored under this name
+    avatar_hash = Column(String(64), nullable=True)
 
     contacts = relationship("Contact", back_populates="owner")
     confirmed = Column(Boolean, default=False)
+    # Bumped on every change to the user's contacts, used for collection ETags
+    contacts_version = Column(Integer, nullable=False, default=0, server_default='0')
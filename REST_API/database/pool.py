@@ -0,0 +1,156 @@
+import threading
+import time
+from bisect import bisect_left
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from ..conf.config import settings
+
+
+class PoolMetrics:
+    """
+    Collects connection checkout telemetry for a single connection pool.
+    """
+    # Upper bounds (in seconds) of the checkout latency histogram buckets
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.buckets = [0] * (len(self.BUCKETS) + 1)
+        self.checkouts = 0
+        self.checkout_seconds = 0.0
+        self.waits = 0
+        self.timeouts = 0
+
+    def observe(self, seconds: float, waited: bool, timed_out: bool = False) -> None:
+        """
+        Records a single checkout attempt.
+
+        :param seconds: The time spent obtaining the connection.
+        :type seconds: float
+        :param waited: Whether the pool was exhausted when the checkout started.
+        :type waited: bool
+        :param timed_out: Whether the checkout failed with a pool timeout.
+        :type timed_out: bool
+        """
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.checkout_seconds += seconds
+                self.buckets[bisect_left(self.BUCKETS, seconds)] += 1
+            if waited:
+                self.waits += 1
+
+    def histogram(self) -> dict:
+        """
+        Returns the cumulative checkout latency histogram keyed by bucket upper bound.
+
+        :return: Bucket upper bound (``"+Inf"`` for the last bucket) to cumulative count.
+        :rtype: dict
+        """
+        result, total = {}, 0
+        for bound, count in zip(self.BUCKETS + ("+Inf",), self.buckets):
+            total += count
+            result[str(bound)] = total
+        return result
+
+
+class InstrumentedPoolMixin:
+    """
+    Times every connection checkout of a queue pool and records it in ``self.metrics``.
+
+    The public ``connect`` is timed rather than ``_do_get``, which calls itself again on
+    its overflow and retry paths and would count a single checkout several times.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _will_wait(self) -> bool:
+        return (self._max_overflow > -1 and self.checkedin() == 0
+                and self.overflow() >= self._max_overflow)
+
+    def connect(self):
+        waited = self._will_wait()
+        start = time.perf_counter()
+        try:
+            conn = super().connect()
+        except exc.TimeoutError:
+            self.metrics.observe(time.perf_counter() - start, waited, timed_out=True)
+            raise
+        self.metrics.observe(time.perf_counter() - start, waited)
+        return conn
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_options(url: str, is_async: bool = False) -> dict:
+    """
+    Builds the connection pool keyword arguments for ``create_engine`` from the settings.
+
+    SQLite keeps the pool SQLAlchemy picks for it; only pre-ping and recycle apply there.
+
+    :param url: The database URL the engine is created for.
+    :type url: str
+    :param is_async: Whether the engine is created with ``create_async_engine``.
+    :type is_async: bool
+    :return: Keyword arguments for the engine factory.
+    :rtype: dict
+    """
+    options = {
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+    if make_url(url).get_backend_name() == "sqlite":
+        return options
+    options.update(
+        poolclass=InstrumentedAsyncAdaptedQueuePool if is_async else InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+    )
+    return options
+
+
+def pool_stats(pool) -> dict:
+    """
+    Returns the current gauges and, for instrumented pools, the checkout telemetry of a pool.
+
+    :param pool: The SQLAlchemy connection pool.
+    :return: The pool statistics.
+    :rtype: dict
+    """
+    stats = {"pool": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            in_use=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+        )
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        stats.update(
+            checkouts=metrics.checkouts,
+            checkout_seconds_sum=metrics.checkout_seconds,
+            checkout_seconds_histogram=metrics.histogram(),
+            waits=metrics.waits,
+            timeouts=metrics.timeouts,
+        )
+    return stats
@@ -0,0 +1,118 @@
+import re
+import unicodedata
+from typing import List
+
+from sqlalchemy import DDL, column, event, table
+
+from .models import Contact
+
+# External-content FTS5 index over contacts.search_text, kept in sync by triggers
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+    "search_text, content='contacts', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE OF search_text ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+    "INSERT INTO contacts_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+]
+SQLITE_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS contacts_fts_au",
+    "DROP TRIGGER IF EXISTS contacts_fts_ad",
+    "DROP TRIGGER IF EXISTS contacts_fts_ai",
+    "DROP TABLE IF EXISTS contacts_fts",
+]
+
+# Trigram GIN index, usable by the regular expressions of word_prefix_pattern() and similarity()
+POSTGRES_TRGM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_contacts_search_text_trgm ON contacts USING gin (search_text gin_trgm_ops)",
+]
+POSTGRES_TRGM_DROP = [
+    "DROP INDEX IF EXISTS ix_contacts_search_text_trgm",
+]
+
+contacts_fts = table("contacts_fts", column("rowid"), column("rank"))
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def normalize(text: str | None) -> str:
+    """
+    Normalizes text for searching: strips accents, case-folds and collapses whitespace.
+
+    :param text: The text to normalize.
+    :type text: str | None
+    :return: The normalized text.
+    :rtype: str
+    """
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
+
+
+def search_text(first_name: str | None, last_name: str | None, email: str | None) -> str:
+    """
+    Builds the value of the ``contacts.search_text`` column.
+
+    :param first_name: The contact's first name.
+    :type first_name: str | None
+    :param last_name: The contact's last name.
+    :type last_name: str | None
+    :param email: The contact's email.
+    :type email: str | None
+    :return: The normalized searchable text.
+    :rtype: str
+    """
+    return normalize(" ".join(part for part in (first_name, last_name, email) if part))
+
+
+def tokenize(query: str | None) -> List[str]:
+    """
+    Splits a search query into normalized word tokens.
+
+    :param query: The search query.
+    :type query: str | None
+    :return: The query tokens.
+    :rtype: List[str]
+    """
+    return _TOKEN_RE.findall(normalize(query))
+
+
+def fts_match_expression(tokens: List[str]) -> str:
+    """
+    Builds an FTS5 MATCH expression requiring every token as a word prefix.
+
+    :param tokens: The query tokens.
+    :type tokens: List[str]
+    :return: The MATCH expression.
+    :rtype: str
+    """
+    return " ".join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+
+
+def word_prefix_pattern(token: str) -> str:
+    """
+    Builds a POSIX regular expression matching a token at the start of a word.
+
+    Words are runs of letters and digits, as in the FTS5 ``unicode61`` tokenizer, so the
+    pattern matches the same contacts as the token's FTS5 prefix query.
+
+    :param token: A query token.
+    :type token: str
+    :return: The regular expression.
+    :rtype: str
+    """
+    return "(^|[^[:alnum:]])" + re.sub(r"(\W)", r"\\\1", token)
+
+
+for statement in SQLITE_FTS_DDL:
+    event.listen(Contact.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in SQLITE_FTS_DROP:
+    event.listen(Contact.__table__, "before_drop", DDL(statement).execute_if(dialect="sqlite"))
+for statement in POSTGRES_TRGM_DDL:
+    event.listen(Contact.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
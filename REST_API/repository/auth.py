@@ -1,8 +1,11 @@
 from libgravatar import Gravatar
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
 
+from REST_API.database.db import maybe_await, supports_returning
 from REST_API.database.models import User
 from REST_API.schemas import UserModel
+from REST_API.services.cache import user_cache
 
 
 async def get_user_by_email(email: str, db: Session) -> User:
@@ -16,7 +19,8 @@ async def get_user_by_email(email: str, db: Session) -> User:
     :return: The user with the specified email.
     :rtype: User
     """
-    return db.query(User).filter(User.email == email).first()
+    result = await maybe_await(db.execute(select(User).filter(User.email == email)))
+    return result.scalars().first()
 
 
 async def create_user(body: UserModel, db: Session) -> User:
@@ -34,27 +38,19 @@ async def create_user(body: UserModel, db: Session) -> User:
         g = Gravatar(body.email)
     except Exception as e:
         print(e)
+    if supports_returning(db, "insert"):
+        stmt = insert(User).values(**body.dict()).returning(*User.__table__.columns)
+        row = (await maybe_await(db.execute(stmt))).one()
+        await maybe_await(db.commit())
+        # Detached copy: nothing is left to expire or lazy-load after the commit
+        return User(**row._asdict())
     new_user = User(**body.dict())
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await maybe_await(db.commit())
+    await maybe_await(db.refresh(new_user))
     return new_user
 
 
-async def update_token(user: User, token: str | None, db: Session) -> None:
-    """
-    Updates the refresh token for a user.
-
-    :param user: The user whose token is being updated.
-    :type user: User
-    :param token: The new refresh token.
-    :type token: str | None
-    :param db: The database session.
-    :type db: Session
-    """
-    user.refresh_token = token
-    db.commit()
-
 async def confirmed_email(email: str, db: Session) -> None:
     """
     Confirms the email address of a user.
@@ -66,9 +62,10 @@ async def confirmed_email(email: str, db: Session) -> None:
     """
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    db.commit()
+    await maybe_await(db.commit())
+    await user_cache.invalidate(email)
 
-async def update_avatar(email, url: str, db: Session) -> User:
+async def update_avatar(email, url: str, db: Session, digest: str | None = None) -> User:
     """
     Updates the avatar URL for a user.
 
@@ -78,10 +75,14 @@ async def update_avatar(email, url: str, db: Session) -> User:
     :type url: str
     :param db: The database session.
     :type db: Session
+    :param digest: The content hash of the avatar image.
+    :type digest: str | None
     :return: The updated user.
     :rtype: User
     """
     user = await get_user_by_email(email, db)
     user.avatar = url
-    db.commit()
+    user.avatar_hash = digest
+    await maybe_await(db.commit())
+    await user_cache.invalidate(email)
     return user
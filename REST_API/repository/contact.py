@@ -1,10 +1,51 @@
-from typing import List
+import base64
+import json
+from datetime import date, timedelta
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
 from sqlalchemy.orm import Session
-from ..database.models import Contact,User
-from ..schemas import ContactCreate, ContactUpdate
-from sqlalchemy import and_
+from ..database.db import maybe_await, supports_returning
+from ..database.models import Contact, ContactChange, User
+from ..database import search
+from ..schemas import ContactBatchOperation, ContactCreate, ContactUpdate
+from ..conf.config import settings
+from sqlalchemy import and_, bindparam, case, delete, func, insert, literal_column, or_, select, tuple_, update
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 
-def get_contacts(user: User,db: Session, skip: int = 0, limit: int = 100)-> List[Contact]:
+# Columns of the contact responses; list queries return these as rows instead of ORM objects
+CONTACT_COLUMNS = (
+    Contact.id, Contact.first_name, Contact.last_name, Contact.email,
+    Contact.phone_number, Contact.birthday, Contact.additional_info,
+)
+CONTACT_FIELDS = tuple(column.key for column in CONTACT_COLUMNS)
+
+# Keyset orderings: name -> sort key columns, always ending with the unique id
+KEYSET_ORDERINGS = {
+    "id": (Contact.id,),
+    "last_name": (Contact.last_name, Contact.id),
+}
+
+def contact_columns(fields: Sequence[str] | None = None) -> tuple:
+    """
+    Selects the contact columns of a projection, in :data:`CONTACT_COLUMNS` order.
+
+    :param fields: The requested field names, or None for every column. ``id`` is always included.
+    :type fields: Sequence[str] | None
+    :return: The columns to select.
+    :rtype: tuple
+    :raises ValueError: If a field name is unknown.
+    """
+    if fields is None:
+        return CONTACT_COLUMNS
+    unknown = set(fields) - set(CONTACT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(column for column in CONTACT_COLUMNS if column.key == "id" or column.key in fields)
+
+async def get_contacts(user: User,db: Session, skip: int = 0, limit: int = 100,
+                       fields: Sequence[str] | None = None)-> List[Row]:
     """
     Retrieves a list of contacts for the specified user with pagination.
 
@@ -16,24 +57,250 @@ def get_contacts(user: User,db: Session, skip: int = 0, limit: int = 100)-> List
     :type skip: int
     :param limit: The maximum number of contacts to return.
     :type limit: int
-    :return: A list of contacts.
-    :rtype: List[Contact]
+    :param fields: The fields to select, see :func:`contact_columns`.
+    :type fields: Sequence[str] | None
+    :return: A list of contact rows with the selected columns.
+    :rtype: List[Row]
+    """
+    stmt = select(*contact_columns(fields)).filter(Contact.user_id == user.id).order_by(Contact.id).offset(skip).limit(limit)
+    result = await maybe_await(db.execute(stmt))
+    return result.all()
+
+def birthday_ordinal(birthday: date | None) -> int | None:
+    """
+    Returns the month/day ordinal (``month * 100 + day``) used to index birthdays.
+
+    :param birthday: The birthday.
+    :type birthday: date | None
+    :return: The ordinal, e.g. 1231 for December 31st.
+    :rtype: int | None
+    """
+    if birthday is None:
+        return None
+    return birthday.month * 100 + birthday.day
+
+def _derived_values(values: dict) -> dict:
+    """
+    Computes the columns the repository maintains from a contact's own fields.
+
+    :param values: The contact's column values.
+    :type values: dict
+    :return: The derived column values.
+    :rtype: dict
+    """
+    return {
+        "search_text": search.search_text(values.get("first_name"), values.get("last_name"), values.get("email")),
+        "birthday_ordinal": birthday_ordinal(values.get("birthday")),
+    }
+
+def _contact_values(contact: Contact) -> dict:
+    return {column.key: getattr(contact, column.key) for column in Contact.__table__.columns}
+
+async def _contacts_changed(user: User, db: Session, changes: List[Tuple[str, int]]) -> None:
+    """
+    Bumps the user's collection version and records contact writes in the change log,
+    inside the transaction of the write.
+
+    The version update locks the user's row until the commit and the entries take the
+    sequence numbers up to the new version, so each user's log is numbered in commit
+    order. Entries older than the last ``contact_changes_retention`` are pruned.
+    """
+    stmt = update(User).filter(User.id == user.id).values(
+        contacts_version=User.contacts_version + len(changes)
+    ).execution_options(synchronize_session=False)
+    if supports_returning(db, "update"):
+        version = (await maybe_await(db.execute(stmt.returning(User.contacts_version)))).scalar_one()
+    else:
+        await maybe_await(db.execute(stmt))
+        version = await get_collection_version(user, db)
+    first = version - len(changes) + 1
+    await maybe_await(db.execute(insert(ContactChange), [
+        {"user_id": user.id, "seq": first + offset, "contact_id": contact_id, "op": op}
+        for offset, (op, contact_id) in enumerate(changes)
+    ]))
+    retention = settings.contact_changes_retention
+    if retention > 0 and version > retention:
+        await maybe_await(db.execute(
+            delete(ContactChange).filter(and_(ContactChange.user_id == user.id, ContactChange.seq <= version - retention))
+            .execution_options(synchronize_session=False)
+        ))
+
+async def get_collection_version(user: User, db: Session) -> int | None:
+    """
+    Retrieves the version of the user's contact collection, bumped on every contact write.
+
+    :param user: The user who owns the contacts.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :return: The collection version.
+    :rtype: int | None
+    """
+    result = await maybe_await(db.execute(select(User.contacts_version).filter(User.id == user.id)))
+    return result.scalar()
+
+async def get_contact_version(user: User, db: Session, contact_id: int) -> int | None:
+    """
+    Retrieves the version of a single contact without loading it.
+
+    :param user: The user who owns the contact.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :param contact_id: The ID of the contact.
+    :type contact_id: int
+    :return: The contact version, or None if not found.
+    :rtype: int | None
+    """
+    stmt = select(Contact.version).filter(and_(Contact.id == contact_id, Contact.user_id == user.id))
+    result = await maybe_await(db.execute(stmt))
+    return result.scalar()
+
+async def get_changes(user: User, db: Session, since: int = 0, limit: int = 1000) -> List[Row]:
+    """
+    Retrieves the user's change log entries after a sequence number, oldest first.
+
+    Each entry is joined with the current state of its contact; the contact columns are
+    None for delete entries and once the contact has been deleted.
+
+    :param user: The user whose changes are being retrieved.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :param since: The last sequence number the client has seen, 0 for the whole log.
+    :type since: int
+    :param limit: The maximum number of entries to return.
+    :type limit: int
+    :return: Rows with ``seq``, ``contact_id``, ``op``, ``changed_at`` and the contact columns but ``id``.
+    :rtype: List[Row]
+    """
+    stmt = select(
+        ContactChange.seq, ContactChange.contact_id, ContactChange.op, ContactChange.changed_at, *CONTACT_COLUMNS[1:]
+    ).outerjoin(Contact, and_(Contact.id == ContactChange.contact_id, Contact.user_id == ContactChange.user_id,
+                              ContactChange.op != 'delete')).filter(
+        and_(ContactChange.user_id == user.id, ContactChange.seq > since)
+    ).order_by(ContactChange.seq).limit(limit)
+    result = await maybe_await(db.execute(stmt))
+    return result.all()
+
+def encode_cursor(order_by: str, key: tuple) -> str:
+    """
+    Encodes the sort key of the last returned contact into an opaque cursor.
+
+    :param order_by: The name of the keyset ordering.
+    :type order_by: str
+    :param key: The sort key values of the last contact on the page.
+    :type key: tuple
+    :return: The URL-safe cursor.
+    :rtype: str
+    """
+    raw = json.dumps({"o": order_by, "k": list(key)}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def decode_cursor(cursor: str) -> Tuple[str, list]:
+    """
+    Decodes a cursor produced by :func:`encode_cursor`.
+
+    :param cursor: The opaque cursor.
+    :type cursor: str
+    :return: The ordering name and the sort key values.
+    :rtype: Tuple[str, list]
+    :raises ValueError: If the cursor is malformed.
     """
-    return db.query(Contact).filter(Contact.user_id == User.id).offset(skip).limit(limit).all()
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        order_by, key = data["o"], data["k"]
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError("Invalid cursor") from e
+    if order_by not in KEYSET_ORDERINGS or not isinstance(key, list) or len(key) != len(KEYSET_ORDERINGS[order_by]):
+        raise ValueError("Invalid cursor")
+    return order_by, key
 
-def get_contact(db: Session, contact_id: int):
+async def get_contacts_page(user: User, db: Session, cursor: str | None = None, limit: int = 100,
+                            order_by: str = "id") -> Tuple[List[Row], str | None]:
+    """
+    Retrieves a page of contacts using keyset pagination.
+
+    Each page continues right after the sort key stored in the cursor, so the cost of a
+    page does not depend on how deep into the address book it is.
+
+    :param user: The user whose contacts are being retrieved.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :param cursor: The cursor returned with the previous page, or None for the first page.
+    :type cursor: str | None
+    :param limit: The maximum number of contacts to return.
+    :type limit: int
+    :param order_by: The ordering used for the first page; later pages keep the cursor's ordering.
+    :type order_by: str
+    :return: The contact rows on the page and the cursor of the next page (None on the last page).
+    :rtype: Tuple[List[Row], str | None]
+    :raises ValueError: If the cursor is malformed.
+    """
+    key = None
+    if cursor:
+        order_by, key = decode_cursor(cursor)
+    columns = KEYSET_ORDERINGS[order_by]
+    stmt = select(*CONTACT_COLUMNS).filter(Contact.user_id == user.id)
+    if key is not None:
+        stmt = stmt.filter(tuple_(*columns) > tuple_(*key))
+    stmt = stmt.order_by(*columns).limit(limit + 1)
+    result = await maybe_await(db.execute(stmt))
+    contacts = result.all()
+    next_cursor = None
+    if len(contacts) > limit:
+        contacts = contacts[:limit]
+        last = contacts[-1]
+        next_cursor = encode_cursor(order_by, tuple(getattr(last, column.key) for column in columns))
+    return contacts, next_cursor
+
+async def stream_contacts(user: User, db: Session, batch_size: int = 1000) -> AsyncIterator[list]:
+    """
+    Streams all contacts of the specified user in batches, without loading them all at once.
+
+    Rows are fetched through a server-side cursor (``yield_per``) as plain column
+    mappings, so memory use is bounded by ``batch_size`` whatever the address book size.
+    With a synchronous ``Session`` every fetch runs on the thread pool, so a long export
+    does not block the event loop.
+
+    :param user: The user whose contacts are being exported.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :param batch_size: The number of rows fetched per round trip.
+    :type batch_size: int
+    :return: An async iterator of lists of row mappings.
+    :rtype: AsyncIterator[list]
+    """
+    stmt = select(*CONTACT_COLUMNS).filter(Contact.user_id == user.id).order_by(Contact.id)
+    stmt = stmt.execution_options(yield_per=batch_size)
+    if isinstance(db, AsyncSession):
+        result = await db.stream(stmt)
+        async for partition in result.mappings().partitions():
+            yield partition
+    else:
+        result = await run_in_threadpool(db.execute, stmt)
+        async for partition in iterate_in_threadpool(result.mappings().partitions()):
+            yield partition
+
+async def get_contact(user: User, db: Session, contact_id: int):
     """
     Retrieves a single contact with the specified ID.
 
+    :param user: The user who owns the contact.
+    :type user: User
     :param db: The database session.
     :type db: Session
     :param contact_id: The ID of the contact to retrieve.
     :type contact_id: int
     :return: The contact with the specified ID, or None if not found.
     """
-    return db.query(Contact).and_filter(Contact.id == contact_id,Contact.user_id == User.id).first()
+    stmt = select(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id))
+    result = await maybe_await(db.execute(stmt))
+    return result.scalars().first()
 
-def create_contact(user: User,db: Session, contact: ContactCreate):
+async def create_contact(user: User,db: Session, contact: ContactCreate):
     """
     Creates a new contact for the specified user.
 
@@ -43,17 +310,26 @@ def create_contact(user: User,db: Session, contact: ContactCreate):
     :type db: Session
     :param contact: The data for the new contact.
     :type contact: ContactCreate
-    :return: The newly created contact.
+    :return: The newly created contact, as a row of the :data:`CONTACT_COLUMNS` when written with ``RETURNING``.
     """
+    values = contact.dict()
+    if supports_returning(db, "insert"):
+        stmt = insert(Contact).values(**values, **_derived_values(values), user_id=user.id).returning(*CONTACT_COLUMNS)
+        row = (await maybe_await(db.execute(stmt))).one()
+        await _contacts_changed(user, db, [("create", row.id)])
+        await maybe_await(db.commit())
+        return row
     db_contact = Contact(
-        **contact.dict(), user_id = user.id
+        **values, **_derived_values(values), user_id = user.id
     )
     db.add(db_contact)
-    db.commit()
-    db.refresh(db_contact)
+    await maybe_await(db.flush())
+    await _contacts_changed(user, db, [("create", db_contact.id)])
+    await maybe_await(db.commit())
+    await maybe_await(db.refresh(db_contact))
     return db_contact
 
-def update_contact(user: User, db: Session, contact_id: int, contact: ContactUpdate):
+async def update_contact(user: User, db: Session, contact_id: int, contact: ContactUpdate):
     """
     Updates an existing contact for the specified user.
 
@@ -65,18 +341,197 @@ def update_contact(user: User, db: Session, contact_id: int, contact: ContactUpd
     :type contact_id: int
     :param contact: The updated data for the contact.
     :type contact: ContactUpdate
-    :return: The updated contact, or None if not found.
+    :return: The updated contact (a row of the :data:`CONTACT_COLUMNS` when written with ``RETURNING``),
+        or None if not found.
     """
-    db_contact = db.query(Contact).filter(and_(Contact.id == contact_id,Contact.user_id == user.id)).first()
+    if supports_returning(db, "update"):
+        values = contact.dict(exclude_unset=True)
+        stmt = update(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).values(
+            **values, **_derived_values(values), version=Contact.version + 1
+        ).returning(*CONTACT_COLUMNS).execution_options(synchronize_session=False)
+        row = (await maybe_await(db.execute(stmt))).first()
+        if row is None:
+            return None
+        await _contacts_changed(user, db, [("update", contact_id)])
+        await maybe_await(db.commit())
+        return row
+    db_contact = await get_contact(user, db, contact_id)
     if db_contact is None:
         return None
     for key, value in contact.dict(exclude_unset=True).items():
         setattr(db_contact, key, value)
-    db.commit()
-    db.refresh(db_contact)
+    for key, value in _derived_values(_contact_values(db_contact)).items():
+        setattr(db_contact, key, value)
+    db_contact.version = Contact.version + 1
+    await _contacts_changed(user, db, [("update", contact_id)])
+    await maybe_await(db.commit())
+    await maybe_await(db.refresh(db_contact))
     return db_contact
 
-def delete_contact(user: User,db: Session, contact_id: int):
+async def _insert_contacts(db: Session, rows: List[dict]) -> List[int]:
+    """
+    Inserts contact rows with one batched INSERT and returns their ids in row order.
+    """
+    if supports_returning(db, "insert"):
+        stmt = insert(Contact).returning(Contact.id, sort_by_parameter_order=True)
+        return (await maybe_await(db.execute(stmt, rows))).scalars().all()
+    await maybe_await(db.execute(insert(Contact), rows))
+    # Emails are unique, so they map the new rows back to their ids
+    stmt = select(Contact.email, Contact.id).filter(Contact.email.in_([row["email"] for row in rows]))
+    ids = dict((await maybe_await(db.execute(stmt))).all())
+    return [ids[row["email"]] for row in rows]
+
+async def create_contacts(user: User, db: Session, contacts: List[ContactCreate]) -> List[Optional[str]]:
+    """
+    Creates many contacts for the specified user with a single batched INSERT.
+
+    Contacts whose email is already taken (in the database or earlier in the batch) are
+    skipped and reported instead of aborting the batch. If the batched insert still hits
+    a constraint violation, the rows are retried one by one.
+
+    :param user: The user for whom the contacts are being created.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :param contacts: The data for the new contacts.
+    :type contacts: List[ContactCreate]
+    :return: For every contact, None if it was created or the reason it was not.
+    :rtype: List[Optional[str]]
+    """
+    errors: List[Optional[str]] = [None] * len(contacts)
+    emails = [contact.email for contact in contacts]
+    result = await maybe_await(db.execute(select(Contact.email).filter(Contact.email.in_(set(emails)))))
+    taken = set(result.scalars().all())
+    rows, positions = [], []
+    for position, contact in enumerate(contacts):
+        if contact.email in taken:
+            errors[position] = "Contact with this email already exists"
+            continue
+        taken.add(contact.email)
+        values = contact.dict()
+        rows.append({**values, **_derived_values(values), "user_id": user.id})
+        positions.append(position)
+    if not rows:
+        return errors
+    try:
+        ids = await _insert_contacts(db, rows)
+        await _contacts_changed(user, db, [("create", contact_id) for contact_id in ids])
+        await maybe_await(db.commit())
+    except IntegrityError:
+        await maybe_await(db.rollback())
+        for position, row in zip(positions, rows):
+            try:
+                ids = await _insert_contacts(db, [row])
+                await _contacts_changed(user, db, [("create", ids[0])])
+                await maybe_await(db.commit())
+            except IntegrityError:
+                await maybe_await(db.rollback())
+                errors[position] = "Contact with this email already exists"
+    return errors
+
+_contacts = Contact.__table__
+_BATCH_UPDATE_FIELDS = CONTACT_FIELDS[1:] + ("search_text", "birthday_ordinal")
+# Executed once with a parameter set per contact (executemany)
+_BATCH_UPDATE = update(_contacts).where(
+    and_(_contacts.c.id == bindparam("b_id"), _contacts.c.user_id == bindparam("b_user_id"))
+).values(version=_contacts.c.version + 1, **{name: bindparam(f"b_{name}") for name in _BATCH_UPDATE_FIELDS})
+
+async def apply_contact_batch(user: User, db: Session, operations: List[ContactBatchOperation]) -> List[dict]:
+    """
+    Applies a batch of create, update and delete operations in a single transaction.
+
+    Ownership and email conflicts are checked with one query each, then the batch runs as
+    one ``DELETE ... WHERE id IN``, one executemany ``UPDATE`` by id and one batched
+    ``INSERT``. Operations that fail a check are reported and skipped; the others are
+    committed together.
+
+    :param user: The user who owns the contacts.
+    :type user: User
+    :param db: The database session.
+    :type db: Session
+    :param operations: The operations to apply.
+    :type operations: List[ContactBatchOperation]
+    :return: For every operation its index, op, contact id, HTTP-like status and error detail.
+    :rtype: List[dict]
+    :raises IntegrityError: If a concurrent write makes the batch violate a constraint; nothing is committed.
+    """
+    results = [{"index": index, "op": operation.op, "id": operation.id, "status": None, "detail": None}
+               for index, operation in enumerate(operations)]
+
+    def fail(index: int, status: int, detail: str):
+        results[index].update(status=status, detail=detail)
+
+    ids = {operation.id for operation in operations if operation.op != "create"}
+    existing = set()
+    if ids:
+        stmt = select(Contact.id).filter(and_(Contact.user_id == user.id, Contact.id.in_(ids)))
+        existing = set((await maybe_await(db.execute(stmt))).scalars().all())
+    deletes, writes, seen = [], [], set()
+    for index, operation in enumerate(operations):
+        if operation.op == "create":
+            writes.append(index)
+        elif operation.id not in existing:
+            fail(index, 404, "Contact not found")
+        elif operation.id in seen:
+            fail(index, 409, "Contact is changed by an earlier operation")
+        else:
+            seen.add(operation.id)
+            (deletes if operation.op == "delete" else writes).append(index)
+
+    deleted_ids = {operations[index].id for index in deletes}
+    emails = {operations[index].contact.email for index in writes}
+    owners = {}
+    if emails:
+        result = await maybe_await(db.execute(select(Contact.email, Contact.id).filter(Contact.email.in_(emails))))
+        owners = {email: contact_id for email, contact_id in result.all() if contact_id not in deleted_ids}
+    updates, creates = [], []
+    for index in writes:
+        operation = operations[index]
+        owner = owners.get(operation.contact.email)
+        if owner is not None and owner != operation.id:
+            fail(index, 409, "Contact with this email already exists")
+            continue
+        owners[operation.contact.email] = operation.id if operation.op == "update" else -1 - index
+        (updates if operation.op == "update" else creates).append(index)
+
+    if not (deletes or updates or creates):
+        return results
+    try:
+        if deletes:
+            await maybe_await(db.execute(
+                delete(Contact).filter(and_(Contact.user_id == user.id, Contact.id.in_(deleted_ids)))
+                .execution_options(synchronize_session=False)
+            ))
+        if updates:
+            params = []
+            for index in updates:
+                values = operations[index].contact.dict()
+                values.update(_derived_values(values))
+                params.append({"b_id": operations[index].id, "b_user_id": user.id,
+                               **{f"b_{name}": values[name] for name in _BATCH_UPDATE_FIELDS}})
+            await maybe_await(db.execute(_BATCH_UPDATE, params))
+        created_ids = []
+        if creates:
+            rows = []
+            for index in creates:
+                values = operations[index].contact.dict()
+                rows.append({**values, **_derived_values(values), "user_id": user.id})
+            created_ids = await _insert_contacts(db, rows)
+        await _contacts_changed(user, db, [(operations[index].op, operations[index].id) for index in deletes + updates]
+                                + [("create", contact_id) for contact_id in created_ids])
+        await maybe_await(db.commit())
+    except IntegrityError:
+        await maybe_await(db.rollback())
+        raise
+    for index in deletes:
+        results[index]["status"] = 200
+    for index in updates:
+        results[index]["status"] = 200
+    for index, contact_id in zip(creates, created_ids):
+        results[index].update(id=contact_id, status=201)
+    return results
+
+async def delete_contact(user: User,db: Session, contact_id: int):
     """
     Deletes a contact for the specified user.
 
@@ -88,50 +543,96 @@ def delete_contact(user: User,db: Session, contact_id: int):
     :type contact_id: int
     :return: The deleted contact, or None if not found.
     """
-    db_contact = db.query(Contact).filter(and_(Contact.id == contact_id,Contact.user_id == user.id)).first()
+    db_contact = await get_contact(user, db, contact_id)
     if db_contact is None:
         return None
-    db.delete(db_contact)
-    db.commit()
+    await maybe_await(db.delete(db_contact))
+    await _contacts_changed(user, db, [("delete", contact_id)])
+    await maybe_await(db.commit())
     return db_contact
 
-def search_contacts(user: User,db: Session, query: str = None):
+async def search_contacts(user: User,db: Session, query: str = None, skip: int = 0, limit: int = 100,
+                          fields: Sequence[str] | None = None):
     """
     Searches contacts for the specified user by a given query.
 
+    Every word of the query must match the start of a word in the contact's first name,
+    last name or email: an FTS5 prefix query on SQLite, a word-start regular expression
+    over the pg_trgm index on PostgreSQL. Results are ranked by relevance: BM25 on
+    SQLite, trigram similarity on PostgreSQL.
+
     :param user: The user whose contacts are being searched.
     :type user: User
     :param db: The database session.
     :type db: Session
     :param query: The search query.
     :type query: str
-    :return: A list of contacts matching the query.
+    :param skip: The number of results to skip.
+    :type skip: int
+    :param limit: The maximum number of results to return.
+    :type limit: int
+    :param fields: The fields to select, see :func:`contact_columns`.
+    :type fields: Sequence[str] | None
+    :return: A list of contact rows matching the query.
     """
-    if not query:
-        return db.query(Contact).all()
+    tokens = search.tokenize(query)
+    dialect = db.get_bind().dialect.name
+    stmt = select(*contact_columns(fields)).filter(Contact.user_id == user.id)
+    if not tokens:
+        stmt = stmt.order_by(Contact.id)
+    elif dialect == "sqlite":
+        stmt = stmt.join(search.contacts_fts, search.contacts_fts.c.rowid == Contact.id).filter(
+            literal_column("contacts_fts").op("MATCH")(search.fts_match_expression(tokens))
+        ).order_by(search.contacts_fts.c.rank, Contact.id)
+    else:
+        for token in tokens:
+            stmt = stmt.filter(Contact.search_text.regexp_match(search.word_prefix_pattern(token)))
+        if dialect == "postgresql":
+            stmt = stmt.order_by(func.similarity(Contact.search_text, " ".join(tokens)).desc(), Contact.id)
+        else:
+            stmt = stmt.order_by(Contact.id)
+    result = await maybe_await(db.execute(stmt.offset(skip).limit(limit)))
+    return result.all()
 
-    search_query = f"%{query}%"
-    return db.query(Contact).filter(
-            (Contact.first_name.ilike(search_query) |
-            Contact.last_name.ilike(search_query) |
-            Contact.email.ilike(search_query)) &
-            (Contact.user_id == user.id)
-        ).all()
-
-def get_upcoming_birthdays(user: User,db: Session):
+async def get_upcoming_birthdays(user: User,db: Session, days: int | None = None, today: date | None = None,
+                                 fields: Sequence[str] | None = None):
     """
     Retrieves upcoming birthdays for the specified user.
 
+    Birthdays are matched on month and day through the indexed ``birthday_ordinal``
+    column, so the lookup is a range scan; windows crossing New Year's Eve are split
+    into two ranges. Results are ordered by the next occurrence of the birthday.
+
     :param user: The user whose contacts' birthdays are being checked.
     :type user: User
     :param db: The database session.
     :type db: Session
-    :return: A list of contacts with birthdays in the next week.
-    """
-    from datetime import date, timedelta
-    today = date.today()
-    next_week = today + timedelta(days=7)
-    return db.query(Contact).filter(
-        (Contact.birthday.between(today, next_week)) &
-        (Contact.user_id == user.id)
-    ).all()
+    :param days: The size of the window in days, defaults to the configured window.
+    :type days: int | None
+    :param today: The first day of the window, defaults to the current date.
+    :type today: date | None
+    :param fields: The fields to select, see :func:`contact_columns`.
+    :type fields: Sequence[str] | None
+    :return: A list of contact rows with birthdays within the window.
+    """
+    today = today or date.today()
+    days = settings.birthdays_window_days if days is None else days
+    start = birthday_ordinal(today)
+    stmt = select(*contact_columns(fields)).filter(Contact.user_id == user.id)
+    if days >= 365:
+        stmt = stmt.filter(Contact.birthday_ordinal.is_not(None))
+        wraps = True
+    else:
+        end_date = today + timedelta(days=days)
+        end = birthday_ordinal(end_date)
+        wraps = end_date.year != today.year
+        if wraps:
+            stmt = stmt.filter(or_(Contact.birthday_ordinal >= start, Contact.birthday_ordinal <= end))
+        else:
+            stmt = stmt.filter(Contact.birthday_ordinal.between(start, end))
+    if wraps:
+        stmt = stmt.order_by(case((Contact.birthday_ordinal >= start, 0), else_=1), Contact.birthday_ordinal, Contact.id)
+    else:
+        stmt = stmt.order_by(Contact.birthday_ordinal, Contact.id)
+    result = await maybe_await(db.execute(stmt))
+    return result.all()
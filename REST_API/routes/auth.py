@@ -1,11 +1,15 @@
+import uuid
+from datetime import datetime
 from typing import List
-from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request
+from fastapi import APIRouter, HTTPException, Depends, Response, status, Security, Request
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
+from redis.exceptions import RedisError
 from sqlalchemy.orm import Session
-from ..schemas import UserModel, UserResponse, TokenModel, RequestEmail
+from ..schemas import UserModel, UserResponse, TokenModel, RequestEmail, SessionModel
 from ..database.db import get_db
 from ..repository import auth as repository_users
 from ..services.auth import auth_service
+from ..services.sessions import session_store
 from ..services.email import send_email
 
 
@@ -13,6 +17,35 @@ router = APIRouter(prefix='/auth', tags=["auth"])
 security = HTTPBearer()
 
 
+async def issue_tokens(email: str, sid: str, refresh_jti: str) -> dict:
+    """
+    Creates the access and refresh tokens of a session.
+
+    :param email: The user's email.
+    :type email: str
+    :param sid: The session id.
+    :type sid: str
+    :param refresh_jti: The id of the refresh token, as stored in the session.
+    :type refresh_jti: str
+    :return: The tokens.
+    :rtype: dict
+    """
+    access_token = await auth_service.create_access_token(data={"sub": email, "sid": sid})
+    refresh_token = await auth_service.create_refresh_token(data={"sub": email, "sid": sid, "jti": refresh_jti})
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+def session_unavailable() -> HTTPException:
+    """
+    Returns the error for a request the session store could not serve.
+
+    :return: A 503 error.
+    :rtype: HTTPException
+    """
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                         detail="Could not reach the session store, try again later")
+
+
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def signup(body: UserModel, db: Session = Depends(get_db)):
     """
@@ -28,7 +61,7 @@ async def signup(body: UserModel, db: Session = Depends(get_db)):
     exist_user = await repository_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
     new_user = await repository_users.create_user(body, db)
     return {"user": new_user, "detail": "User successfully created"}
 
@@ -50,38 +83,93 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
-    if not auth_service.verify_password(body.password, user.password):
+    if not await auth_service.verify_password(body.password, user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
-    # Generate JWT
-    access_token = await auth_service.create_access_token(data={"sub": user.email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
-    await repository_users.update_token(user, refresh_token, db)
-    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+    # Every login opens a session of its own
+    refresh_jti = uuid.uuid4().hex
+    try:
+        sid = await session_store.create(user.email, refresh_jti)
+    except RedisError:
+        raise session_unavailable()
+    return await issue_tokens(user.email, sid, refresh_jti)
 
 
 @router.get('/refresh_token', response_model=TokenModel)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)):
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security)):
     """
     Refreshes the access token using the refresh token.
 
+    The refresh token is rotated: the one presented stops working. Presenting it again
+    ends the session, since only a copy of a stolen token would be reused.
+
     :param credentials: The HTTP authorization credentials.
     :type credentials: HTTPAuthorizationCredentials
-    :param db: The database session.
-    :type db: Session
     :return: The new access token and refresh token.
     :rtype: TokenModel
     """
-    token = credentials.credentials
-    email = await auth_service.decode_refresh_token(token)
-    user = await repository_users.get_user_by_email(email, db)
-    if user.refresh_token != token:
-        await repository_users.update_token(user, None, db)
+    claims = await auth_service.decode_refresh_token(credentials.credentials)
+    refresh_jti = uuid.uuid4().hex
+    try:
+        rotated = await session_store.rotate(claims["sub"], claims["sid"], claims["jti"], refresh_jti)
+    except RedisError:
+        raise session_unavailable()
+    if not rotated:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+    return await issue_tokens(claims["sub"], claims["sid"], refresh_jti)
 
-    access_token = await auth_service.create_access_token(data={"sub": email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": email})
-    await repository_users.update_token(user, refresh_token, db)
-    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+@router.post('/logout', status_code=status.HTTP_204_NO_CONTENT)
+async def logout(token: str = Depends(auth_service.oauth2_scheme)):
+    """
+    Ends the session of the access token: its refresh token and access tokens stop working.
+
+    :param token: The access token.
+    :type token: str
+    """
+    claims = auth_service.verify_access_token(token)
+    try:
+        if "sid" in claims:
+            await session_store.revoke(claims["sub"], claims["sid"])
+        elif "jti" in claims:
+            await session_store.deny([claims["jti"]])
+    except RedisError:
+        raise session_unavailable()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.post('/logout_all', status_code=status.HTTP_204_NO_CONTENT)
+async def logout_all(token: str = Depends(auth_service.oauth2_scheme)):
+    """
+    Ends every session of the user, on all devices.
+
+    :param token: The access token.
+    :type token: str
+    """
+    claims = auth_service.verify_access_token(token)
+    try:
+        await session_store.revoke_all(claims["sub"])
+    except RedisError:
+        raise session_unavailable()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.get('/sessions', response_model=List[SessionModel])
+async def read_sessions(token: str = Depends(auth_service.oauth2_scheme)):
+    """
+    Lists the open sessions of the user, most recently refreshed first.
+
+    :param token: The access token.
+    :type token: str
+    :return: The sessions; ``current`` marks the one of the access token.
+    :rtype: List[SessionModel]
+    """
+    claims = auth_service.verify_access_token(token)
+    try:
+        sessions = await session_store.sessions(claims["sub"])
+    except RedisError:
+        raise session_unavailable()
+    return [{"id": sid, "refreshed_at": datetime.fromtimestamp(refreshed_at), "current": sid == claims.get("sid")}
+            for sid, refreshed_at in sessions]
 
 
 @router.get('/confirmed_email/{token}')
@@ -107,15 +195,12 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
 
 
 @router.post('/request_email')
-async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                        db: Session = Depends(get_db)):
+async def request_email(body: RequestEmail, request: Request, db: Session = Depends(get_db)):
     """
-    Sends a confirmation email to the user.
+    Queues a confirmation email for the user; the mail worker sends it.
 
     :param body: The request email body.
     :type body: RequestEmail
-    :param background_tasks: Background tasks to execute.
-    :type background_tasks: BackgroundTasks
     :param request: The request object.
     :type request: Request
     :param db: The database session.
@@ -125,8 +210,13 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     """
     user = await repository_users.get_user_by_email(body.email, db)
 
-    if user.confirmed:
+    if user is not None and user.confirmed:
         return {"message": "Your email is already confirmed"}
-    if user:
-        background_tasks.add_task(send_email, user.email, user.username, request.base_url)
+    if user is not None:
+        try:
+            # Users have no name of their own, greet them by the local part of the address
+            await send_email(user.email, user.email.split("@")[0], request.base_url)
+        except RedisError:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Could not queue the email, try again later")
     return {"message": "Check your email for confirmation."}
@@ -1,32 +1,116 @@
-from fastapi import APIRouter, HTTPException, Depends
+from typing import Literal
+import orjson
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from ..database.db import get_db
+from ..database.db import get_db, get_session_factory, close_session
 from ..repository import contact as contact_repository
-from ..schemas import Contact, ContactCreate, ContactUpdate, UserModel
+from ..schemas import Contact, ContactBatch, ContactBatchResponse, ContactChanges, ContactCreate, ContactImportError, ContactImportResult, ContactPage, ContactPartial, ContactUpdate, UserModel
 from datetime import date, timedelta
-from ..services.auth import Auth
+from ..services.auth import auth_service
+from ..services.response_cache import response_cache
+from ..services.events import contact_events
+from ..services.etag import etag_headers, etag_matches, make_etag
+from ..services.rate_limit import RateLimiter
+from ..services.contact_io import EXPORT_FORMATS, RecordError, export_contacts, record_parser
+from ..conf.config import settings
 from ..database.models import User
 from typing import List
-from fastapi_limiter import FastAPILimiter, RateLimiter
 
 
 router = APIRouter(prefix='/contact', tags=["contact"])
 
-@router.get("/", response_model=List[Contact], description='No more than 10 requests per minute',
+FIELDS_QUERY = Query(None, description="Comma-separated fields to return, `id` is always included",
+                     examples=["first_name,last_name"])
+
+
+def parse_fields(fields: str | None) -> tuple | None:
+    """
+    Parses the ``fields`` query parameter into the canonical projection.
+
+    :param fields: Comma-separated field names, or None for every field.
+    :type fields: str | None
+    :return: The selected field names in column order, or None for every field.
+    :rtype: tuple | None
+    :raises HTTPException: If a field name is unknown.
+    """
+    if fields is None:
+        return None
+    try:
+        columns = contact_repository.contact_columns([name.strip() for name in fields.split(",") if name.strip()])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return tuple(column.key for column in columns)
+
+
+async def cached_contacts(user: User, version: int, endpoint: str, params: dict, ttl: int, load) -> Response:
+    """
+    Serves a contact list from the per-user response cache, loading and caching it on a miss.
+
+    :param user: The current authenticated user.
+    :type user: User
+    :param version: The collection version of the user, read before loading the contacts.
+    :type version: int
+    :param endpoint: The name of the cached endpoint.
+    :type endpoint: str
+    :param params: The request parameters the response depends on.
+    :type params: dict
+    :param ttl: Time to live of the cached response in seconds.
+    :type ttl: int
+    :param load: Coroutine function returning contact rows.
+    :return: The JSON response.
+    :rtype: Response
+    """
+    body = await response_cache.get(user.id, version, endpoint, params)
+    if body is None:
+        body = orjson.dumps([row._asdict() for row in await load()])
+        await response_cache.set(user.id, version, endpoint, params, body, ttl)
+    return Response(content=body, media_type="application/json")
+
+
+async def contacts_changed(user: User, changes: list, event: str = "change") -> None:
+    """
+    Pushes the changes to the user's event streams.
+
+    Cached responses need no invalidation: they are keyed on the collection version the
+    write bumped.
+
+    :param user: The owner of the changed contacts.
+    :type user: User
+    :param changes: ``{"op": ..., "contact_id": ...}`` entries.
+    :type changes: list
+    :param event: ``change``, or ``resync`` when the changes are not listed.
+    :type event: str
+    """
+    await contact_events.publish(user.id, changes, event)
+
+
+@router.get("/", response_model=List[Contact] | List[ContactPartial], description='No more than 10 requests per minute',
             dependencies=[Depends(RateLimiter(times=10, seconds=60))])
 async def read_contacts(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
+    fields: str | None = FIELDS_QUERY,
     db:Session = Depends(get_db),
-    current_user: User = Depends(Auth.get_current_user)
+    current_user: User = Depends(auth_service.get_current_user)
     ):
     """
     Retrieves a list of contacts for the current user with specified pagination parameters.
 
+    The response carries a private ETag derived from the user and their collection version; a matching
+    ``If-None-Match`` gets an empty 304 without loading any contact.
+
+    :param request: The incoming request.
+    :type request: Request
     :param skip: The number of contacts to skip.
     :type skip: int
     :param limit: The maximum number of contacts to return.
     :type limit: int
+    :param fields: Comma-separated fields to return, e.g. ``first_name,last_name``; ``id`` is always included.
+    :type fields: str | None
     :param db: The database session.
     :type db: Session
     :param current_user: The current authenticated user.
@@ -34,19 +118,147 @@ async def read_contacts(
     :return: A list of contacts.
     :rtype: List[Contact]
     """
-    return contact_repository.get_contacts(current_user, db, skip, limit)
+    fields = parse_fields(fields)
+    version = await contact_repository.get_collection_version(current_user, db)
+    etag = make_etag("list", current_user.id, version, skip, limit, fields)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=etag_headers(etag))
+    response = await cached_contacts(
+        current_user, version, "list", {"skip": skip, "limit": limit, "fields": fields}, settings.contacts_cache_ttl,
+        lambda: contact_repository.get_contacts(current_user, db, skip, limit, fields)
+    )
+    response.headers.update(etag_headers(etag))
+    return response
+
+@router.get("/page/", response_model=ContactPage, description='No more than 10 requests per minute',
+            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
+async def read_contacts_page(
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    order_by: Literal["id", "last_name"] = "id",
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """
+    Retrieves a page of contacts for the current user using cursor-based pagination.
+
+    :param cursor: The ``next_cursor`` of the previous page; omit it for the first page.
+    :type cursor: str | None
+    :param limit: The maximum number of contacts to return.
+    :type limit: int
+    :param order_by: The page ordering, ``id`` or ``last_name``; ignored when a cursor is given.
+    :type order_by: str
+    :param db: The database session.
+    :type db: Session
+    :param current_user: The current authenticated user.
+    :type current_user: User
+    :return: The contacts on the page and the cursor of the next page.
+    :rtype: ContactPage
+    """
+    try:
+        contacts, next_cursor = await contact_repository.get_contacts_page(current_user, db, cursor, limit, order_by)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"items": contacts, "next_cursor": next_cursor}
+
+@router.get("/changes/", response_model=ContactChanges, description='No more than 10 requests per minute',
+            dependencies=[Depends(RateLimiter(times=10, seconds=60))])
+async def read_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """
+    Retrieves the contact changes of the current user after a sequence number.
+
+    Clients store ``next_since`` and pass it back as ``since``, so each poll only reads
+    the new entries of the change log. Deleted contacts appear as ``delete`` entries
+    without contact data. Only the last ``contact_changes_retention`` entries are kept;
+    a ``since`` older than that gets ``resync`` and the current sequence number instead.
+
+    :param since: The ``next_since`` of the previous response, 0 for the whole log.
+    :type since: int
+    :param limit: The maximum number of changes to return.
+    :type limit: int
+    :param db: The database session.
+    :type db: Session
+    :param current_user: The current authenticated user.
+    :type current_user: User
+    :return: The changes, the next sequence number to poll from and whether more changes are waiting.
+    :rtype: ContactChanges
+    """
+    retention = settings.contact_changes_retention
+    if retention > 0:
+        version = await contact_repository.get_collection_version(current_user, db)
+        if since < version - retention:
+            return {"changes": [], "next_since": version, "has_more": False, "resync": True}
+    rows = await contact_repository.get_changes(current_user, db, since, limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    changes = []
+    for row in rows:
+        change = row._asdict()
+        contact = {field: change.pop(field) for field in contact_repository.CONTACT_FIELDS[1:]}
+        attached = row.op != "delete" and contact["email"] is not None
+        change["contact"] = {"id": row.contact_id, **contact} if attached else None
+        changes.append(change)
+    return {"changes": changes, "next_since": rows[-1].seq if rows else since, "has_more": has_more}
+
+@router.get("/events/", response_class=StreamingResponse)
+async def contact_event_stream(current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Streams the contact changes of the current user as Server-Sent Events.
+
+    ``change`` events carry a JSON list of ``{"op", "contact_id"}`` entries. A ``resync``
+    event means changes were not listed (bulk import, or the client fell behind) and the
+    client should catch up from ``/contact/changes/``. A comment line is sent every
+    ``events_heartbeat`` seconds to keep idle connections open. The stream holds no
+    database connection.
+
+    :param current_user: The current authenticated user.
+    :type current_user: User
+    :return: The event stream.
+    :rtype: StreamingResponse
+    """
+    subscriber = contact_events.subscribe(current_user.id)
+    if subscriber is None:
+        raise HTTPException(status_code=503, detail="Too many event stream connections")
+
+    async def stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                event = await subscriber.get(settings.events_heartbeat)
+                if event is None:
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {event['event']}\ndata: {orjson.dumps(event.get('changes', [])).decode()}\n\n"
+        finally:
+            contact_events.unsubscribe(subscriber)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @router.get("/{contact_id}", response_model=Contact)
 async def read_contact(
     contact_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: User = Depends(Auth.get_current_user)
+    current_user: User = Depends(auth_service.get_current_user)
 ):
     """
     Retrieves a single contact with the specified ID for the current user.
 
+    A matching ``If-None-Match`` gets an empty 304 after a lookup of the contact version only.
+
     :param contact_id: The ID of the contact to retrieve.
     :type contact_id: int
+    :param request: The incoming request.
+    :type request: Request
+    :param response: The outgoing response, used to set the ETag.
+    :type response: Response
     :param db: The database session.
     :type db: Session
     :param current_user: The current authenticated user.
@@ -54,16 +266,23 @@ async def read_contact(
     :return: The contact with the specified ID.
     :rtype: Contact
     """
-    db_contact = contact_repository.get_contact(current_user, db, contact_id)
+    version = await contact_repository.get_contact_version(current_user, db, contact_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Contact not found")
+    etag = make_etag("contact", current_user.id, contact_id, version)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=etag_headers(etag))
+    db_contact = await contact_repository.get_contact(current_user, db, contact_id)
     if db_contact is None:
         raise HTTPException(status_code=404, detail="Contact not found")
+    response.headers.update(etag_headers(make_etag("contact", current_user.id, contact_id, db_contact.version)))
     return db_contact
 
 @router.post("/", response_model=Contact,dependencies=[Depends(RateLimiter(times=5, seconds=60))])
 async def create_contact(
     contact: ContactCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(Auth.get_current_user)
+    current_user: User = Depends(auth_service.get_current_user)
 ):
     """
     Creates a new contact for the current user.
@@ -77,17 +296,158 @@ async def create_contact(
     :return: The newly created contact.
     :rtype: Contact
     """
-    db_contact = contact_repository.create_contact(current_user, db, contact)
+    db_contact = await contact_repository.create_contact(current_user, db, contact)
     if db_contact is None:
         raise HTTPException(status_code=400, detail="Failed to create contact")
+    await contacts_changed(current_user, [{"op": "create", "contact_id": db_contact.id}])
     return db_contact
 
+@router.post("/import/", response_model=ContactImportResult, description='No more than 5 requests per minute',
+             dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+async def import_contacts(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """
+    Imports contacts for the current user from a JSON array, NDJSON or CSV request body.
+
+    The body is parsed as it streams in, validated row by row and written in chunks of
+    ``import_chunk_size`` rows, one batched insert and transaction per chunk. Invalid
+    rows and rows with an email that is already taken are reported and skipped.
+
+    :param request: The request whose body holds the contacts.
+    :type request: Request
+    :param db: The database session.
+    :type db: Session
+    :param current_user: The current authenticated user.
+    :type current_user: User
+    :return: The number of created contacts and the per-row errors.
+    :rtype: ContactImportResult
+    """
+    parser = record_parser(request.headers.get("content-type"))
+    if parser is None:
+        raise HTTPException(status_code=415, detail="Use application/json, application/x-ndjson or text/csv")
+    result = ContactImportResult()
+    chunk = []
+
+    def add_error(row: int, detail: str):
+        result.failed += 1
+        if len(result.errors) < settings.import_max_errors:
+            result.errors.append(ContactImportError(row=row, detail=detail))
+
+    async def flush():
+        errors = await contact_repository.create_contacts(current_user, db, [contact for _, contact in chunk])
+        for (row, _), error in zip(chunk, errors):
+            if error is None:
+                result.created += 1
+            else:
+                add_error(row, error)
+        chunk.clear()
+
+    row = 0
+    try:
+        async for row, record in parser(request.stream()):
+            if isinstance(record, RecordError):
+                add_error(row, str(record))
+                continue
+            try:
+                contact = ContactCreate.model_validate(record)
+            except ValidationError as e:
+                add_error(row, "; ".join(f"{'.'.join(map(str, error['loc'])) or 'row'}: {error['msg']}"
+                                         for error in e.errors()))
+                continue
+            chunk.append((row, contact))
+            if len(chunk) >= settings.import_chunk_size:
+                await flush()
+    except RecordError as e:
+        add_error(row + 1, str(e))
+    if chunk:
+        await flush()
+    if result.created:
+        await contacts_changed(current_user, [], "resync")
+    result.errors.sort(key=lambda error: error.row)
+    return result
+
+@router.post("/batch/", response_model=ContactBatchResponse, description='No more than 10 requests per minute',
+             dependencies=[Depends(RateLimiter(times=10, seconds=60))])
+async def batch_contacts(
+    batch: ContactBatch,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """
+    Applies a list of create, update and delete operations for the current user.
+
+    The operations run as set-based statements in one transaction and every operation
+    gets its own result: 201 created, 200 updated or deleted, 404 when the contact does
+    not exist and 409 on an email conflict.
+
+    :param batch: The operations to apply.
+    :type batch: ContactBatch
+    :param db: The database session.
+    :type db: Session
+    :param current_user: The current authenticated user.
+    :type current_user: User
+    :return: The per-operation results.
+    :rtype: ContactBatchResponse
+    """
+    if len(batch.operations) > settings.batch_max_operations:
+        raise HTTPException(status_code=413, detail=f"No more than {settings.batch_max_operations} operations per batch")
+    try:
+        results = await contact_repository.apply_contact_batch(current_user, db, batch.operations)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="The batch conflicts with a concurrent change, nothing was applied")
+    changes = [{"op": result["op"], "contact_id": result["id"]} for result in results if result["status"] < 300]
+    if changes:
+        await contacts_changed(current_user, changes)
+    return {"results": results}
+
+@router.get("/export/", response_class=StreamingResponse)
+async def export_contacts_file(
+    format: Literal["ndjson", "csv", "vcard"] = "ndjson",
+    session_factory = Depends(get_session_factory),
+    current_user: User = Depends(auth_service.get_current_user)
+):
+    """
+    Streams all contacts of the current user as NDJSON, CSV or vCard.
+
+    Rows are read through a server-side cursor and written out batch by batch, so memory
+    use does not grow with the size of the address book. The body is produced after the
+    request's ``get_db`` session is closed, so the export reads through a session of its own.
+
+    :param format: The export format: ``ndjson``, ``csv`` or ``vcard``.
+    :type format: str
+    :param session_factory: The factory of the export's database session.
+    :param current_user: The current authenticated user.
+    :type current_user: User
+    :return: The streamed export file.
+    :rtype: StreamingResponse
+    """
+    media_type, extension = EXPORT_FORMATS[format]
+
+    async def body():
+        db = session_factory()
+        try:
+            batches = contact_repository.stream_contacts(current_user, db, settings.export_batch_size)
+            async for chunk in export_contacts(batches, format):
+                yield chunk
+        finally:
+            # Also reached when the export fails or the client disconnects mid-stream
+            await close_session(db)
+
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="contacts.{extension}"'},
+    )
+
 @router.put("/{contact_id}", response_model=Contact)
 async def update_contact(
     contact_id: int,
     contact: ContactUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(Auth.get_current_user)
+    current_user: User = Depends(auth_service.get_current_user)
 ):
     """
     Updates a single contact with the specified ID for the current user.
@@ -103,16 +463,17 @@ async def update_contact(
     :return: The updated contact.
     :rtype: Contact
     """
-    db_contact = contact_repository.update_contact(current_user, db, contact_id, contact)
+    db_contact = await contact_repository.update_contact(current_user, db, contact_id, contact)
     if db_contact is None:
         raise HTTPException(status_code=404, detail="Contact not found")
+    await contacts_changed(current_user, [{"op": "update", "contact_id": contact_id}])
     return db_contact
 
 @router.delete("/{contact_id}", response_model=Contact)
 async def delete_contact(
     contact_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(Auth.get_current_user)
+    current_user: User = Depends(auth_service.get_current_user)
 ):
     """
     Deletes a single contact with the specified ID for the current user.
@@ -126,22 +487,32 @@ async def delete_contact(
     :return: The deleted contact.
     :rtype: Contact
     """
-    db_contact = contact_repository.delete_contact(current_user, db, contact_id)
+    db_contact = await contact_repository.delete_contact(current_user, db, contact_id)
     if db_contact is None:
         raise HTTPException(status_code=404, detail="Contact not found")
+    await contacts_changed(current_user, [{"op": "delete", "contact_id": contact_id}])
     return db_contact
 
-@router.get("/search/", response_model=list[Contact])
+@router.get("/search/", response_model=list[Contact] | list[ContactPartial])
 async def search_contacts(
     query: str = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    fields: str | None = FIELDS_QUERY,
     db: Session = Depends(get_db),
-    current_user: User = Depends(Auth.get_current_user)
+    current_user: User = Depends(auth_service.get_current_user)
 ):
     """
     Searches for contacts based on the provided query string.
 
     :param query: The query string to search for.
     :type query: str
+    :param skip: The number of results to skip.
+    :type skip: int
+    :param limit: The maximum number of results to return.
+    :type limit: int
+    :param fields: Comma-separated fields to return, e.g. ``first_name,last_name``; ``id`` is always included.
+    :type fields: str | None
     :param db: The database session.
     :type db: Session
     :param current_user: The current authenticated user.
@@ -149,16 +520,28 @@ async def search_contacts(
     :return: A list of matching contacts.
     :rtype: List[Contact]
     """
-    return contact_repository.search_contacts(current_user, db, query)
+    fields = parse_fields(fields)
+    version = await contact_repository.get_collection_version(current_user, db)
+    return await cached_contacts(
+        current_user, version, "search", {"query": query, "skip": skip, "limit": limit, "fields": fields},
+        settings.search_cache_ttl,
+        lambda: contact_repository.search_contacts(current_user, db, query, skip, limit, fields)
+    )
 
-@router.get("/birthdays/", response_model=list[Contact])
+@router.get("/birthdays/", response_model=list[Contact] | list[ContactPartial])
 async def get_upcoming_birthdays(
+    days: int | None = Query(None, ge=0, le=366),
+    fields: str | None = FIELDS_QUERY,
     db: Session = Depends(get_db),
-    current_user: User = Depends(Auth.get_current_user)
+    current_user: User = Depends(auth_service.get_current_user)
 ):
     """
     Retrieves a list of upcoming birthdays for the current user.
 
+    :param days: The number of days ahead to look, defaults to the configured window.
+    :type days: int | None
+    :param fields: Comma-separated fields to return, e.g. ``first_name,last_name``; ``id`` is always included.
+    :type fields: str | None
     :param db: The database session.
     :type db: Session
     :param current_user: The current authenticated user.
@@ -166,4 +549,10 @@ async def get_upcoming_birthdays(
     :return: A list of contacts with upcoming birthdays.
     :rtype: List[Contact]
     """
-    return contact_repository.get_upcoming_birthdays(current_user, db)
+    fields = parse_fields(fields)
+    today = date.today()
+    version = await contact_repository.get_collection_version(current_user, db)
+    return await cached_contacts(
+        current_user, version, "birthdays", {"days": days, "today": today, "fields": fields}, settings.birthdays_cache_ttl,
+        lambda: contact_repository.get_upcoming_birthdays(current_user, db, days, today, fields)
+    )
@@ -0,0 +1,135 @@
+import ipaddress
+import secrets
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+
+from ..conf.config import settings
+from ..database.db import engine, async_engine
+from ..database.pool import pool_stats
+from ..services.auth import auth_service
+from ..services.avatars import avatar_processor
+from ..services.cache import token_cache, user_cache
+from ..services.events import contact_events
+from ..services.mail_queue import mail_queue
+from ..services.rate_limit import rate_limits
+
+
+
+def require_metrics_access(request: Request) -> None:
+    """
+    Restricts the metrics to operators.
+
+    A request is allowed if it carries the ``METRICS_TOKEN`` in the ``X-Metrics-Token``
+    header or, when no token is configured, if it comes from a loopback address. Behind
+    a reverse proxy every client looks local, so deployments with one must set a token.
+
+    :param request: The incoming request.
+    :type request: Request
+    :raises HTTPException: 403 for any other request.
+    """
+    if settings.metrics_token:
+        token = request.headers.get("x-metrics-token", "")
+        if secrets.compare_digest(token.encode(), settings.metrics_token.encode()):
+            return
+    elif request.client is not None:
+        try:
+            if ipaddress.ip_address(request.client.host).is_loopback:
+                return
+        except ValueError:
+            pass
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+
+router = APIRouter(prefix='/internal', tags=["internal"], include_in_schema=False,
+                   dependencies=[Depends(require_metrics_access)])
+
+
+@router.get("/metrics/pool")
+async def read_pool_metrics():
+    """
+    Returns connection pool gauges and checkout telemetry for the database engines.
+
+    :return: Pool statistics keyed by engine.
+    :rtype: dict
+    """
+    metrics = {"sync": pool_stats(engine.pool)}
+    if async_engine is not None:
+        metrics["async"] = pool_stats(async_engine.sync_engine.pool)
+    return metrics
+
+
+@router.get("/metrics/user_cache")
+async def read_user_cache_metrics():
+    """
+    Returns hit/miss counters of the authenticated-user cache.
+
+    :return: User cache statistics.
+    :rtype: dict
+    """
+    return user_cache.stats()
+
+
+@router.get("/metrics/token_cache")
+async def read_token_cache_metrics():
+    """
+    Returns hit/miss counters of the verified-token cache.
+
+    :return: Token cache statistics.
+    :rtype: dict
+    """
+    return token_cache.stats()
+
+
+@router.get("/metrics/password_hasher")
+async def read_password_hasher_metrics():
+    """
+    Returns concurrency and queue-depth metrics of the password hashing pool.
+
+    :return: Password hasher statistics.
+    :rtype: dict
+    """
+    return auth_service.hasher.stats()
+
+
+@router.get("/metrics/events")
+async def read_event_metrics():
+    """
+    Returns connection and delivery counters of the contact event streams of this worker.
+
+    :return: Event broker statistics.
+    :rtype: dict
+    """
+    return contact_events.stats()
+
+
+@router.get("/metrics/mail")
+async def read_mail_metrics():
+    """
+    Returns the mail queue lengths and the sent/retried/dead counters of all mail workers.
+
+    :return: Mail queue statistics.
+    :rtype: dict
+    """
+    return await mail_queue.stats()
+
+
+@router.get("/metrics/avatars")
+async def read_avatar_metrics():
+    """
+    Returns concurrency counters of the avatar processing pool of this worker.
+
+    :return: Avatar processor statistics.
+    :rtype: dict
+    """
+    return avatar_processor.stats()
+
+
+@router.get("/metrics/rate_limit")
+async def read_rate_limit_metrics():
+    """
+    Returns how many rate limit checks of this worker needed Redis and how many were rejected.
+
+    :return: Rate limiter statistics.
+    :rtype: dict
+    """
+    return rate_limits.stats()
@@ -1,17 +1,32 @@
-from fastapi import APIRouter, Depends, status, UploadFile, File
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
+from starlette.datastructures import FormData, UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
 
 from ..database.db import get_db
 from ..database.models import User
-from ..repository import users as repository_users
+from ..repository import auth as repository_users
 from ..services.auth import auth_service
+from ..services.avatars import IMAGE_TYPES, avatar_processor, avatar_storage, limit_size, read_hashed
 from ..conf.config import settings
 from ..schemas import UserDb
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+# Room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 16 * 1024
+
+# The multipart body the avatar form route reads itself, for the OpenAPI schema
+AVATAR_FORM_BODY = {
+    "required": True,
+    "content": {"multipart/form-data": {"schema": {
+        "type": "object", "properties": {"file": {"type": "string", "format": "binary"}}, "required": ["file"],
+    }}},
+}
+
 
 @router.get("/me/", response_model=UserDb)
 async def read_users_me(current_user: User = Depends(auth_service.get_current_user)):
@@ -26,14 +41,112 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
     return current_user
 
 
-@router.patch('/avatar', response_model=UserDb)
-async def update_avatar_user(file: UploadFile = File(), current_user: User = Depends(auth_service.get_current_user),
+def check_avatar_type(content_type: str | None) -> str:
+    """
+    Rejects avatars of an unsupported type.
+
+    :param content_type: The media type of the image.
+    :type content_type: str | None
+    :return: The media type.
+    :rtype: str
+    :raises HTTPException: 415 for an unsupported type.
+    """
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type not in IMAGE_TYPES:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail=f"The avatar must be one of {', '.join(IMAGE_TYPES)}")
+    return content_type
+
+
+def check_avatar_length(request: Request, overhead: int = 0) -> None:
+    """
+    Rejects avatar uploads declared larger than ``avatar_max_bytes``.
+
+    :param request: The incoming request.
+    :type request: Request
+    :param overhead: Bytes of the request body that are not image data.
+    :type overhead: int
+    :raises HTTPException: 413 for a declared size over the limit.
+    """
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > settings.avatar_max_bytes + overhead:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"The avatar must not exceed {settings.avatar_max_bytes} bytes")
+
+
+async def save_avatar(user: User, chunks, db: Session) -> User:
+    """
+    Stores an avatar under its content hash and points the user at it.
+
+    Re-uploading the current avatar changes nothing, and an image any user uploaded
+    before is not processed again. The image is decoded from memory, so up to
+    ``avatar_max_bytes`` of it are held while it is processed.
+
+    :param user: The owner of the avatar.
+    :type user: User
+    :param chunks: The image data.
+    :param db: The database session.
+    :type db: Session
+    :return: The updated user.
+    :rtype: User
+    """
+    data, digest = await read_hashed(limit_size(chunks, settings.avatar_max_bytes))
+    if user.avatar_hash == digest:
+        return user
+    if not await avatar_storage.exists(digest):
+        await avatar_storage.save(digest, await avatar_processor.render(data))
+    url = avatar_storage.url(digest, avatar_processor.default_variant)
+    return await repository_users.update_avatar(user.email, url, db, digest)
+
+
+async def read_chunks(file: UploadFile):
+    # UploadFile.read runs the blocking file read in the thread pool
+    while chunk := await file.read(settings.avatar_chunk_size):
+        yield chunk
+
+
+async def read_avatar_form(request: Request) -> FormData:
+    """
+    Parses a multipart avatar upload from the request stream.
+
+    A ``File()`` parameter would have the whole body parsed and spooled before the route
+    runs; here the body is cut off with 413 as soon as it exceeds ``avatar_max_bytes``
+    plus the multipart overhead, whether or not the request declares its length.
+
+    :param request: The incoming request.
+    :type request: Request
+    :return: The parsed form, to be closed by the caller.
+    :rtype: FormData
+    :raises HTTPException: 413 for a body over the limit, 400 for a malformed body, 422 without a ``file`` part.
+    """
+    if not request.headers.get("content-type", "").lower().startswith("multipart/form-data"):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="The avatar must be sent as the 'file' field of a multipart form")
+    check_avatar_length(request, MULTIPART_OVERHEAD)
+    body = limit_size(request.stream(), settings.avatar_max_bytes + MULTIPART_OVERHEAD)
+    try:
+        form = await MultiPartParser(request.headers, body, max_files=1, max_fields=10).parse()
+    except (MultiPartException, KeyError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed multipart form")
+    if not isinstance(form.get("file"), UploadFile):
+        await form.close()
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="The avatar must be sent as the 'file' field of a multipart form")
+    return form
+
+
+@router.patch('/avatar', response_model=UserDb, openapi_extra={"requestBody": AVATAR_FORM_BODY})
+async def update_avatar_user(request: Request, current_user: User = Depends(auth_service.get_current_user),
                              db: Session = Depends(get_db)):
     """
-    Updates the avatar of the current user.
+    Updates the avatar of the current user from a multipart form upload in the ``file`` field.
 
-    :param file: The uploaded file.
-    :type file: UploadFile
+    The body is parsed as it arrives, with the same cap as the raw upload; bodies over
+    ``avatar_max_bytes`` are rejected with 413 as soon as the limit is crossed. The image
+    is cropped and stored in every size of ``avatar_sizes`` and format of ``avatar_formats``.
+
+    :param request: The incoming request.
+    :type request: Request
     :param current_user: The current authenticated user.
     :type current_user: User
     :param db: The database session.
@@ -41,15 +154,59 @@ async def update_avatar_user(file: UploadFile = File(), current_user: User = Dep
     :return: The updated user.
     :rtype: UserDb
     """
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-
-    r = cloudinary.uploader.upload(file.file, public_id=f'NotesApp/{current_user.username}', overwrite=True)
-    src_url = cloudinary.CloudinaryImage(f'NotesApp/{current_user.username}')\
-                        .build_url(width=250, height=250, crop='fill', version=r.get('version'))
-    user = await repository_users.update_avatar(current_user.email, src_url, db)
-    return user
+    form = await read_avatar_form(request)
+    try:
+        file = form["file"]
+        check_avatar_type(file.content_type)
+        return await save_avatar(current_user, read_chunks(file), db)
+    finally:
+        await form.close()
+
+
+@router.put('/avatar', response_model=UserDb)
+async def put_avatar_user(request: Request, current_user: User = Depends(auth_service.get_current_user),
+                          db: Session = Depends(get_db)):
+    """
+    Updates the avatar of the current user from the raw image in the request body.
+
+    The body is read as it arrives; bodies over ``avatar_max_bytes`` are rejected with 413
+    as soon as the limit is crossed. The image is cropped and stored in every size of
+    ``avatar_sizes`` and format of ``avatar_formats``.
+
+    :param request: The incoming request, with the image media type as its content type.
+    :type request: Request
+    :param current_user: The current authenticated user.
+    :type current_user: User
+    :param db: The database session.
+    :type db: Session
+    :return: The updated user.
+    :rtype: UserDb
+    """
+    check_avatar_type(request.headers.get("content-type"))
+    check_avatar_length(request)
+    return await save_avatar(current_user, request.stream(), db)
+
+
+@router.get('/avatar', status_code=status.HTTP_307_TEMPORARY_REDIRECT, response_class=RedirectResponse)
+async def read_avatar_user(size: int | None = Query(None, ge=1), format: Literal["webp", "jpeg"] | None = None,
+                           current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Redirects to the avatar variant of the current user closest to the wanted size.
+
+    The variant URLs are content-addressed and served as immutable; only this redirect
+    has to be revalidated when the avatar changes.
+
+    :param size: The wanted width and height in pixels, the largest variant if omitted.
+    :type size: int | None
+    :param format: The wanted image format, the first of ``avatar_formats`` if omitted.
+    :type format: str | None
+    :param current_user: The current authenticated user.
+    :type current_user: User
+    :return: A redirect to the variant.
+    :rtype: RedirectResponse
+    """
+    if current_user.avatar_hash is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No avatar uploaded")
+    url = avatar_storage.url(current_user.avatar_hash, avatar_processor.select_variant(size, format))
+    return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+                            headers={"Cache-Control": "private, no-cache"})
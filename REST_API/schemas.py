@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field, EmailStr
-from datetime import date
-from typing import Optional
+from pydantic import BaseModel, Field, EmailStr, model_validator
+from datetime import date, datetime
+from typing import List, Literal, Optional
 
 
 class ContactBase(BaseModel):
@@ -9,7 +9,7 @@ class ContactBase(BaseModel):
     email: str
     phone_number: str
     birthday: date
-    additional_info: Optional[str]
+    additional_info: Optional[str] = None
 
 
 class ContactCreate(ContactBase):
@@ -27,6 +27,83 @@ class Contact(ContactBase):
         from_attributes = True
 
 
+class ContactPartial(BaseModel):
+    """
+    A contact narrowed by the ``fields`` query parameter; only ``id`` is always present.
+    """
+    id: int
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    email: Optional[str] = None
+    phone_number: Optional[str] = None
+    birthday: Optional[date] = None
+    additional_info: Optional[str] = None
+
+
+class ContactPage(BaseModel):
+    items: List[Contact]
+    next_cursor: Optional[str] = None
+
+
+class ContactChange(BaseModel):
+    seq: int
+    contact_id: int
+    op: Literal["create", "update", "delete"]
+    changed_at: datetime
+    # The current state of the contact, None once it has been deleted
+    contact: Optional[Contact] = None
+
+
+class ContactChanges(BaseModel):
+    changes: List[ContactChange]
+    # Pass as ``since`` on the next request
+    next_since: int
+    has_more: bool
+    # The changes after ``since`` were pruned: reload the contacts, then poll from ``next_since``
+    resync: bool = False
+
+
+class ContactImportError(BaseModel):
+    row: int
+    detail: str
+
+
+class ContactImportResult(BaseModel):
+    created: int = 0
+    failed: int = 0
+    errors: List[ContactImportError] = []
+
+
+class ContactBatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+    contact: Optional[ContactBase] = None
+
+    @model_validator(mode="after")
+    def check_arguments(self):
+        if self.op != "create" and self.id is None:
+            raise ValueError(f"'{self.op}' requires an id")
+        if self.op != "delete" and self.contact is None:
+            raise ValueError(f"'{self.op}' requires a contact")
+        return self
+
+
+class ContactBatch(BaseModel):
+    operations: List[ContactBatchOperation] = Field(min_length=1)
+
+
+class ContactBatchResult(BaseModel):
+    index: int
+    op: str
+    id: Optional[int] = None
+    status: int
+    detail: Optional[str] = None
+
+
+class ContactBatchResponse(BaseModel):
+    results: List[ContactBatchResult]
+
+
 class UserModel(BaseModel):
     email: str
     password: str = Field(min_length=6, max_length=10)
@@ -35,6 +112,7 @@ class UserModel(BaseModel):
 class UserDb(BaseModel):
     id: int
     email: str
+    avatar: Optional[str] = None
 
     class Config:
         orm_mode = True
@@ -50,5 +128,12 @@ class TokenModel(BaseModel):
     refresh_token: str
     token_type: str = "bearer"
 
+
+class SessionModel(BaseModel):
+    id: str
+    refreshed_at: datetime
+    current: bool = False
+
+
 class RequestEmail(BaseModel):
     email: EmailStr
\ No newline at end of file
@@ -1,3 +1,4 @@
+import uuid
 from typing import Optional
 
 from jose import JWTError, jwt
@@ -9,8 +10,9 @@ from sqlalchemy.orm import Session
 
 from REST_API.database.db import get_db
 from REST_API.repository import auth as repository_users
-from conf.config import settings
-import redis
+from REST_API.conf.config import settings
+from REST_API.services.cache import token_cache, user_cache
+from REST_API.services.passwords import PasswordHasher
 
 
 
@@ -22,11 +24,12 @@ class Auth:
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
+    hasher = PasswordHasher(pwd_context, settings.password_hash_workers, settings.password_hash_max_queue)
 
-    def verify_password(self, plain_password, hashed_password):
+    async def verify_password(self, plain_password, hashed_password):
         """
-        Verifies a plain password against a hashed password.
+        Verifies a plain password against a hashed password on the hashing thread pool.
 
         :param plain_password: The plain text password.
         :type plain_password: str
@@ -35,25 +38,25 @@ class Auth:
         :return: True if the passwords match, False otherwise.
         :rtype: bool
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await self.hasher.verify(plain_password, hashed_password)
 
-    def get_password_hash(self, password: str):
+    async def get_password_hash(self, password: str):
         """
-        Generates a hashed password.
+        Generates a hashed password on the hashing thread pool.
 
         :param password: The password to hash.
         :type password: str
         :return: The hashed password.
         :rtype: str
         """
-        return self.pwd_context.hash(password)
+        return await self.hasher.hash(password)
 
     # define a function to generate a new access token
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
         """
-        Generates a new access token.
+        Generates a new access token with a unique ``jti``.
 
-        :param data: The data to encode into the token.
+        :param data: The data to encode into the token, with the ``sid`` of the session.
         :type data: dict
         :param expires_delta: The expiry time for the token (in seconds).
         :type expires_delta: float, optional
@@ -64,7 +67,8 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(minutes=15)
+            expire = datetime.utcnow() + timedelta(seconds=settings.access_token_ttl)
+        to_encode.setdefault("jti", uuid.uuid4().hex)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "access_token"})
         encoded_access_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_access_token
@@ -72,9 +76,9 @@ class Auth:
     # define a function to generate a new refresh token
     async def create_refresh_token(self, data: dict, expires_delta: Optional[float] = None):
         """
-        Generates a new refresh token.
+        Generates a new refresh token; its ``jti`` is generated unless ``data`` has one.
 
-        :param data: The data to encode into the token.
+        :param data: The data to encode into the token, with the ``sid`` of the session.
         :type data: dict
         :param expires_delta: The expiry time for the token (in seconds).
         :type expires_delta: float, optional
@@ -85,7 +89,8 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(days=7)
+            expire = datetime.utcnow() + timedelta(seconds=settings.refresh_token_ttl)
+        to_encode.setdefault("jti", uuid.uuid4().hex)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
         encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
         return encoded_refresh_token
@@ -96,51 +101,94 @@ class Auth:
 
         :param refresh_token: The refresh token to decode.
         :type refresh_token: str
-        :return: The decoded email from the token.
-        :rtype: str
+        :return: The claims of the token, with ``sub``, ``sid`` and ``jti``.
+        :rtype: dict
         """
         try:
             payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'refresh_token':
-                email = payload['sub']
-                return email
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
+        if payload.get('scope') != 'refresh_token':
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
+        if not all(payload.get(claim) for claim in ('sub', 'sid', 'jti')):
+            # Issued before sessions moved to Redis
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid refresh token')
+        return payload
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    def verify_access_token(self, token: str) -> dict:
         """
-        Retrieves the current authenticated user.
+        Verifies an access token and checks it has not been revoked.
+
+        The claims of a verified token are cached until it expires, so only the first
+        request with a token pays for the signature check.
 
         :param token: The JWT token.
         :type token: str
-        :param db: The database session.
-        :type db: Session
-        :return: The current authenticated user.
-        :rtype: User
+        :return: The claims of the token.
+        :rtype: dict
+        :raises HTTPException: 401 for an invalid, expired or revoked token.
         """
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-
-        try:
-            # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                if email is None:
-                    raise credentials_exception
-            else:
+        key = token_cache.key(token)
+        payload = token_cache.get(key)
+        if payload is None:
+            try:
+                # Decode JWT
+                payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            except JWTError as e:
                 raise credentials_exception
-        except JWTError as e:
+            if payload.get('scope') != 'access_token' or payload.get("sub") is None:
+                raise credentials_exception
+            token_cache.set(key, payload)
+        if token_cache.is_revoked(key, payload):
             raise credentials_exception
+        return payload
 
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+        """
+        Retrieves the current authenticated user.
+
+        :param token: The JWT token.
+        :type token: str
+        :param db: The database session (``Session`` or ``AsyncSession``).
+        :type db: Session
+        :return: The current authenticated user.
+        :rtype: User
+        """
+        email = self.verify_access_token(token)["sub"]
+        user = await user_cache.get(email)
+        if user is not None:
+            return user
         user = await repository_users.get_user_by_email(email, db)
         if user is None:
-            raise credentials_exception
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        await user_cache.set(user)
         return user
+
+    async def get_optional_user(self, token: str | None = Depends(optional_oauth2_scheme),
+                                db: Session = Depends(get_db)):
+        """
+        Retrieves the authenticated user, or None for a request without a token.
+
+        :param token: The JWT token, if any.
+        :type token: str | None
+        :param db: The database session (``Session`` or ``AsyncSession``).
+        :type db: Session
+        :return: The current authenticated user, or None.
+        :rtype: User | None
+        :raises HTTPException: 401 if a token is given but invalid.
+        """
+        if token is None:
+            return None
+        return await self.get_current_user(token, db)
     
     async def create_email_token(self, data: dict):
         """
@@ -0,0 +1,411 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import AsyncIterator, Dict, Tuple
+
+import cloudinary
+import cloudinary.api
+import cloudinary.exceptions
+import cloudinary.uploader
+from fastapi import HTTPException, status
+from PIL import Image, ImageOps
+from starlette.concurrency import run_in_threadpool
+from starlette.staticfiles import StaticFiles
+
+from REST_API.conf.config import settings
+from REST_API.services.cache import LRUCache
+
+IMAGE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif")
+
+# Output format -> (Pillow format, file extension)
+FORMATS = {"webp": ("WEBP", "webp"), "jpeg": ("JPEG", "jpg")}
+
+# Content-addressed files never change, so clients may cache them for good
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def variant_name(size: int, fmt: str) -> str:
+    """
+    Returns the file name of an avatar variant, e.g. ``128.webp``.
+
+    :param size: The width and height in pixels.
+    :type size: int
+    :param fmt: The output format, a key of :data:`FORMATS`.
+    :type fmt: str
+    :return: The variant name.
+    :rtype: str
+    """
+    return f"{size}.{FORMATS[fmt][1]}"
+
+
+async def limit_size(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    """
+    Passes upload chunks through, failing as soon as more than ``max_bytes`` have arrived.
+
+    :param chunks: The upload chunks.
+    :param max_bytes: The size limit.
+    :type max_bytes: int
+    :return: The same chunks.
+    :raises HTTPException: 413 once the limit is exceeded.
+    """
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > max_bytes:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                detail=f"The avatar must not exceed {max_bytes} bytes")
+        yield chunk
+
+
+async def read_hashed(chunks: AsyncIterator[bytes]) -> Tuple[bytes, str]:
+    """
+    Reads an upload, hashing it as the chunks arrive.
+
+    :param chunks: The upload chunks.
+    :return: The data and its SHA-256 hex digest.
+    :rtype: Tuple[bytes, str]
+    """
+    digest = hashlib.sha256()
+    data = bytearray()
+    async for chunk in chunks:
+        digest.update(chunk)
+        data += chunk
+    return bytes(data), digest.hexdigest()
+
+
+def render_variants(data: bytes, sizes: Tuple[int, ...], formats: Tuple[str, ...], quality: int,
+                    max_pixels: int) -> Dict[str, bytes]:
+    """
+    Decodes an image once and encodes a square crop of it in every size and format.
+
+    Runs in a worker process of :class:`AvatarProcessor`.
+
+    :param data: The uploaded image.
+    :type data: bytes
+    :param sizes: The widths and heights of the variants.
+    :type sizes: Tuple[int, ...]
+    :param formats: The output formats, keys of :data:`FORMATS`.
+    :type formats: Tuple[str, ...]
+    :param quality: The encoder quality, 1-100.
+    :type quality: int
+    :param max_pixels: The largest image accepted, against decompression bombs.
+    :type max_pixels: int
+    :return: The encoded variants by :func:`variant_name`.
+    :rtype: Dict[str, bytes]
+    :raises ValueError: If the data is not a supported image.
+    """
+    largest = max(sizes)
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.width * image.height > max_pixels:
+            raise ValueError(f"The avatar must not exceed {max_pixels} pixels")
+        # Lets the JPEG decoder downscale while decoding
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError("The avatar is not a valid image") from e
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    image = image.convert("RGBA" if has_alpha else "RGB")
+    # Crop to a square once, smaller sizes are scaled down from the previous one
+    current = ImageOps.fit(image, (largest, largest), Image.Resampling.LANCZOS)
+    variants = {}
+    for size in sorted(sizes, reverse=True):
+        if current.width != size:
+            current = current.resize((size, size), Image.Resampling.LANCZOS)
+        for fmt in formats:
+            pil_format = FORMATS[fmt][0]
+            buffer = io.BytesIO()
+            if pil_format == "JPEG":
+                frame = current
+                if has_alpha:
+                    frame = Image.new("RGB", current.size, (255, 255, 255))
+                    frame.paste(current, mask=current.getchannel("A"))
+                frame.save(buffer, pil_format, quality=quality, optimize=True, progressive=True)
+            else:
+                current.save(buffer, pil_format, quality=quality, method=4)
+            variants[variant_name(size, fmt)] = buffer.getvalue()
+    return variants
+
+
+class AvatarProcessor:
+    """
+    Renders avatar variants on a bounded process pool.
+
+    Decoding and encoding images is CPU-bound and holds the GIL, so it runs in worker
+    processes started on first use. At most ``max_workers`` images are processed at
+    once; up to ``max_queue`` further uploads wait for a slot and any beyond that are
+    rejected with 503.
+    """
+
+    def __init__(self, sizes, formats, quality: int, max_pixels: int, max_workers: int, max_queue: int):
+        self.sizes = tuple(sorted(sizes))
+        self.formats = tuple(formats)
+        self.quality = quality
+        self.max_pixels = max_pixels
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor = None
+        self.semaphore = asyncio.Semaphore(max_workers)
+        self.queued = 0
+        self.processed = 0
+        self.rejected = 0
+
+    @property
+    def default_variant(self) -> str:
+        """
+        The variant stored as the avatar URL of a user: the largest size, first format.
+        """
+        return variant_name(self.sizes[-1], self.formats[0])
+
+    def select_variant(self, size: int | None = None, fmt: str | None = None) -> str:
+        """
+        Returns the smallest variant at least ``size`` pixels wide, or the largest one.
+
+        :param size: The wanted size, None for the largest.
+        :type size: int | None
+        :param fmt: The wanted format, None or unknown for the first configured one.
+        :type fmt: str | None
+        :return: The variant name.
+        :rtype: str
+        """
+        chosen = next((candidate for candidate in self.sizes if size is not None and candidate >= size),
+                      self.sizes[-1])
+        return variant_name(chosen, fmt if fmt in self.formats else self.formats[0])
+
+    async def render(self, data: bytes) -> Dict[str, bytes]:
+        """
+        Renders every variant of an image without blocking the event loop.
+
+        :param data: The uploaded image.
+        :type data: bytes
+        :return: The encoded variants by name.
+        :rtype: Dict[str, bytes]
+        :raises HTTPException: 422 for an invalid image, 503 when the pool is saturated.
+        """
+        if self.semaphore.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Too many concurrent avatar uploads")
+        self.queued += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.queued -= 1
+        try:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            variants = await asyncio.get_running_loop().run_in_executor(
+                self.executor, render_variants, data, self.sizes, self.formats, self.quality, self.max_pixels)
+        except BrokenProcessPool:
+            # A worker died, e.g. killed for memory; the next upload starts a fresh pool
+            self.executor = None
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Avatar processing failed, try again")
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+        finally:
+            self.semaphore.release()
+        self.processed += 1
+        return variants
+
+    def close(self) -> None:
+        """
+        Shuts the worker processes down.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def stats(self) -> dict:
+        """
+        Returns the concurrency counters of the pool.
+
+        :return: The processor statistics.
+        :rtype: dict
+        """
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "queued": self.queued,
+            "processed": self.processed,
+            "rejected": self.rejected,
+        }
+
+
+class LocalAvatarStorage:
+    """
+    Stores avatar variants as files under ``root/<content hash>/``, served at ``base_url``.
+
+    Stands in for an object store in development and tests.
+    """
+
+    def __init__(self, root: str, base_url: str):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+
+    async def init(self) -> None:
+        await run_in_threadpool(self.root.mkdir, parents=True, exist_ok=True)
+
+    async def exists(self, digest: str) -> bool:
+        """
+        Tells whether the variants of an image are already stored.
+
+        :param digest: The content hash of the image.
+        :type digest: str
+        :return: True if they are.
+        :rtype: bool
+        """
+        return await run_in_threadpool((self.root / digest).is_dir)
+
+    def _write(self, digest: str, variants: Dict[str, bytes]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        partial = Path(tempfile.mkdtemp(prefix=f".{digest}.", dir=self.root))
+        try:
+            for name, data in variants.items():
+                (partial / name).write_bytes(data)
+            # Publishes the whole set at once
+            os.rename(partial, self.root / digest)
+        except OSError:
+            shutil.rmtree(partial, ignore_errors=True)
+            # A concurrent upload of the same image got there first
+            if not (self.root / digest).is_dir():
+                raise
+
+    async def save(self, digest: str, variants: Dict[str, bytes]) -> None:
+        """
+        Stores the variants of an image.
+
+        :param digest: The content hash of the image.
+        :type digest: str
+        :param variants: The encoded variants by name.
+        :type variants: Dict[str, bytes]
+        """
+        await run_in_threadpool(self._write, digest, variants)
+
+    def url(self, digest: str, name: str) -> str:
+        """
+        Returns the public URL of a variant.
+
+        :param digest: The content hash of the image.
+        :type digest: str
+        :param name: The variant name.
+        :type name: str
+        :return: The URL.
+        :rtype: str
+        """
+        return f"{self.base_url}/{digest}/{name}"
+
+
+class CloudinaryAvatarStorage:
+    """
+    Uploads avatar variants to Cloudinary under ``<folder>/<content hash>/``.
+
+    The client is configured once by :meth:`init`; the blocking SDK calls run in the
+    thread pool so the event loop never waits on the network. A raw ``complete`` marker
+    is uploaded once every variant is, so an image whose upload failed part way is
+    processed again; stored images are remembered to spare the rate-limited Admin API.
+    """
+    MARKER = "complete"
+
+    def __init__(self, cloud_name: str, api_key: str, api_secret: str, folder: str = "NotesApp",
+                 known_size: int = 10000):
+        self.options = {"cloud_name": cloud_name, "api_key": api_key, "api_secret": api_secret, "secure": True}
+        self.folder = folder
+        # Stored images are never removed, so positive lookups can be cached for long
+        self.stored = LRUCache(known_size, 24 * 3600)
+
+    async def init(self) -> None:
+        await run_in_threadpool(cloudinary.config, **self.options)
+
+    def _public_id(self, digest: str, name: str) -> str:
+        # Cloudinary reads a dot as the delivery format, keep it out of the id
+        stem, extension = name.rsplit(".", 1)
+        return f"{self.folder}/{digest}/{stem}_{extension}"
+
+    async def exists(self, digest: str) -> bool:
+        """
+        Tells whether all the variants of an image are already stored.
+
+        :param digest: The content hash of the image.
+        :type digest: str
+        :return: True if they are.
+        :rtype: bool
+        """
+        if self.stored.get(digest):
+            return True
+        try:
+            await run_in_threadpool(cloudinary.api.resource, f"{self.folder}/{digest}/{self.MARKER}",
+                                    resource_type="raw")
+        except cloudinary.exceptions.NotFound:
+            return False
+        self.stored.set(digest, True)
+        return True
+
+    async def save(self, digest: str, variants: Dict[str, bytes]) -> None:
+        """
+        Uploads the variants of an image concurrently, then the marker completing the set.
+
+        :param digest: The content hash of the image.
+        :type digest: str
+        :param variants: The encoded variants by name.
+        :type variants: Dict[str, bytes]
+        """
+        await asyncio.gather(*(
+            run_in_threadpool(cloudinary.uploader.upload, data, public_id=self._public_id(digest, name),
+                              overwrite=False)
+            for name, data in variants.items()
+        ))
+        await run_in_threadpool(cloudinary.uploader.upload, json.dumps(sorted(variants)).encode(),
+                                public_id=f"{self.folder}/{digest}/{self.MARKER}", resource_type="raw")
+        self.stored.set(digest, True)
+
+    def url(self, digest: str, name: str) -> str:
+        """
+        Returns the public URL of a variant.
+
+        :param digest: The content hash of the image.
+        :type digest: str
+        :param name: The variant name.
+        :type name: str
+        :return: The URL.
+        :rtype: str
+        """
+        return cloudinary.CloudinaryImage(self._public_id(digest, name)).build_url(format=name.rsplit(".", 1)[1])
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    Static files served with a far-future, immutable ``Cache-Control``.
+
+    Only for content-addressed files, whose URL changes whenever their content does.
+    """
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+
+def create_storage():
+    """
+    Creates the avatar storage backend selected by ``avatar_storage``.
+
+    :return: The storage backend.
+    """
+    if settings.avatar_storage == "local":
+        return LocalAvatarStorage(settings.avatar_local_dir, settings.avatar_base_url)
+    return CloudinaryAvatarStorage(settings.cloudinary_name, settings.cloudinary_api_key,
+                                   settings.cloudinary_api_secret)
+
+
+avatar_storage = create_storage()
+avatar_processor = AvatarProcessor(settings.avatar_sizes, settings.avatar_formats, settings.avatar_quality,
+                                   settings.avatar_max_pixels, settings.avatar_workers, settings.avatar_max_queue)
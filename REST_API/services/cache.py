@@ -0,0 +1,319 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+from redis.exceptions import RedisError
+
+from REST_API.conf.config import settings
+from REST_API.database.models import User
+
+
+class LRUCache:
+    """
+    Bounded in-process LRU mapping whose entries expire after a fixed time to live.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key):
+        """
+        Returns the cached value for a key, or None if it is missing or expired.
+
+        :param key: The cache key.
+        :return: The cached value or None.
+        """
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float | None = None) -> None:
+        """
+        Stores a value, evicting the least recently used entry when the cache is full.
+
+        :param key: The cache key.
+        :param value: The value to store.
+        :param ttl: Time to live in seconds, defaults to the cache TTL.
+        :type ttl: float, optional
+        """
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key) -> None:
+        """
+        Removes a key from the cache if present.
+
+        :param key: The cache key.
+        """
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class UserCache:
+    """
+    Two-tier cache of authenticated users keyed by token subject (the user's email).
+
+    The first tier is a per-process LRU with a short TTL, the second one is Redis, shared
+    by all workers. Invalidation clears the local tier and Redis; other workers drop
+    their local copy when its TTL runs out. Password hashes and the frequently bumped
+    contacts version are never cached.
+    """
+    EXCLUDED_FIELDS = ("password", "contacts_version")
+
+    def __init__(self, maxsize: int, ttl: float, redis_ttl: int, prefix: str = "auth:user:"):
+        self.local = LRUCache(maxsize, ttl)
+        self.redis = None
+        self.redis_ttl = redis_ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def init(self, redis) -> None:
+        """
+        Attaches the async Redis client used as the shared tier.
+
+        :param redis: The ``redis.asyncio`` (or fakeredis) client.
+        """
+        self.redis = redis
+
+    @classmethod
+    def dump(cls, user: User) -> dict:
+        """
+        Serializes the cacheable columns of a user.
+
+        :param user: The user to serialize.
+        :type user: User
+        :return: Column name to value mapping.
+        :rtype: dict
+        """
+        return {column.key: getattr(user, column.key) for column in User.__table__.columns
+                if column.key not in cls.EXCLUDED_FIELDS}
+
+    async def get(self, email: str) -> User | None:
+        """
+        Looks a user up in the local tier, then in Redis.
+
+        :param email: The token subject.
+        :type email: str
+        :return: A detached user built from the cached data, or None on a miss.
+        :rtype: User | None
+        """
+        data = self.local.get(email)
+        if data is not None:
+            self.hits += 1
+            return User(**data)
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self.prefix + email)
+            except RedisError:
+                raw = None
+            if raw is not None:
+                data = json.loads(raw)
+                self.local.set(email, data)
+                self.redis_hits += 1
+                return User(**data)
+        self.misses += 1
+        return None
+
+    async def set(self, user: User) -> None:
+        """
+        Stores a user in both tiers.
+
+        :param user: The user loaded from the database.
+        :type user: User
+        """
+        data = self.dump(user)
+        self.local.set(user.email, data)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.prefix + user.email, json.dumps(data), ex=self.redis_ttl)
+            except RedisError:
+                pass
+
+    async def invalidate(self, email: str) -> None:
+        """
+        Drops a user from both tiers after it has been modified.
+
+        :param email: The email of the modified user.
+        :type email: str
+        """
+        self.local.pop(email)
+        if self.redis is not None:
+            try:
+                await self.redis.delete(self.prefix + email)
+            except RedisError:
+                pass
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counters for the cache.
+
+        :return: The cache statistics.
+        :rtype: dict
+        """
+        return {
+            "size": len(self.local),
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+        }
+
+
+class TokenCache:
+    """
+    Per-process LRU of verified JWT claims, keyed by the SHA-256 digest of the token.
+
+    An access token is sent with every request of its life; once its signature and
+    claims have been checked, repeat requests only hash the token and look it up.
+    Entries live until the token's ``exp``, capped at ``max_ttl``. Revoked tokens, the
+    tokens carrying a revoked ``jti`` or session id (``sid``) and the tokens a subject
+    was issued before :meth:`revoke_subject` are rejected by :meth:`is_revoked` until
+    they expire, for at most ``max_ttl`` (the life of an access token). Revocations are
+    local to the worker; ``services.sessions`` shares them through Redis.
+    """
+
+    def __init__(self, maxsize: int, max_ttl: float, max_revocations: int | None = None):
+        self.max_ttl = max_ttl
+        self.claims = LRUCache(maxsize, max_ttl)
+        self.revoked = LRUCache(max_revocations or maxsize, max_ttl)
+        self.revoked_ids = LRUCache(max_revocations or maxsize, max_ttl)
+        self.revoked_subjects = LRUCache(max_revocations or maxsize, max_ttl)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        """
+        Returns the cache key of a token; the token itself is never stored.
+
+        :param token: The encoded JWT.
+        :type token: str
+        :return: The SHA-256 digest of the token.
+        :rtype: bytes
+        """
+        return hashlib.sha256(token.encode()).digest()
+
+    def _ttl(self, claims: dict) -> float:
+        return min(claims.get("exp", 0) - time.time(), self.max_ttl)
+
+    def get(self, key: bytes) -> dict | None:
+        """
+        Returns the verified claims of a token.
+
+        :param key: The key returned by :meth:`key`.
+        :type key: bytes
+        :return: The claims, or None if the token was not verified recently.
+        :rtype: dict | None
+        """
+        claims = self.claims.get(key)
+        if claims is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return claims
+
+    def set(self, key: bytes, claims: dict) -> None:
+        """
+        Stores the claims of a verified token until it expires.
+
+        :param key: The key returned by :meth:`key`.
+        :type key: bytes
+        :param claims: The verified claims, with ``exp``.
+        :type claims: dict
+        """
+        ttl = self._ttl(claims)
+        if ttl > 0:
+            self.claims.set(key, claims, ttl)
+
+    def revoke(self, key: bytes, claims: dict) -> None:
+        """
+        Rejects a token until it expires.
+
+        :param key: The key returned by :meth:`key`.
+        :type key: bytes
+        :param claims: The claims of the token.
+        :type claims: dict
+        """
+        self.claims.pop(key)
+        ttl = self._ttl(claims)
+        if ttl > 0:
+            self.revoked.set(key, True, ttl)
+
+    def revoke_id(self, token_id: str, ttl: float | None = None) -> None:
+        """
+        Rejects every token whose ``jti`` or ``sid`` claim is ``token_id``.
+
+        :param token_id: The token or session id.
+        :type token_id: str
+        :param ttl: Seconds until the last such token expires, defaults to ``max_ttl``.
+        :type ttl: float, optional
+        """
+        self.revoked_ids.set(token_id, True, min(ttl or self.max_ttl, self.max_ttl))
+
+    def revoke_subject(self, subject: str, revoked_at: float | None = None) -> None:
+        """
+        Rejects every token issued to a subject before ``revoked_at``.
+
+        :param subject: The ``sub`` claim, the user's email.
+        :type subject: str
+        :param revoked_at: The revocation time, defaults to now.
+        :type revoked_at: float, optional
+        """
+        revoked_at = time.time() if revoked_at is None else revoked_at
+        self.revoked_subjects.set(subject, int(revoked_at), self.max_ttl - (time.time() - revoked_at))
+
+    def is_revoked(self, key: bytes, claims: dict) -> bool:
+        """
+        Tells whether a verified token has been revoked.
+
+        :param key: The key returned by :meth:`key`.
+        :type key: bytes
+        :param claims: The claims of the token.
+        :type claims: dict
+        :return: True if the token must be rejected.
+        :rtype: bool
+        """
+        if self.revoked.get(key) is not None:
+            return True
+        for claim in ("jti", "sid"):
+            if claim in claims and self.revoked_ids.get(claims[claim]) is not None:
+                return True
+        revoked_at = self.revoked_subjects.get(claims.get("sub"))
+        return revoked_at is not None and claims.get("iat", 0) < revoked_at
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counters for the cache.
+
+        :return: The cache statistics.
+        :rtype: dict
+        """
+        return {
+            "size": len(self.claims),
+            "hits": self.hits,
+            "misses": self.misses,
+            "revoked": len(self.revoked),
+            "revoked_ids": len(self.revoked_ids),
+            "revoked_subjects": len(self.revoked_subjects),
+        }
+
+
+user_cache = UserCache(settings.user_cache_size, settings.user_cache_ttl, settings.user_cache_redis_ttl)
+token_cache = TokenCache(settings.token_cache_size, settings.access_token_ttl, settings.token_revocations_size)
@@ -0,0 +1,266 @@
+import codecs
+import csv
+import io
+import json
+from datetime import date
+from typing import AsyncIterator, Tuple
+
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+CSV_TYPES = ("text/csv", "application/csv")
+JSON_TYPES = ("application/json",)
+
+
+class RecordError(ValueError):
+    """
+    Raised for a single import record that cannot be parsed.
+    """
+
+
+async def _text_chunks(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    async for chunk in stream:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def _lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    buffer = ""
+    async for text in _text_chunks(stream):
+        buffer += text
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def iter_ndjson(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    """
+    Yields ``(row, record)`` pairs from newline-delimited JSON, one object per line.
+
+    Records that are not valid JSON are yielded as :class:`RecordError` instances.
+
+    :param stream: The request body chunks.
+    :return: An async iterator of row numbers and records.
+    """
+    row = 0
+    async for line in _lines(stream):
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            yield row, json.loads(line)
+        except ValueError as e:
+            yield row, RecordError(f"Invalid JSON: {e}")
+
+
+async def iter_csv(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    """
+    Yields ``(row, record)`` pairs from CSV with a header line.
+
+    Quoted fields may contain line breaks: lines are joined until the quotes balance.
+
+    :param stream: The request body chunks.
+    :return: An async iterator of row numbers and records.
+    """
+    header = None
+    pending = ""
+    row = 0
+    async for line in _lines(stream):
+        pending = f"{pending}\n{line}" if pending else line
+        if pending.count('"') % 2:
+            continue
+        record, pending = pending.rstrip("\r"), ""
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        row += 1
+        if len(values) != len(header):
+            yield row, RecordError(f"Expected {len(header)} fields, got {len(values)}")
+            continue
+        yield row, {name: value if value != "" else None for name, value in zip(header, values)}
+    if pending:
+        yield row + 1, RecordError("Unterminated quoted field")
+
+
+async def iter_json_array(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    """
+    Yields ``(row, record)`` pairs from a JSON array, decoding one element at a time.
+
+    The consumed part of the buffer is dropped once per chunk read, not once per record.
+
+    :param stream: The request body chunks.
+    :return: An async iterator of row numbers and records.
+    :raises RecordError: If the body is not a single well-formed JSON array.
+    """
+    decoder = json.JSONDecoder()
+    chunks = _text_chunks(stream)
+    buffer, position = "", 0
+    # What comes next: "[", an element or "]", an element, "," or "]", nothing but whitespace
+    expect = "start"
+    row = 0
+    exhausted = False
+    while True:
+        while position < len(buffer) and buffer[position].isspace():
+            position += 1
+        if position < len(buffer):
+            char = buffer[position]
+            if expect == "start":
+                if char != "[":
+                    raise RecordError("Expected a JSON array")
+                expect, position = "first", position + 1
+                continue
+            if expect == "end":
+                raise RecordError("Unexpected data after the JSON array")
+            if expect == "separator" or (expect == "first" and char == "]"):
+                if char == "]":
+                    expect, position = "end", position + 1
+                elif char == ",":
+                    expect, position = "element", position + 1
+                else:
+                    raise RecordError("Expected ',' or ']' after an array element")
+                continue
+            if char in ",]":
+                raise RecordError(f"Expected an array element, got '{char}'")
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except ValueError as e:
+                if exhausted:
+                    raise RecordError(f"Invalid JSON: {e}")
+            else:
+                # A number cut by the end of a chunk decodes too: only take elements followed by a delimiter
+                if exhausted or (end < len(buffer) and (buffer[end] in ",]" or buffer[end].isspace())):
+                    row += 1
+                    yield row, record
+                    expect, position = "separator", end
+                    continue
+        elif exhausted:
+            if expect != "end":
+                raise RecordError("Unexpected end of JSON array")
+            return
+        try:
+            chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            exhausted = True
+        else:
+            buffer, position = buffer[position:] + chunk, 0
+
+
+def record_parser(content_type: str | None):
+    """
+    Selects the record parser for a request content type.
+
+    :param content_type: The ``Content-Type`` header of the request.
+    :type content_type: str | None
+    :return: The parser, or None if the content type is not supported.
+    """
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in NDJSON_TYPES:
+        return iter_ndjson
+    if media_type in CSV_TYPES:
+        return iter_csv
+    if media_type in JSON_TYPES:
+        return iter_json_array
+    return None
+
+
+EXPORT_FIELDS = ("id", "first_name", "last_name", "email", "phone_number", "birthday", "additional_info")
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def format_ndjson(rows) -> str:
+    """
+    Formats contact rows as newline-delimited JSON.
+
+    :param rows: Mappings with the :data:`EXPORT_FIELDS` keys.
+    :return: One JSON object per line.
+    :rtype: str
+    """
+    return "".join(json.dumps({field: row[field] for field in EXPORT_FIELDS}, default=_json_default,
+                              ensure_ascii=False) + "\n" for row in rows)
+
+
+def format_csv(rows, header: bool = False) -> str:
+    """
+    Formats contact rows as CSV.
+
+    :param rows: Mappings with the :data:`EXPORT_FIELDS` keys.
+    :param header: Whether to start with the header line.
+    :type header: bool
+    :return: The CSV lines.
+    :rtype: str
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    writer.writerows([[row[field] if row[field] is not None else "" for field in EXPORT_FIELDS] for row in rows])
+    return buffer.getvalue()
+
+
+def _vcard_escape(value) -> str:
+    return (str(value).replace("\\", "\\\\").replace(",", "\\,").replace(";", "\\;")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def format_vcard(rows) -> str:
+    """
+    Formats contact rows as vCard 3.0 entries.
+
+    :param rows: Mappings with the :data:`EXPORT_FIELDS` keys.
+    :return: The concatenated vCards.
+    :rtype: str
+    """
+    cards = []
+    for row in rows:
+        first_name, last_name = _vcard_escape(row["first_name"]), _vcard_escape(row["last_name"])
+        lines = [
+            "BEGIN:VCARD",
+            "VERSION:3.0",
+            f"N:{last_name};{first_name};;;",
+            f"FN:{first_name} {last_name}",
+            f"EMAIL;TYPE=INTERNET:{_vcard_escape(row['email'])}",
+            f"TEL:{_vcard_escape(row['phone_number'])}",
+            f"BDAY:{row['birthday'].isoformat()}",
+        ]
+        if row["additional_info"]:
+            lines.append(f"NOTE:{_vcard_escape(row['additional_info'])}")
+        lines.append("END:VCARD")
+        cards.append("\r\n".join(lines) + "\r\n")
+    return "".join(cards)
+
+
+# Export format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "vcard": ("text/vcard", "vcf"),
+}
+
+
+async def export_contacts(batches: AsyncIterator[list], export_format: str) -> AsyncIterator[str]:
+    """
+    Converts batches of contact rows into chunks of the requested export format.
+
+    :param batches: Batches of row mappings, see ``repository.contact.stream_contacts``.
+    :param export_format: One of :data:`EXPORT_FORMATS`.
+    :type export_format: str
+    :return: An async iterator of text chunks, one per batch.
+    """
+    if export_format == "csv":
+        yield format_csv([], header=True)
+    formatter = {"ndjson": format_ndjson, "csv": format_csv, "vcard": format_vcard}[export_format]
+    async for rows in batches:
+        yield formatter(rows)
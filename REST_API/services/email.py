@@ -1,29 +1,219 @@
+import asyncio
+from email.mime.text import MIMEText
+from email.utils import formataddr
 from pathlib import Path
-from conf.config import settings
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+from typing import Iterable, List
+
+import aiosmtplib
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
 from pydantic import EmailStr
 
+from REST_API.conf.config import settings
 from REST_API.services.auth import auth_service
+from REST_API.services.mail_queue import mail_queue
+
+TEMPLATE_FOLDER = Path(__file__).parent / 'templates'
+
+
+
+class EmailTemplates:
+    """
+    Email templates compiled once and kept in memory.
+
+    :meth:`load` compiles every template of the folder at startup; lookups afterwards
+    are a dictionary access, without the file system checks Jinja does to reload
+    changed templates.
+    """
+
+    def __init__(self, folder: Path):
+        self.environment = Environment(loader=FileSystemLoader(folder), autoescape=select_autoescape(["html"]),
+                                       auto_reload=False)
+        self.compiled = {}
+
+    def load(self) -> None:
+        """
+        Compiles every template of the folder.
+        """
+        for name in self.environment.list_templates():
+            self.compiled[name] = self.environment.get_template(name)
+
+    def get(self, name: str) -> Template:
+        """
+        Returns a compiled template, compiling it on first use if :meth:`load` was not called.
+
+        :param name: The template file name.
+        :type name: str
+        :return: The compiled template.
+        :rtype: Template
+        """
+        template = self.compiled.get(name)
+        if template is None:
+            template = self.compiled[name] = self.environment.get_template(name)
+        return template
+
+    def render(self, name: str, context: dict) -> str:
+        """
+        Renders a template.
+
+        :param name: The template file name.
+        :type name: str
+        :param context: The template variables.
+        :type context: dict
+        :return: The rendered text.
+        :rtype: str
+        """
+        return self.get(name).render(context)
+
+    def render_batch(self, name: str, contexts: Iterable[dict]) -> List[str]:
+        """
+        Renders one template for many recipients.
+
+        :param name: The template file name.
+        :type name: str
+        :param contexts: The template variables of every recipient.
+        :type contexts: Iterable[dict]
+        :return: The rendered texts, in the order of the contexts.
+        :rtype: List[str]
+        """
+        render = self.get(name).render
+        return [render(context) for context in contexts]
+
+
+email_templates = EmailTemplates(TEMPLATE_FOLDER)
+
+
+def build_message(recipient: str, subject: str, html: str) -> MIMEText:
+    """
+    Builds an HTML email from the configured sender.
+
+    :param recipient: The recipient address.
+    :type recipient: str
+    :param subject: The subject line.
+    :type subject: str
+    :param html: The HTML body.
+    :type html: str
+    :return: The message.
+    :rtype: MIMEText
+    """
+    # The compat32 MIMEText is an order of magnitude cheaper to build than EmailMessage
+    message = MIMEText(html, "html", "utf-8")
+    message["From"] = formataddr((settings.mail_from_name, settings.mail_from))
+    message["To"] = recipient
+    message["Subject"] = subject
+    return message
+
+
+def build_verification_emails(payloads: List[dict]) -> List[MIMEText]:
+    """
+    Builds the email verification messages of a batch of ``verify_email`` jobs.
+
+    :param payloads: The job payloads with ``email``, ``username``, ``host`` and ``token``.
+    :type payloads: List[dict]
+    :return: The messages, in the order of the payloads.
+    :rtype: List[MIMEText]
+    :raises KeyError: If a payload lacks a field.
+    """
+    bodies = email_templates.render_batch("email_template.html", (
+        {"host": payload["host"], "username": payload["username"], "token": payload["token"]} for payload in payloads
+    ))
+    return [build_message(payload["email"], "Confirm your email ", html) for payload, html in zip(payloads, bodies)]
+
+
+# Job kind -> function building the messages of a batch of jobs from their payloads
+JOB_BUILDERS = {
+    "verify_email": build_verification_emails,
+}
+
+
+class SMTPPool:
+    """
+    A small pool of persistent SMTP connections.
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=EmailStr(settings.mail_from),
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME="Desired Name",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
+    Connections are opened (and authenticated) on first use and then reused for every
+    following message; a connection the server has dropped is reopened once before the
+    send is reported as failed.
+    """
+
+    def __init__(self, size: int, **options):
+        self.size = size
+        self.options = options
+        self.semaphore = asyncio.Semaphore(size)
+        self.idle = []
+        self.connects = 0
+        self.sent = 0
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(**self.options)
+        await client.connect()
+        self.connects += 1
+        return client
+
+    async def send(self, message: MIMEText) -> None:
+        """
+        Sends a message over a pooled connection.
+
+        :param message: The message to send.
+        :type message: MIMEText
+        :raises aiosmtplib.SMTPException: If the message could not be sent.
+        """
+        async with self.semaphore:
+            client = self.idle.pop() if self.idle else None
+            try:
+                if client is None or not client.is_connected:
+                    client = await self._connect()
+                try:
+                    await client.send_message(message)
+                except aiosmtplib.SMTPServerDisconnected:
+                    client = await self._connect()
+                    await client.send_message(message)
+            except (aiosmtplib.SMTPResponseException, aiosmtplib.SMTPRecipientsRefused):
+                # The server answered, the connection is still usable
+                self.idle.append(client)
+                raise
+            except BaseException:
+                if client is not None:
+                    client.close()
+                raise
+            self.idle.append(client)
+            self.sent += 1
+
+    async def close(self) -> None:
+        """
+        Closes every idle connection.
+        """
+        while self.idle:
+            client = self.idle.pop()
+            try:
+                await client.quit()
+            except aiosmtplib.SMTPException:
+                client.close()
+
+
+def smtp_pool(size: int | None = None) -> SMTPPool:
+    """
+    Creates an SMTP pool for the configured mail server.
+
+    :param size: The number of connections, defaults to ``mail_pool_size``.
+    :type size: int | None
+    :return: The pool.
+    :rtype: SMTPPool
+    """
+    return SMTPPool(
+        settings.mail_pool_size if size is None else size,
+        hostname=settings.mail_server,
+        port=settings.mail_port,
+        username=settings.mail_username if settings.mail_use_credentials else None,
+        password=settings.mail_password if settings.mail_use_credentials else None,
+        use_tls=settings.mail_ssl_tls,
+        start_tls=settings.mail_starttls,
+        validate_certs=settings.mail_validate_certs,
+        timeout=settings.mail_timeout,
+    )
 
 
 async def send_email(email: EmailStr, username: str, host: str):
     """
-    Sends an email for email verification.
+    Queues an email for email verification; the mail worker sends it.
 
     :param email: The email address to send the verification email to.
     :type email: EmailStr
@@ -31,17 +221,11 @@ async def send_email(email: EmailStr, username: str, host: str):
     :type username: str
     :param host: The base URL of the application.
     :type host: str
+    :return: The job id.
+    :rtype: str
+    :raises RedisError: If the job could not be queued.
     """
-    try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
+    token_verification = await auth_service.create_email_token({"sub": email})
+    return await mail_queue.enqueue("verify_email", {
+        "email": email, "username": username, "host": str(host), "token": token_verification,
+    })
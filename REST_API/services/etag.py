@@ -0,0 +1,49 @@
+import hashlib
+
+from fastapi import Request
+
+
+def make_etag(*parts) -> str:
+    """
+    Builds a weak ETag from the values a response depends on.
+
+    :param parts: Version numbers and request parameters.
+    :return: The quoted weak ETag.
+    :rtype: str
+    """
+    digest = hashlib.sha1(":".join(map(str, parts)).encode()).hexdigest()[:16]
+    return f'W/"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Checks the ``If-None-Match`` header of a request against an ETag (weak comparison).
+
+    :param request: The incoming request.
+    :type request: Request
+    :param etag: The current ETag of the resource.
+    :type etag: str
+    :return: True if the client already has the current representation.
+    :rtype: bool
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def etag_headers(etag: str) -> dict:
+    """
+    Returns the validator headers of a per-user response.
+
+    The response depends on the bearer token, so shared caches must not store it.
+
+    :param etag: The ETag of the response.
+    :type etag: str
+    :return: The ``ETag``, ``Cache-Control`` and ``Vary`` headers.
+    :rtype: dict
+    """
+    return {"ETag": etag, "Cache-Control": "private", "Vary": "Authorization"}
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+
+import orjson
+from redis.exceptions import RedisError
+
+from REST_API.conf.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Queued in place of the dropped events of a subscriber that fell behind
+RESYNC = {"event": "resync"}
+
+
+class Subscriber:
+    """
+    A single event stream connection with a bounded queue.
+
+    When the queue is full the pending events are dropped and replaced by one
+    :data:`RESYNC` event, telling the client to catch up from the change feed. A slow
+    client therefore never holds more than ``max_queue`` events in memory.
+    """
+    __slots__ = ("user_id", "queue", "dropped")
+
+    def __init__(self, user_id: int, max_queue: int):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(max_queue)
+        self.dropped = 0
+
+    def put(self, event: dict) -> int:
+        """
+        Queues an event without waiting.
+
+        :param event: The event.
+        :type event: dict
+        :return: The number of events dropped to make room.
+        :rtype: int
+        """
+        try:
+            self.queue.put_nowait(event)
+            return 0
+        except asyncio.QueueFull:
+            dropped = self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            self.dropped += dropped
+            return dropped
+
+    async def get(self, timeout: float) -> dict | None:
+        """
+        Waits for the next event.
+
+        :param timeout: Seconds to wait.
+        :type timeout: float
+        :return: The event, or None if none arrived in time.
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class ContactEventBroker:
+    """
+    Fans contact change events out to the event stream connections of every worker.
+
+    Events are published to a per-user Redis channel. Each worker holds a single pattern
+    subscription for all users, however many connections it serves, and dispatches the
+    messages to the local subscribers of the user. Without Redis, events only reach the
+    subscribers of the publishing worker.
+    """
+
+    def __init__(self, max_connections: int, max_queue: int, prefix: str = "contacts:events:"):
+        self.max_connections = max_connections
+        self.max_queue = max_queue
+        self.prefix = prefix
+        self.redis = None
+        self.subscribers = {}
+        self.connections = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.rejected = 0
+        self._reader = None
+
+    def init(self, redis) -> None:
+        """
+        Attaches the async Redis client used for the fanout.
+
+        :param redis: The ``redis.asyncio`` (or fakeredis) client.
+        """
+        self.redis = redis
+
+    async def close(self) -> None:
+        """
+        Stops the pattern subscription of this worker.
+        """
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+
+    async def publish(self, user_id: int, changes: list, event: str = "change") -> None:
+        """
+        Publishes contact changes of a user to all workers.
+
+        :param user_id: The owner of the changed contacts.
+        :type user_id: int
+        :param changes: ``{"op": ..., "contact_id": ...}`` entries.
+        :type changes: list
+        :param event: The event name, ``change`` or ``resync`` for writes too large to list.
+        :type event: str
+        """
+        message = {"event": event, "changes": changes}
+        self.published += 1
+        if self.redis is None:
+            self._dispatch(user_id, message)
+            return
+        try:
+            await self.redis.publish(f"{self.prefix}{user_id}", orjson.dumps(message))
+        except RedisError:
+            logger.warning("Could not publish contact events, delivering locally only")
+            self._dispatch(user_id, message)
+
+    def _dispatch(self, user_id: int, message: dict) -> None:
+        for subscriber in self.subscribers.get(user_id, ()):
+            self.dropped += subscriber.put(message)
+            self.delivered += 1
+
+    async def _read(self) -> None:
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.psubscribe(f"{self.prefix}*")
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    channel = message["channel"]
+                    channel = channel.decode() if isinstance(channel, bytes) else channel
+                    try:
+                        self._dispatch(int(channel[len(self.prefix):]), orjson.loads(message["data"]))
+                    except ValueError:
+                        logger.warning("Ignoring malformed contact event on %s", channel)
+            except RedisError:
+                logger.warning("Contact event subscription lost, reconnecting")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def subscribe(self, user_id: int) -> Subscriber | None:
+        """
+        Registers a new event stream connection.
+
+        :param user_id: The user of the connection.
+        :type user_id: int
+        :return: The subscriber, or None when the worker is at ``max_connections``.
+        :rtype: Subscriber | None
+        """
+        if self.connections >= self.max_connections:
+            self.rejected += 1
+            return None
+        if self.redis is not None and (self._reader is None or self._reader.done()):
+            self._reader = asyncio.create_task(self._read())
+        subscriber = Subscriber(user_id, self.max_queue)
+        self.subscribers.setdefault(user_id, set()).add(subscriber)
+        self.connections += 1
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        """
+        Unregisters a closed event stream connection.
+
+        :param subscriber: The subscriber returned by :meth:`subscribe`.
+        :type subscriber: Subscriber
+        """
+        subscribers = self.subscribers.get(subscriber.user_id)
+        if subscribers is None or subscriber not in subscribers:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self.subscribers[subscriber.user_id]
+        self.connections -= 1
+
+    def stats(self) -> dict:
+        """
+        Returns the connection and delivery counters of this worker.
+
+        :return: The broker statistics.
+        :rtype: dict
+        """
+        return {
+            "connections": self.connections,
+            "users": len(self.subscribers),
+            "max_connections": self.max_connections,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+        }
+
+
+contact_events = ContactEventBroker(settings.events_max_connections, settings.events_queue_size)
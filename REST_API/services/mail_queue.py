@@ -0,0 +1,184 @@
+import time
+import uuid
+
+import orjson
+from redis.exceptions import RedisError
+
+from REST_API.conf.config import settings
+
+# Moves the retries that are due from the delayed set back to the ready list, atomically
+PROMOTE_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, job in ipairs(due) do
+    redis.call('ZREM', KEYS[1], job)
+    redis.call('LPUSH', KEYS[2], job)
+end
+return #due
+"""
+
+
+class MailQueue:
+    """
+    Durable Redis-backed queue of outgoing email jobs.
+
+    Jobs are JSON documents pushed to a ready list. A worker moves them atomically into
+    its own processing list while it sends them, so a job is never lost if the worker
+    dies: on start the worker puts whatever is left in its processing list back in the
+    ready list. Failed jobs are retried with exponential backoff through a delayed
+    sorted set and end up in a dead-letter list after ``max_attempts``.
+    """
+
+    def __init__(self, max_attempts: int, retry_delay: float, prefix: str = "mail:"):
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.prefix = prefix
+        self.ready_key = f"{prefix}queue"
+        self.delayed_key = f"{prefix}delayed"
+        self.dead_key = f"{prefix}dead"
+        self.stats_key = f"{prefix}stats"
+        self.redis = None
+        self._promote = None
+
+    def init(self, redis) -> None:
+        """
+        Attaches the async Redis client. It must decode responses.
+
+        :param redis: The ``redis.asyncio`` (or fakeredis) client.
+        """
+        self.redis = redis
+        self._promote = redis.register_script(PROMOTE_DUE)
+
+    def processing_key(self, worker: str) -> str:
+        return f"{self.prefix}processing:{worker}"
+
+    async def enqueue(self, kind: str, payload: dict) -> str:
+        """
+        Adds a job to the queue.
+
+        :param kind: The job kind, see ``services.email.JOB_BUILDERS``.
+        :type kind: str
+        :param payload: The data the message is built from.
+        :type payload: dict
+        :return: The job id.
+        :rtype: str
+        :raises RedisError: If the job could not be stored.
+        """
+        job = {"id": uuid.uuid4().hex, "kind": kind, "payload": payload, "attempts": 0, "enqueued_at": time.time()}
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lpush(self.ready_key, orjson.dumps(job))
+            pipe.hincrby(self.stats_key, "enqueued", 1)
+            await pipe.execute()
+        return job["id"]
+
+    async def recover(self, worker: str) -> int:
+        """
+        Puts the jobs a previous run of the worker left unfinished back in the queue.
+
+        :param worker: The worker name.
+        :type worker: str
+        :return: The number of recovered jobs.
+        :rtype: int
+        """
+        count = 0
+        while await self.redis.lmove(self.processing_key(worker), self.ready_key, "LEFT", "RIGHT") is not None:
+            count += 1
+        return count
+
+    async def reserve(self, worker: str, batch_size: int, timeout: float) -> list:
+        """
+        Takes up to ``batch_size`` jobs, waiting up to ``timeout`` seconds for the first one.
+
+        :param worker: The worker name.
+        :type worker: str
+        :param batch_size: The maximum number of jobs.
+        :type batch_size: int
+        :param timeout: Seconds to wait for a job.
+        :type timeout: float
+        :return: The raw jobs, to be passed to :meth:`ack` or :meth:`retry`.
+        :rtype: list
+        """
+        processing = self.processing_key(worker)
+        await self._promote(keys=[self.delayed_key, self.ready_key], args=[time.time(), batch_size])
+        first = await self.redis.blmove(self.ready_key, processing, timeout, "RIGHT", "LEFT")
+        if first is None:
+            return []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for _ in range(batch_size - 1):
+                pipe.lmove(self.ready_key, processing, "RIGHT", "LEFT")
+            rest = await pipe.execute()
+        return [first] + [raw for raw in rest if raw is not None]
+
+    async def ack(self, worker: str, raws: list) -> None:
+        """
+        Removes sent jobs from the processing list.
+
+        :param worker: The worker name.
+        :type worker: str
+        :param raws: The raw jobs returned by :meth:`reserve`.
+        :type raws: list
+        """
+        if not raws:
+            return
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for raw in raws:
+                pipe.lrem(self.processing_key(worker), 1, raw)
+            pipe.hincrby(self.stats_key, "sent", len(raws))
+            await pipe.execute()
+
+    async def retry(self, worker: str, raw, error: str, permanent: bool = False) -> bool:
+        """
+        Schedules a failed job for another attempt, or dead-letters it.
+
+        :param worker: The worker name.
+        :type worker: str
+        :param raw: The raw job returned by :meth:`reserve`.
+        :param error: A description of the failure.
+        :type error: str
+        :param permanent: Dead-letter the job right away, e.g. on a rejected recipient.
+        :type permanent: bool
+        :return: True if the job will be retried, False if it was dead-lettered.
+        :rtype: bool
+        """
+        try:
+            job = orjson.loads(raw)
+            job["attempts"] = int(job.get("attempts", 0)) + 1
+            job["error"] = error
+        except (ValueError, TypeError, AttributeError):
+            # Dead-letter a malformed job as it was queued
+            job = None
+        retried = job is not None and not permanent and job["attempts"] < self.max_attempts
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.lrem(self.processing_key(worker), 1, raw)
+            if retried:
+                due = time.time() + self.retry_delay * 2 ** (job["attempts"] - 1)
+                pipe.zadd(self.delayed_key, {orjson.dumps(job): due})
+                pipe.hincrby(self.stats_key, "retried", 1)
+            else:
+                pipe.lpush(self.dead_key, raw if job is None else orjson.dumps(job))
+                pipe.hincrby(self.stats_key, "dead", 1)
+            await pipe.execute()
+        return retried
+
+    async def stats(self) -> dict:
+        """
+        Returns the queue lengths and the counters shared by all workers.
+
+        :return: The queue statistics, empty when Redis is unavailable.
+        :rtype: dict
+        """
+        if self.redis is None:
+            return {}
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.llen(self.ready_key)
+                pipe.zcard(self.delayed_key)
+                pipe.llen(self.dead_key)
+                pipe.hgetall(self.stats_key)
+                ready, delayed, dead, counters = await pipe.execute()
+        except RedisError:
+            return {}
+        return {"ready": ready, "delayed": delayed, "dead": dead,
+                **{name: int(value) for name, value in counters.items()}}
+
+
+mail_queue = MailQueue(settings.mail_max_attempts, settings.mail_retry_delay)
@@ -0,0 +1,87 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification on a bounded thread pool.
+
+    bcrypt releases the GIL while it works, so threads are enough to keep the event loop
+    free. At most ``max_workers`` hashes run at once; up to ``max_queue`` further calls
+    wait for a slot and any call beyond that is rejected with 503.
+    """
+
+    def __init__(self, context: CryptContext, max_workers: int, max_queue: int):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self.semaphore = asyncio.Semaphore(max_workers)
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+
+    async def _run(self, func, *args):
+        if self.semaphore.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Too many concurrent authentication requests")
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        """
+        Hashes a password without blocking the event loop.
+
+        :param password: The password to hash.
+        :type password: str
+        :return: The hashed password.
+        :rtype: str
+        """
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        Verifies a password against its hash without blocking the event loop.
+
+        :param plain_password: The plain text password.
+        :type plain_password: str
+        :param hashed_password: The hashed password.
+        :type hashed_password: str
+        :return: True if the passwords match, False otherwise.
+        :rtype: bool
+        """
+        return await self._run(self.context.verify, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        """
+        Returns the concurrency and queue-depth metrics of the pool.
+
+        :return: The hasher statistics.
+        :rtype: dict
+        """
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": self.queued,
+            "max_queue_depth": self.max_queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,220 @@
+import logging
+import math
+import time
+from dataclasses import dataclass
+
+from fastapi import Depends, HTTPException, Request, status
+from redis.exceptions import RedisError
+
+from REST_API.conf.config import settings
+from REST_API.database.models import User
+from REST_API.services.auth import auth_service
+from REST_API.services.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# GCRA token bucket. The key holds the theoretical arrival time (TAT) of the bucket in
+# microseconds of the Redis clock: the bucket is full once TAT <= now and every token
+# taken pushes TAT one emission interval further. Takes up to ARGV[3] tokens and
+# returns {granted, remaining, microseconds until full, microseconds until a token}.
+TAKE_TOKENS = """
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local wanted = tonumber(ARGV[3])
+local interval = period / limit
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000000 + tonumber(clock[2])
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if tat == nil or tat < now then
+    tat = now
+end
+local available = math.floor((now + period - tat) / interval)
+local granted = math.min(wanted, available)
+if granted <= 0 then
+    return {0, 0, math.floor(tat - now), math.ceil(tat + interval - period - now)}
+end
+tat = math.floor(tat + granted * interval)
+redis.call('SET', KEYS[1], string.format('%d', tat), 'PX', math.ceil((tat - now) / 1000))
+return {granted, available - granted, tat - now, 0}
+"""
+
+
+@dataclass(slots=True)
+class RateLimitState:
+    """
+    The outcome of a rate limit check, as sent in the ``RateLimit-*`` headers.
+    """
+    limit: int
+    seconds: int
+    remaining: int
+    reset: float
+    retry_after: float = 0
+
+    def headers(self) -> dict:
+        """
+        Returns the ``RateLimit-*`` headers, and ``Retry-After`` for a rejected request.
+
+        :return: The headers.
+        :rtype: dict
+        """
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset)),
+            "RateLimit-Policy": f"{self.limit};w={self.seconds}",
+        }
+        if self.retry_after:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+class RateLimitService:
+    """
+    Token-bucket rate limits shared by all workers through Redis.
+
+    Every check is a single atomic script call. To spare Redis the checks of callers
+    far from their limit, a worker may take a lease of several tokens at once and
+    spend them locally: ``lease`` is the fraction of the limit taken per call, so
+    with the default 0.1 a 100 per minute limit costs one Redis call per 10
+    requests, while limits under 20 are checked against Redis every time. Leased
+    tokens are counted as spent, so callers never exceed the limit, and unused
+    ones are dropped after ``lease_ttl`` seconds.
+
+    Until :meth:`init` is called, or while Redis is unavailable, requests are let
+    through.
+    """
+
+    def __init__(self, lease: float, lease_ttl: float, max_leases: int, prefix: str = "ratelimit:"):
+        self.lease = lease
+        self.lease_ttl = lease_ttl
+        self.prefix = prefix
+        self.leases = LRUCache(max_leases, lease_ttl)
+        self.redis = None
+        self._take = None
+        self.checks = 0
+        self.redis_calls = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def init(self, redis) -> None:
+        """
+        Attaches the async Redis client.
+
+        :param redis: The ``redis.asyncio`` (or fakeredis) client.
+        """
+        self.redis = redis
+        self._take = redis.register_script(TAKE_TOKENS)
+        self.leases.clear()
+
+    async def hit(self, key: str, limit: int, seconds: int) -> RateLimitState | None:
+        """
+        Takes a token from a bucket of ``limit`` tokens refilled over ``seconds``.
+
+        :param key: The bucket, e.g. ``<route>:user:<id>``.
+        :type key: str
+        :param limit: The number of requests allowed per period, and the burst size.
+        :type limit: int
+        :param seconds: The period.
+        :type seconds: int
+        :return: The state after the request, None if it could not be checked.
+        :rtype: RateLimitState | None
+        """
+        self.checks += 1
+        lease = self.leases.get(key)
+        if lease is not None and lease[0] > 0:
+            lease[0] -= 1
+            return RateLimitState(limit, seconds, lease[1] + lease[0], max(lease[2] - time.monotonic(), 0))
+        if self.redis is None:
+            return None
+        wanted = max(1, int(limit * self.lease))
+        try:
+            self.redis_calls += 1
+            granted, remaining, reset, retry_after = await self._take(
+                keys=[f"{self.prefix}{key}"], args=[limit, seconds * 1_000_000, wanted])
+        except RedisError:
+            self.errors += 1
+            logger.warning("Rate limit check failed, letting the request through")
+            return None
+        state = RateLimitState(limit, seconds, remaining + max(granted - 1, 0), reset / 1_000_000,
+                               retry_after / 1_000_000)
+        if not granted:
+            self.rejected += 1
+        elif granted > 1:
+            self.leases.set(key, [granted - 1, remaining, time.monotonic() + state.reset])
+        return state
+
+    def stats(self) -> dict:
+        """
+        Returns the check counters of this worker.
+
+        :return: The rate limiter statistics.
+        :rtype: dict
+        """
+        return {
+            "checks": self.checks,
+            "redis_calls": self.redis_calls,
+            "local_checks": self.checks - self.redis_calls,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "leases": len(self.leases),
+        }
+
+
+rate_limits = RateLimitService(settings.rate_limit_lease, settings.rate_limit_lease_ttl,
+                               settings.rate_limit_max_leases)
+
+
+class RateLimiter:
+    """
+    Route dependency limiting each caller to ``times`` requests per ``seconds``.
+
+    Callers are identified by their user when the request is authenticated, by their IP
+    address otherwise; every route has its own buckets. The ``RateLimit-*`` headers are
+    added to the response by :class:`RateLimitHeadersMiddleware`.
+    """
+
+    def __init__(self, times: int, seconds: int, name: str | None = None):
+        self.times = times
+        self.seconds = seconds
+        self.name = name
+
+    async def __call__(self, request: Request, user: User | None = Depends(auth_service.get_optional_user)):
+        name = self.name
+        if name is None:
+            endpoint = request.scope.get("endpoint")
+            name = f"{endpoint.__module__}.{endpoint.__name__}" if endpoint else request.url.path
+        identity = f"user:{user.id}" if user is not None else f"ip:{request.client.host if request.client else '-'}"
+        state = await rate_limits.hit(f"{name}:{identity}", self.times, self.seconds)
+        if state is None:
+            return
+        if state.retry_after:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too Many Requests",
+                                headers=state.headers())
+        request.state.rate_limit = state
+
+
+class RateLimitHeadersMiddleware:
+    """
+    ASGI middleware adding the ``RateLimit-*`` headers of the request to its response.
+
+    The route dependency cannot set them itself on responses the endpoint builds, such as
+    cached or streamed ones.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                state = scope.get("state", {}).get("rate_limit")
+                if state is not None:
+                    headers = list(message.get("headers", []))
+                    headers.extend((name.lower().encode(), value.encode()) for name, value in state.headers().items())
+                    message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
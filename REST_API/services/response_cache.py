@@ -0,0 +1,79 @@
+import hashlib
+import json
+
+from redis.exceptions import RedisError
+
+
+class ResponseCache:
+    """
+    Per-user cache of serialized contact responses stored in Redis.
+
+    Entry keys embed the user's collection version, ``User.contacts_version``, which
+    every contact write bumps in the same transaction. A write therefore makes the
+    cached responses of the user unreachable without touching Redis, and the cache
+    can never serve a body older than the version the ETag was computed from; stale
+    entries expire on their own.
+    """
+
+    def __init__(self, prefix: str = "contacts:cache:"):
+        self.prefix = prefix
+        self.redis = None
+
+    def init(self, redis) -> None:
+        """
+        Attaches the async Redis client. Until this is called the cache is disabled.
+
+        :param redis: The ``redis.asyncio`` (or fakeredis) client.
+        """
+        self.redis = redis
+
+    def _entry_key(self, user_id: int, version: int, endpoint: str, params: dict) -> str:
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        return f"{self.prefix}{user_id}:v{version}:{endpoint}:{digest}"
+
+    async def get(self, user_id: int, version: int, endpoint: str, params: dict):
+        """
+        Returns a cached response body.
+
+        :param user_id: The owner of the response.
+        :type user_id: int
+        :param version: The collection version of the user.
+        :type version: int
+        :param endpoint: The name of the cached endpoint.
+        :type endpoint: str
+        :param params: The request parameters the response depends on.
+        :type params: dict
+        :return: The cached body, or None on a miss.
+        """
+        if self.redis is None:
+            return None
+        try:
+            return await self.redis.get(self._entry_key(user_id, version, endpoint, params))
+        except RedisError:
+            return None
+
+    async def set(self, user_id: int, version: int, endpoint: str, params: dict, body, ttl: int) -> None:
+        """
+        Stores a response body under the given version.
+
+        :param user_id: The owner of the response.
+        :type user_id: int
+        :param version: The collection version read before the response was built.
+        :type version: int
+        :param endpoint: The name of the cached endpoint.
+        :type endpoint: str
+        :param params: The request parameters the response depends on.
+        :type params: dict
+        :param body: The serialized response body.
+        :param ttl: Time to live in seconds.
+        :type ttl: int
+        """
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(self._entry_key(user_id, version, endpoint, params), body, ex=ttl)
+        except RedisError:
+            pass
+
+
+response_cache = ResponseCache()
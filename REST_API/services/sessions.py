@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import time
+import uuid
+
+import orjson
+from redis.exceptions import RedisError
+
+from REST_API.conf.config import settings
+from REST_API.services.cache import TokenCache, token_cache
+
+logger = logging.getLogger(__name__)
+
+# Registers a session and evicts the oldest ones of the user beyond ARGV[5];
+# returns the ids of the evicted sessions
+CREATE_SESSION = """
+local now = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - ttl)
+redis.call('HSET', KEYS[2], 'sub', ARGV[6], 'jti', ARGV[2], 'created', ARGV[3])
+redis.call('EXPIRE', KEYS[2], ttl)
+redis.call('ZADD', KEYS[1], now, ARGV[1])
+redis.call('EXPIRE', KEYS[1], ttl)
+local excess = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[5])
+if excess <= 0 then
+    return {}
+end
+local evicted = redis.call('ZRANGE', KEYS[1], 0, excess - 1)
+for _, sid in ipairs(evicted) do
+    redis.call('DEL', ARGV[7] .. sid)
+    redis.call('ZREM', KEYS[1], sid)
+end
+return evicted
+"""
+
+# Swaps the refresh token id of a session if the presented one is current: 1 on
+# success, 0 for an unknown session, -1 for a reused token (the session is revoked)
+ROTATE_SESSION = """
+local current = redis.call('HGET', KEYS[2], 'jti')
+if not current then
+    return 0
+end
+if current ~= ARGV[2] then
+    redis.call('DEL', KEYS[2])
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    return -1
+end
+redis.call('HSET', KEYS[2], 'jti', ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+redis.call('ZADD', KEYS[1], ARGV[4], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+
+class SessionStore:
+    """
+    Login sessions and token revocations held in Redis instead of the users table.
+
+    A session is created at login and identified by the ``sid`` claim of its tokens; it
+    stores the id (``jti``) of its current refresh token. Each refresh swaps that id in
+    one atomic script, so refreshing touches Redis only. Presenting a refresh token
+    that was already swapped out revokes the session, as it may have been stolen. A
+    user has at most ``max_sessions`` sessions; logging in again evicts the oldest.
+
+    Revoked sessions, token ids and subjects are written to a Redis denylist, with the
+    remaining life of the access tokens as TTL, and published to every worker. Each
+    worker applies them to its :class:`TokenCache`, so authenticating a request never
+    waits on Redis.
+    """
+
+    def __init__(self, tokens: TokenCache, refresh_ttl: int, access_ttl: int, max_sessions: int,
+                 prefix: str = "auth:"):
+        self.tokens = tokens
+        self.refresh_ttl = refresh_ttl
+        self.access_ttl = access_ttl
+        self.max_sessions = max_sessions
+        self.prefix = prefix
+        self.channel = f"{prefix}revocations"
+        self.redis = None
+        self._create = None
+        self._rotate = None
+        self._reader = None
+
+    def init(self, redis) -> None:
+        """
+        Attaches the async Redis client. It must decode responses.
+
+        :param redis: The ``redis.asyncio`` (or fakeredis) client.
+        """
+        self.redis = redis
+        self._create = redis.register_script(CREATE_SESSION)
+        self._rotate = redis.register_script(ROTATE_SESSION)
+
+    async def start(self) -> None:
+        """
+        Starts applying the revocations published by other workers.
+        """
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+
+    async def close(self) -> None:
+        """
+        Stops the revocation subscription of this worker.
+        """
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+
+    def _sessions_key(self, subject: str) -> str:
+        return f"{self.prefix}sessions:{subject}"
+
+    def _session_key(self, sid: str) -> str:
+        return f"{self.prefix}session:{sid}"
+
+    def _deny_key(self, kind: str, value: str) -> str:
+        return f"{self.prefix}denylist:{kind}:{value}"
+
+    def _apply(self, message: dict) -> None:
+        for token_id in message.get("ids", ()):
+            self.tokens.revoke_id(token_id, message.get("ttl"))
+        if "sub" in message:
+            self.tokens.revoke_subject(message["sub"], message["at"])
+
+    async def _load(self) -> None:
+        # Revocations published while this worker was not listening
+        async for key in self.redis.scan_iter(match=f"{self.prefix}denylist:*", count=1000):
+            kind, value = key[len(self.prefix) + len("denylist:"):].split(":", 1)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.ttl(key)
+                revoked_at, ttl = await pipe.execute()
+            if ttl <= 0:
+                continue
+            if kind == "id":
+                self.tokens.revoke_id(value, ttl)
+            elif revoked_at is not None:
+                self.tokens.revoke_subject(value, float(revoked_at))
+
+    async def _read(self) -> None:
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                await self._load()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._apply(orjson.loads(message["data"]))
+            except RedisError:
+                logger.warning("Token revocation subscription lost, reconnecting")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def _publish(self, pipe, message: dict) -> None:
+        pipe.publish(self.channel, orjson.dumps(message))
+        await pipe.execute()
+        self._apply(message)
+
+    async def create(self, subject: str, jti: str) -> str:
+        """
+        Opens a session for a login.
+
+        :param subject: The user's email.
+        :type subject: str
+        :param jti: The id of the session's first refresh token.
+        :type jti: str
+        :return: The session id, the ``sid`` claim of its tokens.
+        :rtype: str
+        :raises RedisError: If the session could not be stored.
+        """
+        sid = uuid.uuid4().hex
+        evicted = await self._create(
+            keys=[self._sessions_key(subject), self._session_key(sid)],
+            args=[sid, jti, time.time(), self.refresh_ttl, self.max_sessions, subject, f"{self.prefix}session:"])
+        if evicted:
+            await self.deny(evicted)
+        return sid
+
+    async def rotate(self, subject: str, sid: str, jti: str, new_jti: str) -> bool:
+        """
+        Replaces the refresh token of a session.
+
+        :param subject: The user's email.
+        :type subject: str
+        :param sid: The session id.
+        :type sid: str
+        :param jti: The id of the presented refresh token.
+        :type jti: str
+        :param new_jti: The id of the refresh token replacing it.
+        :type new_jti: str
+        :return: True if the presented token was current; a reused token revokes the session.
+        :rtype: bool
+        :raises RedisError: If the session could not be read.
+        """
+        result = await self._rotate(keys=[self._sessions_key(subject), self._session_key(sid)],
+                                    args=[sid, jti, new_jti, time.time(), self.refresh_ttl])
+        if result < 0:
+            await self.deny([sid])
+        return result > 0
+
+    async def sessions(self, subject: str) -> list:
+        """
+        Lists the open sessions of a user, most recently refreshed first.
+
+        :param subject: The user's email.
+        :type subject: str
+        :return: ``(sid, last refresh timestamp)`` pairs.
+        :rtype: list
+        """
+        return await self.redis.zrevrangebyscore(self._sessions_key(subject), "+inf",
+                                                 time.time() - self.refresh_ttl, withscores=True)
+
+    async def revoke(self, subject: str, sid: str) -> None:
+        """
+        Ends a session: its refresh token stops working and its access tokens are denied.
+
+        :param subject: The user's email.
+        :type subject: str
+        :param sid: The session id.
+        :type sid: str
+        """
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._session_key(sid))
+            pipe.zrem(self._sessions_key(subject), sid)
+            await pipe.execute()
+        await self.deny([sid])
+
+    async def revoke_all(self, subject: str) -> None:
+        """
+        Ends every session of a user and denies all the access tokens issued to them so far.
+
+        :param subject: The user's email.
+        :type subject: str
+        """
+        sids = await self.redis.zrange(self._sessions_key(subject), 0, -1)
+        now = time.time()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._sessions_key(subject), *(self._session_key(sid) for sid in sids))
+            # The session ids also cover tokens issued within the second of the revocation
+            for sid in sids:
+                pipe.set(self._deny_key("id", sid), 1, ex=self.access_ttl)
+            pipe.set(self._deny_key("sub", subject), now, ex=self.access_ttl)
+            await self._publish(pipe, {"ids": sids, "ttl": self.access_ttl, "sub": subject, "at": now})
+
+    async def deny(self, token_ids: list, ttl: int | None = None) -> None:
+        """
+        Denies the access tokens carrying one of the ids as ``jti`` or ``sid``.
+
+        :param token_ids: Token or session ids.
+        :type token_ids: list
+        :param ttl: Seconds until the last such token expires, defaults to the access token life.
+        :type ttl: int, optional
+        """
+        ttl = ttl or self.access_ttl
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for token_id in token_ids:
+                pipe.set(self._deny_key("id", token_id), 1, ex=ttl)
+            await self._publish(pipe, {"ids": list(token_ids), "ttl": ttl})
+
+
+session_store = SessionStore(token_cache, settings.refresh_token_ttl, settings.access_token_ttl,
+                             settings.auth_max_sessions)
@@ -0,0 +1,62 @@
+"""
+Measures the ``get_current_user`` dependency for a token reused across requests.
+
+* ``uncached``: every call verifies the JWT signature and parses its claims, as before
+  the verified-token cache.
+* ``cached``: ``services.cache.token_cache`` holds the verified claims, so repeat calls
+  hash the token and look it up.
+
+In both modes the user is served from the local tier of the user cache, so the numbers
+isolate the token handling from the database.
+
+Usage::
+
+    python -m benchmarks.auth_dependency [--tokens 100] [--requests 200]
+"""
+import argparse
+import asyncio
+import time
+
+from REST_API.services.auth import auth_service
+from REST_API.services.cache import token_cache, user_cache
+
+
+async def measure(tokens: list, requests: int, cached: bool) -> float:
+    token_cache.claims.clear()
+    maxsize = token_cache.claims.maxsize
+    if not cached:
+        token_cache.claims.maxsize = 0
+    try:
+        start = time.perf_counter()
+        for _ in range(requests):
+            for token in tokens:
+                await auth_service.get_current_user(token, None)
+        elapsed = time.perf_counter() - start
+    finally:
+        token_cache.claims.maxsize = maxsize
+    return elapsed / (requests * len(tokens)) * 1_000_000
+
+
+async def run(args) -> dict:
+    emails = [f"user{n}@example.com" for n in range(args.tokens)]
+    for n, email in enumerate(emails):
+        user_cache.local.set(email, {"id": n + 1, "email": email, "confirmed": True}, ttl=3600)
+    tokens = [await auth_service.create_access_token({"sub": email}) for email in emails]
+    results = {}
+    for name, cached in (("uncached", False), ("cached", True)):
+        await measure(tokens, 2, cached)
+        results[name] = await measure(tokens, args.requests, cached)
+        print(f"{name:9} {results[name]:8.2f} us/request")
+    print(f"speedup   {results['uncached'] / results['cached']:8.2f}x")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=100, help="distinct tokens, one per user")
+    parser.add_argument("--requests", type=int, default=200, help="requests per token")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
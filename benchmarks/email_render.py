@@ -0,0 +1,85 @@
+"""
+Compares the ways of rendering the email verification message.
+
+* ``per-message``: a new Jinja environment per message, so the template is loaded and
+  compiled every time - what fastapi_mail did for each ``send_message``.
+* ``reloading``: a shared environment with Jinja's default ``auto_reload``, which checks
+  the template file for changes on every lookup.
+* ``compiled``: ``services.email.EmailTemplates`` compiled once, one lookup per batch.
+
+Each path renders the HTML and builds the message with ``services.email.build_message``.
+
+Usage::
+
+    python -m benchmarks.email_render [--messages 2000] [--batch 50]
+"""
+import argparse
+import time
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from REST_API.services.email import TEMPLATE_FOLDER, EmailTemplates, build_message
+
+TEMPLATE = "email_template.html"
+SUBJECT = "Confirm your email "
+
+
+def contexts(count: int) -> list:
+    return [{"host": "https://contacts.example.com/", "username": f"user{n}", "token": f"token.{n:08d}"}
+            for n in range(count)]
+
+
+def per_message(batch: list) -> list:
+    messages = []
+    for context in batch:
+        environment = Environment(loader=FileSystemLoader(TEMPLATE_FOLDER), autoescape=select_autoescape(["html"]))
+        html = environment.get_template(TEMPLATE).render(context)
+        messages.append(build_message(f"{context['username']}@example.com", SUBJECT, html))
+    return messages
+
+
+reloading_environment = Environment(loader=FileSystemLoader(TEMPLATE_FOLDER), autoescape=select_autoescape(["html"]))
+
+
+def reloading(batch: list) -> list:
+    return [build_message(f"{context['username']}@example.com", SUBJECT,
+                          reloading_environment.get_template(TEMPLATE).render(context)) for context in batch]
+
+
+compiled_templates = EmailTemplates(TEMPLATE_FOLDER)
+
+
+def compiled(batch: list) -> list:
+    bodies = compiled_templates.render_batch(TEMPLATE, batch)
+    return [build_message(f"{context['username']}@example.com", SUBJECT, html) for context, html in zip(batch, bodies)]
+
+
+def measure(path, batches: list) -> float:
+    start = time.perf_counter()
+    count = sum(len(path(batch)) for batch in batches)
+    return count / (time.perf_counter() - start)
+
+
+def run(args) -> dict:
+    compiled_templates.load()
+    items = contexts(args.messages)
+    batches = [items[start:start + args.batch] for start in range(0, len(items), args.batch)]
+    assert per_message(batches[0])[0].get_payload() == compiled(batches[0])[0].get_payload()
+    results = {}
+    for name, path in (("per-message", per_message), ("reloading", reloading), ("compiled", compiled)):
+        measure(path, batches[:2])
+        results[name] = measure(path, batches)
+        print(f"{name:12} {results[name]:10.0f} messages/s")
+    print(f"speedup      {results['compiled'] / results['per-message']:10.2f}x over per-message")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=50)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
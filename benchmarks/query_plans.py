@@ -0,0 +1,149 @@
+"""
+Runs the contact repository queries against a seeded SQLite database and captures their
+query plans.
+
+Usage::
+
+    python -m benchmarks.query_plans [--users 20] [--contacts 2000] [--repeat 50] [--check]
+
+With ``--check`` the script exits with status 1 when any captured plan falls back to a
+full scan of the ``contacts`` table, so query plan regressions can fail a CI job.
+"""
+import argparse
+import asyncio
+import random
+import re
+import string
+import sys
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from REST_API.database import search
+from REST_API.database.models import Base, Contact, User
+from REST_API.repository import contact as contact_repository
+
+# A bare "SCAN contacts" (without USING INDEX) is a full table scan
+FULL_SCAN_RE = re.compile(r"\bSCAN contacts\b(?! USING)")
+
+
+def seed(engine, users: int, contacts: int, rng: random.Random) -> None:
+    """
+    Creates the schema and inserts ``users`` users with ``contacts`` contacts each.
+    """
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": i, "email": f"user{i}@example.com", "password": "x", "confirmed": True}
+                                    for i in range(1, users + 1)])
+        rows = []
+        for user_id in range(1, users + 1):
+            for n in range(contacts):
+                first_name = "".join(rng.choices(string.ascii_lowercase, k=6)).title()
+                last_name = "".join(rng.choices(string.ascii_lowercase, k=8)).title()
+                email = f"{first_name}.{last_name}.{user_id}.{n}@example.com".lower()
+                birthday = date(1950, 1, 1) + timedelta(days=rng.randrange(365 * 50))
+                rows.append({
+                    "first_name": first_name,
+                    "last_name": last_name,
+                    "email": email,
+                    "phone_number": "+380500000000",
+                    "birthday": birthday,
+                    "search_text": search.search_text(first_name, last_name, email),
+                    "birthday_ordinal": contact_repository.birthday_ordinal(birthday),
+                    "user_id": user_id,
+                })
+        conn.execute(insert(Contact), rows)
+        conn.exec_driver_sql("ANALYZE")
+
+
+class PlanRecorder:
+    """
+    Records every SELECT sent to the engine so its plan can be explained afterwards.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        self.paused = False
+        event.listen(engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not self.paused:
+            self.statements.append((statement, parameters))
+
+    def explain(self) -> list:
+        self.paused = True
+        plans = []
+        with self.engine.connect() as conn:
+            for statement, parameters in self.statements:
+                rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+                plans.append((statement, [row[-1] for row in rows]))
+        self.paused = False
+        self.statements = []
+        return plans
+
+
+def cases(user: User, contact_id: int, cursor: str):
+    today = date.today()
+    return [
+        ("get_contacts", lambda db: contact_repository.get_contacts(user, db, 500, 50)),
+        ("get_contacts_page[id]", lambda db: contact_repository.get_contacts_page(user, db, None, 50, "id")),
+        ("get_contacts_page[cursor]", lambda db: contact_repository.get_contacts_page(user, db, cursor, 50)),
+        ("get_contacts_page[last_name]",
+         lambda db: contact_repository.get_contacts_page(user, db, None, 50, "last_name")),
+        ("get_contact", lambda db: contact_repository.get_contact(user, db, contact_id)),
+        ("search_contacts", lambda db: contact_repository.search_contacts(user, db, "ab")),
+        ("search_contacts[empty]", lambda db: contact_repository.search_contacts(user, db, None, 0, 50)),
+        ("get_upcoming_birthdays", lambda db: contact_repository.get_upcoming_birthdays(user, db, 7, today)),
+        ("get_upcoming_birthdays[new year]", lambda db: contact_repository.get_upcoming_birthdays(
+            user, db, 7, date(today.year, 12, 28))),
+    ]
+
+
+async def run(args) -> int:
+    engine = create_engine(f"sqlite:///{args.database}")
+    seed(engine, args.users, args.contacts, random.Random(args.seed))
+    recorder = PlanRecorder(engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+
+    user = db.get(User, args.users // 2 + 1)
+    first_page, cursor = await contact_repository.get_contacts_page(user, db, None, 50)
+    recorder.statements = []
+
+    regressions = 0
+    for name, case in cases(user, first_page[0].id, cursor):
+        await case(db)
+        plans = recorder.explain()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            await case(db)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        recorder.statements = []
+        print(f"{name:34} {elapsed * 1000:8.3f} ms")
+        for statement, plan in plans:
+            for line in plan:
+                flagged = FULL_SCAN_RE.search(line) is not None
+                regressions += flagged
+                print(f"    {'!!' if flagged else '  '} {line}")
+    db.close()
+    if regressions:
+        print(f"{regressions} full scan(s) of contacts found", file=sys.stderr)
+    return 1 if args.check and regressions else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="bench_query_plans.db")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--contacts", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check", action="store_true")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
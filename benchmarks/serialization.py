@@ -0,0 +1,84 @@
+"""
+Compares the contact list response paths on a seeded SQLite database.
+
+* ``orm+stdlib``: ORM objects validated through ``schemas.Contact`` (``from_attributes``),
+  converted by ``jsonable_encoder`` and encoded by ``json.dumps`` - the FastAPI
+  default path the contact endpoints used before.
+* ``rows+orjson``: column rows from ``repository.contact.get_contacts`` encoded by orjson.
+
+Usage::
+
+    python -m benchmarks.serialization [--contacts 2000] [--page 100] [--repeat 200]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import List
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.query_plans import seed
+from REST_API.database.models import Contact, User
+from REST_API.repository import contact as contact_repository
+from REST_API.schemas import Contact as ContactSchema
+
+contact_list = TypeAdapter(List[ContactSchema])
+
+
+async def orm_stdlib(user: User, db, limit: int) -> bytes:
+    contacts = db.execute(
+        select(Contact).filter(Contact.user_id == user.id).order_by(Contact.id).limit(limit)
+    ).scalars().all()
+    validated = contact_list.validate_python(contacts, from_attributes=True)
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+async def rows_orjson(user: User, db, limit: int) -> bytes:
+    rows = await contact_repository.get_contacts(user, db, 0, limit)
+    return orjson.dumps([row._asdict() for row in rows])
+
+
+async def measure(path, user: User, session_factory, limit: int, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        # A fresh session per request, as get_db provides, so no identity map reuse
+        db = session_factory()
+        await path(user, db, limit)
+        db.close()
+    return (time.perf_counter() - start) / repeat
+
+
+async def run(args) -> None:
+    engine = create_engine(f"sqlite:///{args.database}")
+    seed(engine, 1, args.contacts, random.Random(0))
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+    db = session_factory()
+    user = db.get(User, 1)
+    db.close()
+    assert json.loads(await orm_stdlib(user, session_factory(), args.page)) == \
+        json.loads(await rows_orjson(user, session_factory(), args.page))
+    results = {}
+    for name, path in (("orm+stdlib", orm_stdlib), ("rows+orjson", rows_orjson)):
+        await measure(path, user, session_factory, args.page, 10)
+        results[name] = await measure(path, user, session_factory, args.page, args.repeat)
+        print(f"{name:12} {results[name] * 1000:8.3f} ms per {args.page}-row page")
+    print(f"speedup      {results['orm+stdlib'] / results['rows+orjson']:8.2f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="bench_serialization.db")
+    parser.add_argument("--contacts", type=int, default=2000)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Compares the write paths of the repositories on a seeded SQLite database.
+
+* ``refresh``: the ORM unit of work followed by ``refresh()`` after the commit (and, for
+  updates, the ``SELECT`` that loads the contact first).
+* ``returning``: a single ``INSERT ... RETURNING`` / ``UPDATE ... RETURNING`` statement.
+
+Both modes run the same repository functions, toggled with ``settings.db_write_returning``.
+Statements are counted with a ``before_cursor_execute`` listener. SQLite runs with
+``synchronous=OFF`` so the fsync on commit does not hide the per-statement cost.
+
+Usage::
+
+    python -m benchmarks.write_path [--contacts 2000] [--repeat 500] [--check]
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import date
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.query_plans import seed
+from REST_API.conf.config import settings
+from REST_API.database.models import User
+from REST_API.repository import auth as auth_repository
+from REST_API.repository import contact as contact_repository
+from REST_API.schemas import ContactCreate, ContactUpdate, UserModel
+
+
+class StatementCounter:
+    """
+    Counts the statements sent to the database by an engine.
+    """
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def contact_data(n: int, prefix: str) -> dict:
+    return {
+        "first_name": f"First{n}",
+        "last_name": f"Last{n}",
+        "email": f"{prefix}.{n}@example.com",
+        "phone_number": "+380500000000",
+        "birthday": date(1990, 1, 1),
+    }
+
+
+async def create_contact(user: User, db, n: int, prefix: str) -> None:
+    await contact_repository.create_contact(user, db, ContactCreate(**contact_data(n, prefix)))
+
+
+async def update_contact(user: User, db, n: int, prefix: str) -> None:
+    await contact_repository.update_contact(user, db, n % 100 + 1, ContactUpdate(**contact_data(n, prefix)))
+
+
+async def create_user(user: User, db, n: int, prefix: str) -> None:
+    await auth_repository.create_user(UserModel(email=f"{prefix}.{n}@example.com", password="secret"), db)
+
+
+async def measure(operation, user: User, session_factory, counter: StatementCounter, repeat: int, prefix: str):
+    statements = counter.count
+    start = time.perf_counter()
+    for n in range(repeat):
+        # A fresh session per request, as get_db provides
+        db = session_factory()
+        await operation(user, db, n, prefix)
+        db.close()
+    return (time.perf_counter() - start) / repeat, (counter.count - statements) / repeat
+
+
+async def run(args) -> int:
+    engine = create_engine(f"sqlite:///{args.database}")
+    event.listen(engine, "connect", lambda connection, record: connection.execute("PRAGMA synchronous=OFF"))
+    seed(engine, 1, args.contacts, random.Random(0))
+    counter = StatementCounter(engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+    user = User(id=1)
+    failures = 0
+    enabled = settings.db_write_returning
+    try:
+        for name, operation in (("create_contact", create_contact), ("update_contact", update_contact),
+                                ("create_user", create_user)):
+            results = {}
+            for mode in ("refresh", "returning"):
+                settings.db_write_returning = mode == "returning"
+                results[mode] = await measure(operation, user, session_factory, counter, args.repeat,
+                                              f"{name}.{mode}")
+                seconds, statements = results[mode]
+                print(f"{name:15} {mode:10} {seconds * 1000:8.3f} ms {statements:5.1f} statements per write")
+            if args.check and results["returning"][1] >= results["refresh"][1]:
+                print(f"FAIL {name}: RETURNING does not save a round trip")
+                failures += 1
+    finally:
+        settings.db_write_returning = enabled
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="bench_write_path.db")
+    parser.add_argument("--contacts", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--check", action="store_true", help="exit with an error if RETURNING saves nothing")
+    raise SystemExit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
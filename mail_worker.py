@@ -0,0 +1,190 @@
+"""
+Sends the emails queued by the API.
+
+Jobs are taken from the Redis queue in batches and sent concurrently over a small pool
+of persistent SMTP connections. Failed sends are retried with backoff and dead-lettered
+after ``mail_max_attempts``; rejected recipients are dead-lettered right away.
+
+Usage::
+
+    python mail_worker.py [--name default] [--batch-size 50] [--pool-size 2]
+
+Every worker process needs its own ``--name``: a restarted worker recovers the jobs its
+previous run left unfinished.
+"""
+import argparse
+import asyncio
+import logging
+import signal
+import time
+
+import aiosmtplib
+import orjson
+import redis.asyncio as redis
+
+from REST_API.conf.config import settings
+from REST_API.services.email import JOB_BUILDERS, SMTPPool, email_templates, smtp_pool
+from REST_API.services.mail_queue import MailQueue, mail_queue
+
+logger = logging.getLogger("mail_worker")
+
+
+class MailWorker:
+    """
+    Moves jobs from a :class:`MailQueue` to an :class:`SMTPPool`.
+    """
+
+    def __init__(self, queue: MailQueue, pool: SMTPPool, name: str = "default", batch_size: int = 50,
+                 poll_timeout: float = 5):
+        self.queue = queue
+        self.pool = pool
+        self.name = name
+        self.batch_size = batch_size
+        self.poll_timeout = poll_timeout
+        self.started = time.monotonic()
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+        self.batches = 0
+
+    async def _reject(self, raw, error: Exception) -> None:
+        await self.queue.retry(self.name, raw, f"Invalid job: {error!r}", permanent=True)
+        self.dead += 1
+
+    async def _build(self, raws: list) -> list:
+        """
+        Builds the messages of a batch with one batch render per job kind.
+
+        Jobs that cannot be decoded or built are dead-lettered and get None instead of a
+        message, so a single bad job never stops the worker.
+        """
+        jobs = [None] * len(raws)
+        messages = [None] * len(raws)
+        by_kind = {}
+        for position, raw in enumerate(raws):
+            try:
+                jobs[position] = orjson.loads(raw)
+                by_kind.setdefault(jobs[position]["kind"], []).append(position)
+            except Exception as e:
+                await self._reject(raw, e)
+        for kind, positions in by_kind.items():
+            try:
+                built = JOB_BUILDERS[kind]([jobs[position]["payload"] for position in positions])
+            except Exception:
+                # Isolate the broken jobs
+                built = []
+                for position in positions:
+                    try:
+                        built.extend(JOB_BUILDERS[kind]([jobs[position]["payload"]]))
+                    except Exception as e:
+                        await self._reject(raws[position], e)
+                        built.append(None)
+            for position, message in zip(positions, built):
+                messages[position] = message
+        return messages
+
+    async def _send(self, raw, message) -> bool:
+        job = orjson.loads(raw)
+        try:
+            await self.pool.send(message)
+        except aiosmtplib.SMTPRecipientsRefused as e:
+            # 5xx replies (e.g. unknown recipient) will not succeed on a retry
+            error = "; ".join(f"{refused.recipient}: {refused.code} {refused.message}" for refused in e.recipients)
+            permanent = all(refused.code >= 500 for refused in e.recipients)
+        except aiosmtplib.SMTPResponseException as e:
+            error, permanent = f"{e.code} {e.message}", e.code >= 500
+        except (aiosmtplib.SMTPException, OSError) as e:
+            error, permanent = repr(e), False
+        else:
+            self.sent += 1
+            return True
+        if await self.queue.retry(self.name, raw, error, permanent):
+            self.retried += 1
+        else:
+            self.dead += 1
+        logger.warning("Sending job %s failed: %s", job.get("id"), error)
+        return False
+
+    async def process_batch(self) -> int:
+        """
+        Reserves a batch of jobs, sends them and acknowledges the sent ones.
+
+        :return: The number of jobs processed, 0 if the queue stayed empty.
+        :rtype: int
+        """
+        raws = await self.queue.reserve(self.name, self.batch_size, self.poll_timeout)
+        if not raws:
+            return 0
+        messages = await self._build(raws)
+        results = await asyncio.gather(*(self._send(raw, message) for raw, message in zip(raws, messages)
+                                         if message is not None))
+        sent = [raw for raw, message in zip(raws, messages) if message is not None]
+        await self.queue.ack(self.name, [raw for raw, ok in zip(sent, results) if ok])
+        self.batches += 1
+        return len(raws)
+
+    def stats(self) -> dict:
+        """
+        Returns the counters and throughput of this worker.
+
+        :return: The worker statistics.
+        :rtype: dict
+        """
+        elapsed = time.monotonic() - self.started
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "dead": self.dead,
+            "batches": self.batches,
+            "connections_opened": self.pool.connects,
+            "messages_per_second": round(self.sent / elapsed, 2) if elapsed else 0.0,
+        }
+
+    async def run(self, stop: asyncio.Event, report_every: float = 60) -> None:
+        """
+        Processes batches until ``stop`` is set.
+
+        :param stop: Set to shut the worker down after the current batch.
+        :type stop: asyncio.Event
+        :param report_every: Seconds between throughput log lines.
+        :type report_every: float
+        """
+        email_templates.load()
+        recovered = await self.queue.recover(self.name)
+        if recovered:
+            logger.info("Recovered %d unfinished jobs", recovered)
+        reported = time.monotonic()
+        try:
+            while not stop.is_set():
+                await self.process_batch()
+                if time.monotonic() - reported >= report_every:
+                    logger.info("Mail worker stats: %s", self.stats())
+                    reported = time.monotonic()
+        finally:
+            await self.pool.close()
+
+
+async def run(args) -> None:
+    client = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, decode_responses=True)
+    mail_queue.init(client)
+    worker = MailWorker(mail_queue, smtp_pool(args.pool_size), args.name, args.batch_size)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    logger.info("Mail worker %s started", args.name)
+    await worker.run(stop)
+    await client.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--name", default="default")
+    parser.add_argument("--batch-size", type=int, default=settings.mail_batch_size)
+    parser.add_argument("--pool-size", type=int, default=settings.mail_pool_size)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,79 @@
-from REST_API.routes import contact, auth,users
+from REST_API.routes import contact, auth, users, metrics
 import uvicorn
 from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 import redis.asyncio as redis
-from fastapi_limiter import FastAPILimiter
 
 from REST_API.conf.config import settings
+from REST_API.services.cache import user_cache
+from REST_API.services.response_cache import response_cache
+from REST_API.services.rate_limit import RateLimitHeadersMiddleware, rate_limits
+from REST_API.services.events import contact_events
+from REST_API.services.mail_queue import mail_queue
+from REST_API.services.sessions import session_store
+from REST_API.services.email import email_templates
+from REST_API.services.avatars import ImmutableStaticFiles, avatar_processor, avatar_storage
 
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # CORS settings
 origins = [ 
     "http://localhost:8000"
     ]
 
+app.add_middleware(RateLimitHeadersMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "RateLimit-Policy", "Retry-After"],
 )
 
 # Include routers
 app.include_router(contact.router, prefix='/api')
 app.include_router(auth.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
+app.include_router(metrics.router, prefix='/api')
+
+# Serve the content-addressed avatars of the local storage backend
+if settings.avatar_storage == "local" and settings.avatar_base_url.startswith("/"):
+    app.mount(settings.avatar_base_url, ImmutableStaticFiles(directory=settings.avatar_local_dir, check_dir=False),
+              name="avatars")
+
 
 @app.on_event("startup")
 async def startup():
     """
-    Performs startup operations such as initializing Redis and setting up rate limiting.
+    Performs startup operations such as initializing Redis, the user cache, rate limiting, the response cache,
+    the contact event fanout and the mail queue, compiles the email templates and configures
+    the avatar storage.
     """
+    email_templates.load()
+    await avatar_storage.init()
     r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
                           decode_responses=True)
-    await FastAPILimiter.init(r)
+    user_cache.init(r)
+    rate_limits.init(r)
+    response_cache.init(r)
+    contact_events.init(r)
+    mail_queue.init(r)
+    session_store.init(r)
+    await session_store.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Stops the contact event and token revocation subscriptions and the avatar processes
+    of this worker.
+    """
+    await contact_events.close()
+    await session_store.close()
+    avatar_processor.close()
 
 
 @app.get("/")
@@ -0,0 +1,64 @@
+"""Contacts search index
+
+Revision ID: 2e08f7df86d2
+Revises: 58dbd08190bd
+Create Date: 2026-10-18 11:03:47.915264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from REST_API.database import search
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2e08f7df86d2'
+down_revision: Union[str, None] = '58dbd08190bd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('search_text', sa.String(), nullable=True))
+
+    # Backfill in Python: accent stripping is not portable SQL
+    bind = op.get_bind()
+    contacts = sa.table('contacts', sa.column('id'), sa.column('first_name'), sa.column('last_name'),
+                        sa.column('email'), sa.column('search_text'))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(contacts.c.id, contacts.c.first_name, contacts.c.last_name, contacts.c.email)
+            .where(contacts.c.id > last_id).order_by(contacts.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            contacts.update().where(contacts.c.id == sa.bindparam('contact_id')),
+            [{'contact_id': row.id, 'search_text': search.search_text(row.first_name, row.last_name, row.email)}
+             for row in rows],
+        )
+        last_id = rows[-1].id
+
+    if bind.dialect.name == 'sqlite':
+        for statement in search.SQLITE_FTS_DDL:
+            op.execute(statement)
+        op.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+    elif bind.dialect.name == 'postgresql':
+        for statement in search.POSTGRES_TRGM_DDL:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        for statement in search.SQLITE_FTS_DROP:
+            op.execute(statement)
+    elif bind.dialect.name == 'postgresql':
+        for statement in search.POSTGRES_TRGM_DROP:
+            op.execute(statement)
+    op.drop_column('contacts', 'search_text')
@@ -0,0 +1,26 @@
+"""Contacts keyset index
+
+Revision ID: 58dbd08190bd
+Revises: 1c2b43eeed22
+Create Date: 2026-10-18 10:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '58dbd08190bd'
+down_revision: Union[str, None] = '1c2b43eeed22'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_contacts_user_id_last_name_id', 'contacts', ['user_id', 'last_name', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_last_name_id', table_name='contacts')
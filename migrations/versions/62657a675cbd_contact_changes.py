@@ -0,0 +1,43 @@
+"""Contact change log
+
+Revision ID: 62657a675cbd
+Revises: bace3db0afdc
+Create Date: 2026-10-18 13:41:52.906114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '62657a675cbd'
+down_revision: Union[str, None] = 'bace3db0afdc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'contact_changes',
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('contact_id', sa.Integer(), nullable=False),
+        sa.Column('op', sa.String(length=6), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('seq'),
+        sqlite_autoincrement=True,
+    )
+    op.create_index('ix_contact_changes_user_id_seq', 'contact_changes', ['user_id', 'seq'], unique=False)
+    # Existing contacts start the log as creations, so a sync from 0 sees every contact
+    op.execute(
+        "INSERT INTO contact_changes (user_id, contact_id, op) "
+        "SELECT user_id, id, 'create' FROM contacts WHERE user_id IS NOT NULL ORDER BY id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contact_changes_user_id_seq', table_name='contact_changes')
+    op.drop_table('contact_changes')
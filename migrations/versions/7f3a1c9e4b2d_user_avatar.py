@@ -0,0 +1,26 @@
+"""User avatar URL
+
+Revision ID: 7f3a1c9e4b2d
+Revises: 62657a675cbd
+Create Date: 2026-10-18 14:35:08.214377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f3a1c9e4b2d'
+down_revision: Union[str, None] = '62657a675cbd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('avatar', sa.String(length=255), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'avatar')
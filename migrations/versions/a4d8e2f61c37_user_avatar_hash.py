@@ -0,0 +1,26 @@
+"""User avatar content hash
+
+Revision ID: a4d8e2f61c37
+Revises: 7f3a1c9e4b2d
+Create Date: 2026-10-18 15:02:44.581920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d8e2f61c37'
+down_revision: Union[str, None] = '7f3a1c9e4b2d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('avatar_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'avatar_hash')
@@ -0,0 +1,28 @@
+"""Contact and collection versions for ETags
+
+Revision ID: bace3db0afdc
+Revises: e9141f8c2ff1
+Create Date: 2026-10-18 13:02:11.417305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bace3db0afdc'
+down_revision: Union[str, None] = 'e9141f8c2ff1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('users', sa.Column('contacts_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'contacts_version')
+    op.drop_column('contacts', 'version')
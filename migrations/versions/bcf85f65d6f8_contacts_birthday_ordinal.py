@@ -0,0 +1,35 @@
+"""Contacts birthday ordinal
+
+Revision ID: bcf85f65d6f8
+Revises: 2e08f7df86d2
+Create Date: 2026-10-18 11:48:05.220719
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bcf85f65d6f8'
+down_revision: Union[str, None] = '2e08f7df86d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_ordinal', sa.Integer(), nullable=True))
+    contacts = sa.table('contacts', sa.column('birthday', sa.Date()), sa.column('birthday_ordinal', sa.Integer()))
+    op.execute(
+        contacts.update().values(
+            birthday_ordinal=sa.cast(sa.extract('month', contacts.c.birthday) * 100
+                                     + sa.extract('day', contacts.c.birthday), sa.Integer)
+        )
+    )
+    op.create_index('ix_contacts_user_id_birthday_ordinal', 'contacts', ['user_id', 'birthday_ordinal'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_birthday_ordinal', table_name='contacts')
+    op.drop_column('contacts', 'birthday_ordinal')
@@ -0,0 +1,26 @@
+"""Refresh tokens moved to Redis
+
+Revision ID: c81f5b3e9a70
+Revises: a4d8e2f61c37
+Create Date: 2026-10-18 16:20:37.119452
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81f5b3e9a70'
+down_revision: Union[str, None] = 'a4d8e2f61c37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_column('users', 'refresh_token')
+
+
+def downgrade() -> None:
+    op.add_column('users', sa.Column('refresh_token', sa.String(length=255), nullable=True))
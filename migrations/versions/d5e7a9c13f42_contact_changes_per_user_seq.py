@@ -0,0 +1,53 @@
+"""Number contact changes per user
+
+Revision ID: d5e7a9c13f42
+Revises: c81f5b3e9a70
+Create Date: 2026-10-18 18:05:11.402871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e7a9c13f42'
+down_revision: Union[str, None] = 'c81f5b3e9a70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # New entries are numbered from the collection version: start it above the existing entries
+    op.execute(
+        "UPDATE users SET contacts_version = "
+        "(SELECT MAX(seq) FROM contact_changes WHERE contact_changes.user_id = users.id) "
+        "WHERE contacts_version < (SELECT MAX(seq) FROM contact_changes WHERE contact_changes.user_id = users.id)"
+    )
+    op.drop_index('ix_contact_changes_user_id_seq', table_name='contact_changes')
+    op.drop_constraint('contact_changes_pkey', 'contact_changes', type_='primary')
+    op.alter_column('contact_changes', 'seq', server_default=None)
+    op.execute("DROP SEQUENCE IF EXISTS contact_changes_seq_seq")
+    op.create_primary_key('contact_changes_pkey', 'contact_changes', ['user_id', 'seq'])
+
+
+def downgrade() -> None:
+    # Per-user numbers are not unique across users: restart the log as in 62657a675cbd
+    op.drop_table('contact_changes')
+    op.create_table(
+        'contact_changes',
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('contact_id', sa.Integer(), nullable=False),
+        sa.Column('op', sa.String(length=6), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('seq'),
+        sqlite_autoincrement=True,
+    )
+    op.create_index('ix_contact_changes_user_id_seq', 'contact_changes', ['user_id', 'seq'], unique=False)
+    op.execute(
+        "INSERT INTO contact_changes (user_id, contact_id, op) "
+        "SELECT user_id, id, 'create' FROM contacts WHERE user_id IS NOT NULL ORDER BY id"
+    )
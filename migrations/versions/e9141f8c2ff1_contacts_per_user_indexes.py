@@ -0,0 +1,28 @@
+"""Contacts per-user indexes
+
+Revision ID: e9141f8c2ff1
+Revises: bcf85f65d6f8
+Create Date: 2026-10-18 12:26:40.583190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e9141f8c2ff1'
+down_revision: Union[str, None] = 'bcf85f65d6f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # (user_id, last_name, id) and (user_id, birthday_ordinal) were added with keyset
+    # pagination and the birthday ordinal; this adds the one for per-user id lookups.
+    op.create_index('ix_contacts_user_id_id', 'contacts', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_id', table_name='contacts')
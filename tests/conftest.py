@@ -1,11 +1,18 @@
+import fakeredis
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from main import app
 from REST_API.database.models import Base
-from REST_API.database.db import get_db
+from REST_API.database.db import get_db, get_session_factory
+from REST_API.services.cache import user_cache
+from REST_API.services.response_cache import response_cache
+from REST_API.services.mail_queue import mail_queue
+from REST_API.services.sessions import session_store
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -15,9 +22,24 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The test client runs every request on a new event loop, so async connections are not pooled
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", poolclass=NullPool)
+AsyncTestingSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+user_cache.init(fakeredis.aioredis.FakeRedis(decode_responses=True))
+response_cache.init(fakeredis.aioredis.FakeRedis(decode_responses=True))
+mail_queue.init(fakeredis.aioredis.FakeRedis(decode_responses=True))
+session_store.init(fakeredis.aioredis.FakeRedis(decode_responses=True))
+
+
+@pytest.fixture(scope="module", params=["sync", "async"])
+def database_mode(request):
+    # Every module using the database runs once per mode
+    return request.param
+
 
 @pytest.fixture(scope="module")
-def session():
+def session(database_mode):
     # Create the database
 
     Base.metadata.drop_all(bind=engine)
@@ -31,7 +53,7 @@ def session():
 
 
 @pytest.fixture(scope="module")
-def client(session):
+def client(session, database_mode):
     # Dependency override
 
     def override_get_db():
@@ -40,7 +62,15 @@ def client(session):
         finally:
             session.close()
 
-    app.dependency_overrides[get_db] = override_get_db
+    async def override_get_async_db():
+        # The tests set data up through the sync session; it must not hold a lock meanwhile
+        session.close()
+        async with AsyncTestingSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db if database_mode == "sync" else override_get_async_db
+    app.dependency_overrides[get_session_factory] = lambda: (
+        TestingSessionLocal if database_mode == "sync" else AsyncTestingSessionLocal)
 
     yield TestClient(app)
 
@@ -0,0 +1,117 @@
+import socket
+import unittest
+
+import fakeredis
+import orjson
+from aiosmtpd.controller import Controller
+
+from mail_worker import MailWorker
+from REST_API.services.email import SMTPPool
+from REST_API.services.mail_queue import MailQueue
+
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("unknown@"):
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 Message accepted for delivery"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def verification_job(email: str) -> dict:
+    return {"email": email, "username": "user", "host": "http://localhost/", "token": "token"}
+
+
+class TestMailWorker(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.handler = RecordingHandler()
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=free_port())
+        self.controller.start()
+        self.queue = MailQueue(max_attempts=2, retry_delay=0)
+        self.queue.init(fakeredis.aioredis.FakeRedis(decode_responses=True))
+        pool = SMTPPool(2, hostname="127.0.0.1", port=self.controller.port,
+                        use_tls=False, start_tls=False, timeout=5)
+        self.worker = MailWorker(self.queue, pool, batch_size=10, poll_timeout=0.1)
+
+    async def asyncTearDown(self):
+        await self.worker.pool.close()
+        self.controller.stop()
+
+    async def test_batch_is_sent_over_pooled_connections(self):
+        for n in range(5):
+            await self.queue.enqueue("verify_email", verification_job(f"user{n}@example.com"))
+        self.assertEqual(await self.worker.process_batch(), 5)
+        self.assertEqual(len(self.handler.messages), 5)
+        self.assertLessEqual(self.worker.pool.connects, 2)
+        stats = await self.queue.stats()
+        self.assertEqual((stats["ready"], stats["sent"]), (0, 5))
+        self.assertEqual(await self.queue.redis.llen(self.queue.processing_key("default")), 0)
+
+    async def test_rejected_recipient_is_dead_lettered(self):
+        await self.queue.enqueue("verify_email", verification_job("unknown@example.com"))
+        await self.worker.process_batch()
+        dead = orjson.loads(await self.queue.redis.lindex(self.queue.dead_key, 0))
+        self.assertEqual(dead["attempts"], 1)
+        self.assertIn("550", dead["error"])
+
+    async def test_job_without_kind_is_dead_lettered(self):
+        await self.queue.enqueue("verify_email", verification_job("user@example.com"))
+        await self.queue.redis.lpush(self.queue.ready_key, orjson.dumps({"id": "broken", "payload": {}, "attempts": 0}))
+        self.assertEqual(await self.worker.process_batch(), 2)
+        self.assertEqual(len(self.handler.messages), 1)
+        dead = orjson.loads(await self.queue.redis.lindex(self.queue.dead_key, 0))
+        self.assertEqual(dead["id"], "broken")
+        self.assertIn("kind", dead["error"])
+        self.assertEqual(await self.queue.redis.llen(self.queue.processing_key("default")), 0)
+
+    async def test_malformed_job_is_dead_lettered_as_queued(self):
+        await self.queue.enqueue("verify_email", verification_job("user@example.com"))
+        await self.queue.redis.lpush(self.queue.ready_key, "{not json")
+        self.assertEqual(await self.worker.process_batch(), 2)
+        self.assertEqual(len(self.handler.messages), 1)
+        self.assertEqual(await self.queue.redis.lrange(self.queue.dead_key, 0, -1), ["{not json"])
+        self.assertEqual(await self.queue.redis.llen(self.queue.processing_key("default")), 0)
+
+    async def test_job_with_invalid_payload_is_dead_lettered(self):
+        await self.queue.enqueue("verify_email", verification_job("user@example.com"))
+        await self.queue.enqueue("verify_email", "user@example.com")
+        self.assertEqual(await self.worker.process_batch(), 2)
+        self.assertEqual(len(self.handler.messages), 1)
+        dead = orjson.loads(await self.queue.redis.lindex(self.queue.dead_key, 0))
+        self.assertEqual((dead["payload"], dead["attempts"]), ("user@example.com", 1))
+        self.assertIn("TypeError", dead["error"])
+        self.assertEqual(self.worker.stats()["dead"], 1)
+
+    async def test_connection_errors_are_retried_then_dead_lettered(self):
+        self.worker.pool = SMTPPool(1, hostname="127.0.0.1", port=free_port(), use_tls=False, start_tls=False, timeout=5)
+        await self.queue.enqueue("verify_email", verification_job("user@example.com"))
+        await self.worker.process_batch()
+        self.assertEqual((await self.queue.stats())["delayed"], 1)
+        await self.worker.process_batch()
+        stats = await self.queue.stats()
+        self.assertEqual((stats["delayed"], stats["dead"]), (0, 1))
+
+    async def test_recover_unfinished_jobs(self):
+        await self.queue.enqueue("verify_email", verification_job("user@example.com"))
+        raws = await self.queue.reserve("crashed", 10, 0.1)
+        self.assertEqual(len(raws), 1)
+        self.assertEqual(await self.queue.recover("crashed"), 1)
+        self.assertEqual((await self.queue.stats())["ready"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
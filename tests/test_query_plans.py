@@ -0,0 +1,9 @@
+import asyncio
+from argparse import Namespace
+
+from benchmarks.query_plans import run
+
+
+def test_contact_queries_use_indexes(tmp_path):
+    args = Namespace(database=tmp_path / "plans.db", users=4, contacts=200, repeat=1, seed=0, check=True)
+    assert asyncio.run(run(args)) == 0
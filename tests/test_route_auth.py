@@ -67,3 +67,63 @@ def test_login_wrong_email(client, user):
     assert response.status_code == 401, response.text
     data = response.json()
     assert data["detail"] == "Invalid email"
+
+
+def login(client, user) -> dict:
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_refresh_token_rotation(client, user):
+    tokens = login(client, user)
+    response = client.get("/api/auth/refresh_token",
+                          headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 200, response.text
+    rotated = response.json()
+    assert rotated["refresh_token"] != tokens["refresh_token"]
+    response = client.get("/api/users/me/", headers={"Authorization": f"Bearer {rotated['access_token']}"})
+    assert response.status_code == 200, response.text
+
+
+def test_reused_refresh_token_ends_session(client, user):
+    tokens = login(client, user)
+    rotated = client.get("/api/auth/refresh_token",
+                         headers={"Authorization": f"Bearer {tokens['refresh_token']}"}).json()
+    response = client.get("/api/auth/refresh_token",
+                          headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 401, response.text
+    response = client.get("/api/auth/refresh_token",
+                          headers={"Authorization": f"Bearer {rotated['refresh_token']}"})
+    assert response.status_code == 401, response.text
+    response = client.get("/api/users/me/", headers={"Authorization": f"Bearer {rotated['access_token']}"})
+    assert response.status_code == 401, response.text
+
+
+def test_logout_ends_one_session(client, user):
+    first, second = login(client, user), login(client, user)
+    sessions = client.get("/api/auth/sessions", headers={"Authorization": f"Bearer {first['access_token']}"}).json()
+    assert sum(session["current"] for session in sessions) == 1
+    response = client.post("/api/auth/logout", headers={"Authorization": f"Bearer {first['access_token']}"})
+    assert response.status_code == 204, response.text
+    response = client.get("/api/users/me/", headers={"Authorization": f"Bearer {first['access_token']}"})
+    assert response.status_code == 401, response.text
+    response = client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {first['refresh_token']}"})
+    assert response.status_code == 401, response.text
+    response = client.get("/api/users/me/", headers={"Authorization": f"Bearer {second['access_token']}"})
+    assert response.status_code == 200, response.text
+
+
+def test_logout_all(client, user):
+    first, second = login(client, user), login(client, user)
+    response = client.post("/api/auth/logout_all", headers={"Authorization": f"Bearer {first['access_token']}"})
+    assert response.status_code == 204, response.text
+    for tokens in (first, second):
+        response = client.get("/api/users/me/", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+        assert response.status_code == 401, response.text
+        response = client.get("/api/auth/refresh_token",
+                              headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+        assert response.status_code == 401, response.text
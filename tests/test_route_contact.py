@@ -0,0 +1,119 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import orjson
+import pytest
+from sqlalchemy.orm import Session
+
+from main import app
+from REST_API.database.db import get_session_factory
+from REST_API.database.models import User
+from REST_API.services.auth import auth_service
+
+
+def contact(n: int, **values) -> dict:
+    return {"first_name": f"First{n}", "last_name": f"Last{n}", "email": f"batch{n}@example.com",
+            "phone_number": "+380500000000", "birthday": "1990-01-01", **values}
+
+
+@pytest.fixture(scope="module")
+def headers(session):
+    session.add(User(email="batch@example.com", password="x", confirmed=True))
+    session.commit()
+    token = asyncio.run(auth_service.create_access_token({"sub": "batch@example.com"}))
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_batch_contacts(client, headers):
+    response = client.post("/api/contact/", json=contact(1), headers=headers)
+    assert response.status_code == 200, response.text
+    existing = response.json()["id"]
+
+    response = client.post("/api/contact/batch/", json={"operations": [
+        {"op": "create", "contact": contact(2)},
+        {"op": "update", "id": existing, "contact": contact(1, last_name="Renamed")},
+        {"op": "create", "contact": contact(2)},
+        {"op": "delete", "id": existing + 100},
+    ]}, headers=headers)
+    assert response.status_code == 200, response.text
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == [201, 200, 409, 404]
+
+    response = client.get("/api/contact/", headers=headers)
+    assert sorted((item["email"], item["last_name"]) for item in response.json()) == [
+        ("batch1@example.com", "Renamed"), ("batch2@example.com", "Last2")]
+
+    response = client.post("/api/contact/batch/", json={"operations": [{"op": "delete", "id": existing}]},
+                           headers=headers)
+    assert response.json()["results"][0]["status"] == 200
+    response = client.get(f"/api/contact/{existing}", headers=headers)
+    assert response.status_code == 404
+
+
+def test_batch_contacts_validation(client, headers, monkeypatch):
+    response = client.post("/api/contact/batch/", json={"operations": [{"op": "update", "contact": contact(3)}]},
+                           headers=headers)
+    assert response.status_code == 422
+    response = client.post("/api/contact/batch/", json={"operations": []}, headers=headers)
+    assert response.status_code == 422
+    monkeypatch.setattr("REST_API.routes.contact.settings.batch_max_operations", 1)
+    response = client.post("/api/contact/batch/", json={"operations": [{"op": "delete", "id": 1}] * 2},
+                           headers=headers)
+    assert response.status_code == 413
+
+
+def test_changes_never_show_another_users_contact(client, session, headers):
+    session.add(User(email="other@example.com", password="x", confirmed=True))
+    session.commit()
+    token = asyncio.run(auth_service.create_access_token({"sub": "other@example.com"}))
+    other_headers = {"Authorization": f"Bearer {token}"}
+    since = client.get("/api/contact/changes/", params={"since": 0}, headers=headers).json()["next_since"]
+
+    deleted = client.post("/api/contact/", json=contact(4), headers=headers).json()["id"]
+    assert client.delete(f"/api/contact/{deleted}", headers=headers).status_code == 200
+    # SQLite hands the id of the deleted newest row to the next insert
+    response = client.post("/api/contact/", json=contact(5, first_name="Bob", additional_info="BobSecret"),
+                           headers=other_headers)
+    assert response.json()["id"] == deleted
+
+    response = client.get("/api/contact/changes/", params={"since": since}, headers=headers)
+    assert response.status_code == 200, response.text
+    changes = response.json()["changes"]
+    assert [(change["contact_id"], change["op"]) for change in changes] == [(deleted, "create"), (deleted, "delete")]
+    assert all(change["contact"] is None for change in changes)
+    assert "BobSecret" not in response.text
+
+
+def test_cached_list_follows_the_collection_version(client, headers):
+    response = client.get("/api/contact/", headers=headers)
+    etag, emails = response.headers["ETag"], [item["email"] for item in response.json()]
+
+    response = client.post("/api/contact/", json=contact(6), headers=headers)
+    assert response.status_code == 200, response.text
+
+    response = client.get("/api/contact/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert [item["email"] for item in response.json()] == emails + ["batch6@example.com"]
+
+
+def test_export_contacts(client, headers):
+    response = client.get("/api/contact/export/", params={"format": "ndjson"}, headers=headers)
+    assert response.status_code == 200
+    emails = [orjson.loads(line)["email"] for line in response.text.splitlines()]
+    assert "batch6@example.com" in emails
+
+
+def test_export_closes_its_session_when_the_stream_fails(client, headers, monkeypatch):
+    db = MagicMock(spec=Session)
+
+    async def failing_export(batches, export_format):
+        yield "first chunk\n"
+        raise RuntimeError("export failed")
+
+    monkeypatch.setattr("REST_API.routes.contact.export_contacts", failing_export)
+    monkeypatch.setitem(app.dependency_overrides, get_session_factory, lambda: lambda: db)
+    # Raised as is or wrapped in an exception group by the response task group
+    with pytest.raises(Exception):
+        client.get("/api/contact/export/", headers=headers)
+    db.close.assert_called_once()
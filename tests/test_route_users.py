@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from REST_API.conf.config import settings
+from REST_API.database.models import User
+from REST_API.services.auth import auth_service
+
+BOUNDARY = "avatarboundary"
+MULTIPART = {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+
+def multipart_body(data: bytes, content_type: str = "image/png") -> bytes:
+    return (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="avatar"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n').encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+@pytest.fixture(scope="module")
+def headers(session):
+    session.add(User(email="avatar@example.com", password="x", confirmed=True))
+    session.commit()
+    token = asyncio.run(auth_service.create_access_token({"sub": "avatar@example.com"}))
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_update_avatar_reads_the_file_part(client, headers, monkeypatch):
+    received = []
+
+    async def save_avatar(user, chunks, db):
+        received.append(b"".join([chunk async for chunk in chunks]))
+        return user
+
+    monkeypatch.setattr("REST_API.routes.users.save_avatar", save_avatar)
+    response = client.patch("/api/users/avatar", content=multipart_body(b"image data"),
+                            headers={**headers, **MULTIPART})
+    assert response.status_code == 200, response.text
+    assert received == [b"image data"]
+
+    response = client.patch("/api/users/avatar", content=multipart_body(b"text", "text/plain"),
+                            headers={**headers, **MULTIPART})
+    assert response.status_code == 415
+    response = client.patch("/api/users/avatar", content=b"image data", headers={**headers, "Content-Type": "image/png"})
+    assert response.status_code == 422
+
+
+def test_update_avatar_caps_chunked_bodies(client, headers, monkeypatch):
+    monkeypatch.setattr(settings, "avatar_max_bytes", 1024)
+    body = multipart_body(b"x" * 64 * 1024)
+
+    def chunks():
+        # A generator body is sent without a Content-Length
+        for start in range(0, len(body), 4096):
+            yield body[start:start + 4096]
+
+    response = client.patch("/api/users/avatar", content=chunks(), headers={**headers, **MULTIPART})
+    assert response.status_code == 413
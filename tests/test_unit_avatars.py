@@ -0,0 +1,152 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import cloudinary
+import cloudinary.exceptions
+from fastapi import HTTPException
+from PIL import Image
+
+from REST_API.services.avatars import (AvatarProcessor, CloudinaryAvatarStorage, LocalAvatarStorage, limit_size,
+                                       read_hashed, render_variants)
+
+
+async def chunked(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def encode(image: Image.Image, format: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format)
+    return buffer.getvalue()
+
+
+class TestRenderVariants(unittest.TestCase):
+
+    def test_sizes_and_formats(self):
+        data = encode(Image.new("RGB", (400, 300), (200, 10, 10)), "PNG")
+        variants = render_variants(data, (32, 64), ("webp", "jpeg"), 80, 10 ** 6)
+        self.assertEqual(sorted(variants), ["32.jpg", "32.webp", "64.jpg", "64.webp"])
+        with Image.open(io.BytesIO(variants["64.webp"])) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (64, 64)))
+        with Image.open(io.BytesIO(variants["32.jpg"])) as image:
+            self.assertEqual((image.format, image.size), ("JPEG", (32, 32)))
+
+    def test_transparent_image_as_jpeg(self):
+        data = encode(Image.new("RGBA", (50, 50), (0, 0, 0, 0)), "PNG")
+        variants = render_variants(data, (16,), ("jpeg",), 80, 10 ** 6)
+        with Image.open(io.BytesIO(variants["16.jpg"])) as image:
+            self.assertEqual(image.getpixel((8, 8)), (255, 255, 255))
+
+    def test_invalid_image(self):
+        with self.assertRaises(ValueError):
+            render_variants(b"not an image", (16,), ("webp",), 80, 10 ** 6)
+
+    def test_too_many_pixels(self):
+        data = encode(Image.new("RGB", (100, 100)), "PNG")
+        with self.assertRaises(ValueError):
+            render_variants(data, (16,), ("webp",), 80, 100)
+
+
+class TestAvatarProcessor(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.processor = AvatarProcessor([128, 32, 64], ["webp", "jpeg"], 80, 10 ** 6, 1, 1)
+
+    def tearDown(self):
+        self.processor.close()
+
+    def test_select_variant(self):
+        self.assertEqual(self.processor.default_variant, "128.webp")
+        self.assertEqual(self.processor.select_variant(40, "jpeg"), "64.jpg")
+        self.assertEqual(self.processor.select_variant(500), "128.webp")
+        self.assertEqual(self.processor.select_variant(), "128.webp")
+
+    async def test_render_in_process_pool(self):
+        variants = await self.processor.render(encode(Image.new("RGB", (10, 10)), "PNG"))
+        self.assertEqual(len(variants), 6)
+        with self.assertRaises(HTTPException) as e:
+            await self.processor.render(b"not an image")
+        self.assertEqual(e.exception.status_code, 422)
+        self.assertEqual(self.processor.stats()["processed"], 1)
+
+
+class TestAvatarStorage(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = Path(self.directory.name)
+        self.storage = LocalAvatarStorage(self.directory.name, "/media/avatars/")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    async def test_local_save(self):
+        await self.storage.init()
+        self.assertFalse(await self.storage.exists("abc"))
+        await self.storage.save("abc", {"64.webp": b"small", "128.webp": b"large"})
+        self.assertTrue(await self.storage.exists("abc"))
+        self.assertEqual((self.root / "abc" / "64.webp").read_bytes(), b"small")
+        self.assertEqual(self.storage.url("abc", "64.webp"), "/media/avatars/abc/64.webp")
+
+    async def test_local_save_twice_keeps_first(self):
+        await self.storage.save("abc", {"64.webp": b"first"})
+        await self.storage.save("abc", {"64.webp": b"second"})
+        self.assertEqual([path.name for path in self.root.iterdir()], ["abc"])
+        self.assertEqual((self.root / "abc" / "64.webp").read_bytes(), b"first")
+
+    async def test_limit_size(self):
+        data, digest = await read_hashed(limit_size(chunked(b"abc", b"de"), 5))
+        self.assertEqual(data, b"abcde")
+        self.assertEqual(len(digest), 64)
+        with self.assertRaises(HTTPException) as e:
+            await read_hashed(limit_size(chunked(b"abc", b"def"), 5))
+        self.assertEqual(e.exception.status_code, 413)
+
+    async def test_cloudinary_configured_once(self):
+        storage = CloudinaryAvatarStorage("name", "key", "secret")
+        with patch("REST_API.services.avatars.cloudinary.config", wraps=cloudinary.config) as config, \
+                patch("REST_API.services.avatars.cloudinary.uploader.upload") as upload:
+            await storage.init()
+            await storage.save("abc", {"64.webp": b"small", "64.jpg": b"small"})
+            url = storage.url("abc", "64.jpg")
+        # build_url reads the configuration back; only one call sets it
+        self.assertEqual([call.kwargs for call in config.call_args_list if call.kwargs],
+                         [{"cloud_name": "name", "api_key": "key", "api_secret": "secret", "secure": True}])
+        self.assertEqual([call.kwargs["public_id"] for call in upload.call_args_list][-1], "NotesApp/abc/complete")
+        self.assertEqual(sorted(call.kwargs["public_id"] for call in upload.call_args_list[:-1]),
+                         ["NotesApp/abc/64_jpg", "NotesApp/abc/64_webp"])
+        self.assertTrue(url.endswith("NotesApp/abc/64_jpg.jpg"))
+
+    async def test_cloudinary_exists_checks_the_marker(self):
+        storage = CloudinaryAvatarStorage("name", "key", "secret")
+        with patch("REST_API.services.avatars.cloudinary.api.resource",
+                   side_effect=cloudinary.exceptions.NotFound) as resource:
+            self.assertFalse(await storage.exists("abc"))
+        resource.assert_called_once_with("NotesApp/abc/complete", resource_type="raw")
+        with patch("REST_API.services.avatars.cloudinary.api.resource") as resource:
+            self.assertTrue(await storage.exists("abc"))
+            self.assertTrue(await storage.exists("abc"))
+        resource.assert_called_once()
+
+    async def test_cloudinary_partial_save_is_not_complete(self):
+        storage = CloudinaryAvatarStorage("name", "key", "secret")
+
+        def upload(data, public_id, **options):
+            if public_id.endswith("64_jpg"):
+                raise cloudinary.exceptions.Error("upload failed")
+
+        with patch("REST_API.services.avatars.cloudinary.uploader.upload", side_effect=upload) as uploads, \
+                patch("REST_API.services.avatars.cloudinary.api.resource",
+                      side_effect=cloudinary.exceptions.NotFound):
+            with self.assertRaises(cloudinary.exceptions.Error):
+                await storage.save("abc", {"64.webp": b"small", "64.jpg": b"small"})
+            self.assertFalse(await storage.exists("abc"))
+        self.assertNotIn("NotesApp/abc/complete", [call.kwargs["public_id"] for call in uploads.call_args_list])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+from datetime import date
+
+from REST_API.services.contact_io import (
+    RecordError,
+    export_contacts,
+    format_vcard,
+    iter_csv,
+    iter_json_array,
+    iter_ndjson,
+    record_parser,
+)
+
+
+def stream(data: str, size: int):
+    async def chunks():
+        raw = data.encode()
+        for start in range(0, len(raw), size):
+            yield raw[start:start + size]
+    return chunks()
+
+
+async def collect(records):
+    return [record async for record in records]
+
+
+class TestContactIO(unittest.IsolatedAsyncioTestCase):
+
+    async def test_json_array(self):
+        data = ' [ {"a": 1}, {"b": "é,]"} ,12, 1.5e3]'
+        for size in (1, 3, 1000):
+            self.assertEqual(await collect(iter_json_array(stream(data, size))),
+                             [(1, {"a": 1}), (2, {"b": "é,]"}), (3, 12), (4, 1500.0)])
+        self.assertEqual(await collect(iter_json_array(stream(" [ ] \n", 1))), [])
+
+    async def test_json_array_errors(self):
+        for data in ('{"a": 1}', '[{"a": 1}', '[{"a": 1]', '[{"a":1} {"b":2}]', '[,,{"a":1},,]', '[{"a":1},]',
+                     '[{"a":1}]trailing', '[1][2]', '[1,,2]'):
+            with self.assertRaises(RecordError):
+                await collect(iter_json_array(stream(data, 2)))
+
+    async def test_ndjson(self):
+        records = await collect(iter_ndjson(stream('{"a": 1}\n\nbad\n{"c": 3}', 4)))
+        self.assertEqual(records[0], (1, {"a": 1}))
+        self.assertIsInstance(records[1][1], RecordError)
+        self.assertEqual(records[2], (3, {"c": 3}))
+
+    async def test_csv(self):
+        data = 'first_name,info\r\nJo,"multi\nline, ""q"""\r\nAnn,\nX\n'
+        records = await collect(iter_csv(stream(data, 3)))
+        self.assertEqual(records[0], (1, {"first_name": "Jo", "info": 'multi\nline, "q"'}))
+        self.assertEqual(records[1], (2, {"first_name": "Ann", "info": None}))
+        self.assertIsInstance(records[2][1], RecordError)
+
+    def test_record_parser(self):
+        self.assertIs(record_parser("text/csv; charset=utf-8"), iter_csv)
+        self.assertIs(record_parser("application/x-ndjson"), iter_ndjson)
+        self.assertIs(record_parser("application/json"), iter_json_array)
+        self.assertIsNone(record_parser("text/plain"))
+
+    async def test_export_csv_roundtrip(self):
+        row = {"id": 1, "first_name": "Jo", "last_name": "Doe, Jr", "email": "jo@example.com",
+               "phone_number": "123", "birthday": date(1990, 5, 17), "additional_info": None}
+
+        async def batches():
+            yield [row]
+
+        exported = "".join([chunk async for chunk in export_contacts(batches(), "csv")])
+        records = await collect(iter_csv(stream(exported, 5)))
+        self.assertEqual(records, [(1, {**row, "id": "1", "birthday": "1990-05-17"})])
+
+    def test_format_vcard(self):
+        row = {"id": 1, "first_name": "Jo", "last_name": "Doe; Jr", "email": "jo@example.com",
+               "phone_number": "123", "birthday": date(1990, 5, 17), "additional_info": "line\nline"}
+        card = format_vcard([row])
+        self.assertTrue(card.startswith("BEGIN:VCARD\r\nVERSION:3.0\r\n"))
+        self.assertIn("N:Doe\\; Jr;Jo;;;\r\n", card)
+        self.assertIn("BDAY:1990-05-17\r\n", card)
+        self.assertIn("NOTE:line\\nline\r\n", card)
+        self.assertTrue(card.endswith("END:VCARD\r\n"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from REST_API.services.email import TEMPLATE_FOLDER, EmailTemplates, build_verification_emails
+
+
+class TestEmailTemplates(unittest.TestCase):
+
+    def setUp(self):
+        self.templates = EmailTemplates(TEMPLATE_FOLDER)
+
+    def test_load_compiles_every_template(self):
+        self.templates.load()
+        self.assertIn("email_template.html", self.templates.compiled)
+
+    def test_render_batch(self):
+        contexts = [{"host": "http://h/", "username": name, "token": "t"} for name in ("ann", "bob")]
+        bodies = self.templates.render_batch("email_template.html", contexts)
+        self.assertEqual(len(bodies), 2)
+        self.assertIn("Hi ann,", bodies[0])
+        self.assertIn("Hi bob,", bodies[1])
+        self.assertEqual(bodies[0], self.templates.render("email_template.html", contexts[0]))
+
+    def test_build_verification_emails(self):
+        payloads = [{"email": "ann@example.com", "username": "<ann>", "host": "http://h/", "token": "abc"}]
+        message, = build_verification_emails(payloads)
+        self.assertEqual(message["To"], "ann@example.com")
+        html = message.get_payload(decode=True).decode()
+        self.assertIn("http://h/api/auth/confirmed_email/abc", html)
+        self.assertIn("&lt;ann&gt;", html)
+        with self.assertRaises(KeyError):
+            build_verification_emails([{"email": "ann@example.com"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
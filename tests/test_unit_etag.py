@@ -0,0 +1,40 @@
+import unittest
+
+from starlette.requests import Request
+
+from REST_API.services.etag import etag_headers, etag_matches, make_etag
+
+
+def request_with(if_none_match=None):
+    headers = [] if if_none_match is None else [(b"if-none-match", if_none_match.encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+class TestEtag(unittest.TestCase):
+
+    def test_make_etag_is_weak_and_depends_on_parts(self):
+        etag = make_etag("list", 3, 0, 100)
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertEqual(etag, make_etag("list", 3, 0, 100))
+        self.assertNotEqual(etag, make_etag("list", 4, 0, 100))
+
+    def test_etag_matches(self):
+        etag = make_etag("contact", 1, 2)
+        self.assertFalse(etag_matches(request_with(), etag))
+        self.assertTrue(etag_matches(request_with(etag), etag))
+        self.assertTrue(etag_matches(request_with(etag.removeprefix("W/")), etag))
+        self.assertTrue(etag_matches(request_with(f'"other", {etag}'), etag))
+        self.assertTrue(etag_matches(request_with("*"), etag))
+        self.assertFalse(etag_matches(request_with('"other"'), etag))
+
+    def test_etag_headers_keep_responses_private(self):
+        etag = make_etag("list", 1, 3, 0, 100)
+        self.assertNotEqual(etag, make_etag("list", 2, 3, 0, 100))
+        headers = etag_headers(etag)
+        self.assertEqual(headers["ETag"], etag)
+        self.assertEqual(headers["Cache-Control"], "private")
+        self.assertEqual(headers["Vary"], "Authorization")
+
+
+if __name__ == '__main__':
+    unittest.main()
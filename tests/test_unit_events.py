@@ -0,0 +1,50 @@
+import asyncio
+import unittest
+
+import fakeredis
+
+from REST_API.services.events import RESYNC, ContactEventBroker
+
+
+class TestContactEventBroker(unittest.IsolatedAsyncioTestCase):
+
+    async def test_local_delivery(self):
+        broker = ContactEventBroker(max_connections=10, max_queue=4)
+        subscriber = broker.subscribe(1)
+        other = broker.subscribe(2)
+        await broker.publish(1, [{"op": "create", "contact_id": 5}])
+        self.assertEqual(await subscriber.get(1), {"event": "change", "changes": [{"op": "create", "contact_id": 5}]})
+        self.assertIsNone(await other.get(0.01))
+
+    async def test_slow_subscriber_gets_resync(self):
+        broker = ContactEventBroker(max_connections=10, max_queue=2)
+        subscriber = broker.subscribe(1)
+        for contact_id in range(3):
+            await broker.publish(1, [{"op": "update", "contact_id": contact_id}])
+        self.assertEqual(await subscriber.get(1), RESYNC)
+        self.assertIsNone(await subscriber.get(0.01))
+        self.assertEqual(broker.stats()["dropped"], 2)
+
+    async def test_connection_limit(self):
+        broker = ContactEventBroker(max_connections=1, max_queue=2)
+        subscriber = broker.subscribe(1)
+        self.assertIsNone(broker.subscribe(1))
+        broker.unsubscribe(subscriber)
+        self.assertIsNotNone(broker.subscribe(1))
+        self.assertEqual(broker.stats()["rejected"], 1)
+
+    async def test_redis_fanout(self):
+        redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        receiver, sender = ContactEventBroker(10, 4), ContactEventBroker(10, 4)
+        receiver.init(redis)
+        sender.init(redis)
+        subscriber = receiver.subscribe(7)
+        # Let the pattern subscription start before publishing
+        await asyncio.sleep(0.05)
+        await sender.publish(7, [{"op": "delete", "contact_id": 3}])
+        self.assertEqual(await subscriber.get(1), {"event": "change", "changes": [{"op": "delete", "contact_id": 3}]})
+        await receiver.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from fastapi import HTTPException
+
+from REST_API.services.passwords import PasswordHasher
+
+
+class TestPasswordHasher(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.context = MagicMock()
+        self.context.hash.return_value = "hashed"
+        self.context.verify.return_value = True
+        self.hasher = PasswordHasher(self.context, max_workers=1, max_queue=1)
+
+    async def test_hash_and_verify(self):
+        self.assertEqual(await self.hasher.hash("secret"), "hashed")
+        self.assertTrue(await self.hasher.verify("secret", "hashed"))
+        self.context.verify.assert_called_once_with("secret", "hashed")
+        self.assertEqual(self.hasher.stats()["completed"], 2)
+
+    async def test_runs_off_the_event_loop(self):
+        loop_thread = threading.get_ident()
+        self.context.hash.side_effect = lambda password: threading.get_ident()
+        self.assertNotEqual(await self.hasher.hash("secret"), loop_thread)
+
+    async def test_rejects_when_queue_is_full(self):
+        release = threading.Event()
+        self.context.hash.side_effect = lambda password: release.wait(5)
+        running = asyncio.create_task(self.hasher.hash("a"))
+        queued = asyncio.create_task(self.hasher.hash("b"))
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.hasher.stats()["queued"], 1)
+        with self.assertRaises(HTTPException) as error:
+            await self.hasher.hash("c")
+        self.assertEqual(error.exception.status_code, 503)
+        release.set()
+        await asyncio.gather(running, queued)
+        self.assertEqual(self.hasher.stats()["rejected"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import sqlite3
+import unittest
+from unittest.mock import patch
+
+from fastapi import HTTPException
+from sqlalchemy import exc
+from starlette.requests import Request
+
+from REST_API.database.pool import InstrumentedQueuePool, PoolMetrics
+from REST_API.routes.metrics import require_metrics_access
+
+
+def request_from(host, token=None):
+    headers = [] if token is None else [(b"x-metrics-token", token.encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "client": (host, 50000)})
+
+
+class TestPoolMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = PoolMetrics()
+
+    def test_observe_checkout(self):
+        self.metrics.observe(0.002, waited=False)
+        self.metrics.observe(0.2, waited=True)
+        self.assertEqual(self.metrics.checkouts, 2)
+        self.assertEqual(self.metrics.waits, 1)
+        self.assertAlmostEqual(self.metrics.checkout_seconds, 0.202)
+
+    def test_observe_timeout(self):
+        self.metrics.observe(30.0, waited=True, timed_out=True)
+        self.assertEqual(self.metrics.checkouts, 0)
+        self.assertEqual(self.metrics.timeouts, 1)
+        self.assertEqual(self.metrics.waits, 1)
+
+    def test_histogram_is_cumulative(self):
+        self.metrics.observe(0.0005, waited=False)
+        self.metrics.observe(0.003, waited=False)
+        self.metrics.observe(60.0, waited=False)
+        histogram = self.metrics.histogram()
+        self.assertEqual(histogram["0.001"], 1)
+        self.assertEqual(histogram["0.005"], 2)
+        self.assertEqual(histogram["30.0"], 2)
+        self.assertEqual(histogram["+Inf"], 3)
+
+
+class TestInstrumentedPool(unittest.TestCase):
+
+    def test_only_pool_timeouts_are_counted(self):
+        pool = InstrumentedQueuePool(lambda: sqlite3.connect(":memory:"), pool_size=1, max_overflow=0, timeout=0.01)
+        conn = pool.connect()
+        with self.assertRaises(exc.TimeoutError):
+            pool.connect()
+        conn.close()
+        self.assertEqual(pool.metrics.timeouts, 1)
+
+        def fail():
+            raise sqlite3.OperationalError("unable to open database file")
+
+        pool = InstrumentedQueuePool(fail, pool_size=1, max_overflow=0)
+        with self.assertRaises(sqlite3.OperationalError):
+            pool.connect()
+        self.assertEqual(pool.metrics.timeouts, 0)
+
+    def test_checkout_counted_once_when_the_pool_retries(self):
+        pool = InstrumentedQueuePool(lambda: sqlite3.connect(":memory:"), pool_size=1, max_overflow=1)
+        # A lost overflow race makes _do_get call itself again
+        with patch.object(pool, "_inc_overflow", side_effect=[False, True]) as overflow:
+            conn = pool.connect()
+        self.assertEqual(overflow.call_count, 2)
+        self.assertEqual(pool.metrics.checkouts, 1)
+        conn.close()
+        pool.connect().close()
+        self.assertEqual((pool.metrics.checkouts, pool.metrics.waits), (2, 0))
+
+
+class TestMetricsAccess(unittest.TestCase):
+
+    def test_loopback_only_without_token(self):
+        with patch("REST_API.routes.metrics.settings.metrics_token", None):
+            require_metrics_access(request_from("127.0.0.1"))
+            require_metrics_access(request_from("::1"))
+            for host in ("10.0.0.5", "testclient"):
+                with self.assertRaises(HTTPException) as e:
+                    require_metrics_access(request_from(host))
+                self.assertEqual(e.exception.status_code, 403)
+
+    def test_token_required_when_configured(self):
+        with patch("REST_API.routes.metrics.settings.metrics_token", "secret"):
+            require_metrics_access(request_from("10.0.0.5", "secret"))
+            for request in (request_from("127.0.0.1"), request_from("10.0.0.5", "wrong")):
+                with self.assertRaises(HTTPException):
+                    require_metrics_access(request)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from unittest.mock import AsyncMock
+
+import fakeredis
+from redis.exceptions import ConnectionError
+
+from REST_API.services.rate_limit import RateLimitService, RateLimitState
+
+
+class TestRateLimitService(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        self.limits = RateLimitService(lease=0.1, lease_ttl=5, max_leases=100)
+        self.limits.init(self.redis)
+
+    async def test_burst_then_reject(self):
+        states = [await self.limits.hit("route:user:1", 5, 60) for _ in range(6)]
+        self.assertEqual([state.remaining for state in states], [4, 3, 2, 1, 0, 0])
+        self.assertTrue(all(state.retry_after == 0 for state in states[:5]))
+        self.assertAlmostEqual(states[5].retry_after, 12, delta=0.5)
+        self.assertEqual(self.limits.stats()["rejected"], 1)
+
+    async def test_buckets_are_separate(self):
+        for _ in range(5):
+            await self.limits.hit("route:user:1", 5, 60)
+        self.assertEqual((await self.limits.hit("route:user:2", 5, 60)).remaining, 4)
+        self.assertEqual((await self.limits.hit("other:user:1", 5, 60)).remaining, 4)
+
+    async def test_lease_spares_redis_calls(self):
+        states = [await self.limits.hit("route:user:1", 100, 60) for _ in range(101)]
+        self.assertEqual([state.remaining for state in states[:3]], [99, 98, 97])
+        self.assertTrue(all(state.retry_after == 0 for state in states[:100]))
+        self.assertGreater(states[100].retry_after, 0)
+        self.assertEqual(self.limits.stats()["redis_calls"], 11)
+
+    async def test_leases_are_shared_between_workers(self):
+        other = RateLimitService(lease=0.1, lease_ttl=5, max_leases=100)
+        other.init(self.redis)
+        for _ in range(50):
+            await self.limits.hit("route:user:1", 100, 60)
+            await other.hit("route:user:1", 100, 60)
+        self.assertGreater((await self.limits.hit("route:user:1", 100, 60)).retry_after, 0)
+
+    async def test_fails_open(self):
+        self.assertIsNone(await RateLimitService(0.1, 5, 100).hit("route:user:1", 5, 60))
+        self.limits._take = AsyncMock(side_effect=ConnectionError("down"))
+        self.assertIsNone(await self.limits.hit("route:user:1", 5, 60))
+        self.assertEqual(self.limits.stats()["errors"], 1)
+
+    def test_headers(self):
+        headers = RateLimitState(10, 60, 0, 59.2, 5.1).headers()
+        self.assertEqual(headers, {"RateLimit-Limit": "10", "RateLimit-Remaining": "0", "RateLimit-Reset": "60",
+                                   "RateLimit-Policy": "10;w=60", "Retry-After": "6"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,7 +9,6 @@ from REST_API.schemas import UserModel,UserDb,UserResponse
 from REST_API.repository.auth import (
     get_user_by_email,
     create_user,
-    update_token,
     confirmed_email,
     update_avatar,
 )
@@ -23,35 +22,29 @@ class TestAuthService(unittest.IsolatedAsyncioTestCase):
     async def test_get_user_by_email(self):
         email = "test@example.com"
         user = User(email=email)
-        self.db.query().filter().first.return_value = user
+        self.db.execute().scalars().first.return_value = user
         result = await get_user_by_email(email, self.db)
         self.assertEqual(result, user)
 
     async def test_create_user(self):
         email = "test@example.com"
-        body = UserModel(email=email)
-        new_user = User(**body.dict())
+        body = UserModel(email=email, password="123456")
         result = await create_user(body, self.db)
-        self.assertEqual(result, new_user)
-
-    async def test_update_token(self):
-        user = User()
-        token = "test_token"
-        update_token(user, token, self.db)
-        self.assertEqual(user.refresh_token, token)
+        self.assertEqual(result.email, email)
+        self.db.add.assert_called_once_with(result)
 
     async def test_confirmed_email(self):
         email = "test@example.com"
         user = User(email=email)
-        self.db.query().filter().first.return_value = user
-        confirmed_email(email, self.db)
+        self.db.execute().scalars().first.return_value = user
+        await confirmed_email(email, self.db)
         self.assertTrue(user.confirmed)
 
     async def test_update_avatar(self):
         email = "test@example.com"
         user = User(email=email)
         url = "http://example.com/avatar.jpg"
-        self.db.query().filter().first.return_value = user
+        self.db.execute().scalars().first.return_value = user
         result = await update_avatar(email, url, self.db)
         self.assertEqual(result.avatar, url)
 
@@ -2,18 +2,33 @@ import unittest
 from unittest.mock import MagicMock
 from datetime import date, timedelta
 
-from sqlalchemy.orm import Session
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
 
-from REST_API.database.models import Contact, User
-from REST_API.schemas import ContactCreate, ContactUpdate, Contact
+from REST_API.conf.config import settings
+from REST_API.database.db import maybe_await
+from REST_API.database.models import Base, Contact, ContactChange, User
+from REST_API.schemas import ContactBatchOperation, ContactCreate, ContactUpdate
 from REST_API.repository.contact import (
     get_contacts,
+    get_contacts_page,
+    encode_cursor,
+    decode_cursor,
     get_contact,
     create_contact,
     update_contact,
     delete_contact,
     search_contacts,
     get_upcoming_birthdays,
+    birthday_ordinal,
+    apply_contact_batch,
+    get_changes,
+    get_collection_version,
+    stream_contacts,
+    contact_columns,
+    CONTACT_COLUMNS,
 )
 
 
@@ -21,23 +36,46 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
         self.session = MagicMock(spec=Session)
+        # The collection version read back by the change log
+        self.session.execute().scalar.return_value = 1
+        self.session.execute().scalar_one.return_value = 1
         self.user = User(id=1)
 
     async def test_get_contacts(self):
         contacts = [Contact(), Contact(), Contact()]
-        self.session.query().filter().offset().limit().all.return_value = contacts
+        self.session.execute().all.return_value = contacts
         result = await get_contacts(user=self.user, db=self.session, skip=0, limit=10)
         self.assertEqual(result, contacts)
 
+    async def test_get_contacts_page_last_page(self):
+        contacts = [Contact(id=1), Contact(id=2)]
+        self.session.execute().all.return_value = contacts
+        result, next_cursor = await get_contacts_page(user=self.user, db=self.session, limit=2)
+        self.assertEqual(result, contacts)
+        self.assertIsNone(next_cursor)
+
+    async def test_get_contacts_page_next_cursor(self):
+        contacts = [Contact(id=1, last_name="Adams"), Contact(id=5, last_name="Brown"), Contact(id=3, last_name="Clark")]
+        self.session.execute().all.return_value = contacts
+        result, next_cursor = await get_contacts_page(user=self.user, db=self.session, limit=2, order_by="last_name")
+        self.assertEqual(result, contacts[:2])
+        self.assertEqual(decode_cursor(next_cursor), ("last_name", ["Brown", 5]))
+
+    async def test_get_contacts_page_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            await get_contacts_page(user=self.user, db=self.session, cursor="not-a-cursor")
+        with self.assertRaises(ValueError):
+            await get_contacts_page(user=self.user, db=self.session, cursor=encode_cursor("id", (1, 2)))
+
     async def test_get_contact_found(self):
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
-        result = await get_contact(db=self.session, contact_id=1)
+        self.session.execute().scalars().first.return_value = contact
+        result = await get_contact(user=self.user, db=self.session, contact_id=1)
         self.assertEqual(result, contact)
 
     async def test_get_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
-        result = await get_contact(db=self.session, contact_id=1)
+        self.session.execute().scalars().first.return_value = None
+        result = await get_contact(user=self.user, db=self.session, contact_id=1)
         self.assertIsNone(result)
 
     async def test_create_contact(self):
@@ -45,47 +83,73 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
             "first_name": "John",
             "last_name": "Doe",
             "email": "john.doe@example.com",
+            "phone_number": "+380501234567",
             "birthday": date.today(),
+            "additional_info": None,
         }
         contact_create = ContactCreate(**contact_data)
-        contact = Contact(**contact_data, user_id=self.user.id)
         result = await create_contact(user=self.user, db=self.session, contact=contact_create)
-        self.assertEqual(result, contact)
+        self.assertEqual(result.first_name, contact_data["first_name"])
+        self.assertEqual(result.email, contact_data["email"])
+        self.assertEqual(result.user_id, self.user.id)
+
+    async def test_create_contact_returning(self):
+        self.session.get_bind().dialect.insert_returning = True
+        row = MagicMock()
+        self.session.execute().one.return_value = row
+        contact_create = ContactCreate(first_name="John", last_name="Doe", email="john.doe@example.com",
+                                       phone_number="+380501234567", birthday=date.today())
+        result = await create_contact(user=self.user, db=self.session, contact=contact_create)
+        self.assertEqual(result, row)
+        self.session.add.assert_not_called()
+        self.session.refresh.assert_not_called()
+
+    async def test_update_contact_returning_not_found(self):
+        self.session.get_bind().dialect.update_returning = True
+        self.session.execute().first.return_value = None
+        contact_update = ContactUpdate(first_name="John", last_name="Doe", email="john.doe@example.com",
+                                       phone_number="+380501234567", birthday=date.today())
+        result = await update_contact(user=self.user, db=self.session, contact_id=1, contact=contact_update)
+        self.assertIsNone(result)
+        self.session.commit.assert_not_called()
 
     async def test_update_contact_found(self):
         contact_data = {
             "first_name": "John",
             "last_name": "Doe",
             "email": "john.doe@example.com",
+            "phone_number": "+380501234567",
             "birthday": date.today(),
+            "additional_info": None,
         }
         contact_update = ContactUpdate(**contact_data)
         contact = Contact(**contact_data, user_id=self.user.id)
-        self.session.query().filter().first.return_value = contact
+        self.session.execute().scalars().first.return_value = contact
         result = await update_contact(user=self.user, db=self.session, contact_id=1, contact=contact_update)
         self.assertEqual(result, contact)
 
     async def test_update_contact_not_found(self):
-        contact_update = ContactUpdate(first_name="John", last_name="Doe")
-        self.session.query().filter().first.return_value = None
+        contact_update = ContactUpdate(first_name="John", last_name="Doe", email="john.doe@example.com",
+                                       phone_number="+380501234567", birthday=date.today(), additional_info=None)
+        self.session.execute().scalars().first.return_value = None
         result = await update_contact(user=self.user, db=self.session, contact_id=1, contact=contact_update)
         self.assertIsNone(result)
 
     async def test_delete_contact_found(self):
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        self.session.execute().scalars().first.return_value = contact
         result = await delete_contact(user=self.user, db=self.session, contact_id=1)
         self.assertEqual(result, contact)
 
     async def test_delete_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.session.execute().scalars().first.return_value = None
         result = await delete_contact(user=self.user, db=self.session, contact_id=1)
         self.assertIsNone(result)
 
     async def test_search_contacts(self):
         query = "John"
         contacts = [Contact(first_name="John"), Contact(first_name="Johnny")]
-        self.session.query().filter().all.return_value = contacts
+        self.session.execute().all.return_value = contacts
         result = await search_contacts(user=self.user, db=self.session, query=query)
         self.assertEqual(result, contacts)
 
@@ -93,11 +157,178 @@ class TestContacts(unittest.IsolatedAsyncioTestCase):
         today = date.today()
         next_week = today + timedelta(days=7)
         birthdays = [Contact(birthday=today), Contact(birthday=next_week)]
-        self.session.query().filter().all.return_value = birthdays
+        self.session.execute().all.return_value = birthdays
         result = await get_upcoming_birthdays(user=self.user, db=self.session)
         self.assertEqual(result, birthdays)
 
+    async def test_apply_contact_batch_not_found(self):
+        self.session.execute().scalars().all.return_value = []
+        operations = [ContactBatchOperation(op="delete", id=1), ContactBatchOperation(op="delete", id=2)]
+        result = await apply_contact_batch(user=self.user, db=self.session, operations=operations)
+        self.assertEqual([item["status"] for item in result], [404, 404])
+        self.session.commit.assert_not_called()
+
+    async def test_get_changes(self):
+        changes = [MagicMock(seq=5), MagicMock(seq=6)]
+        self.session.execute().all.return_value = changes
+        result = await get_changes(user=self.user, db=self.session, since=4, limit=10)
+        self.assertEqual(result, changes)
+
+    def test_contact_columns(self):
+        self.assertEqual(contact_columns(None), CONTACT_COLUMNS)
+        self.assertEqual([column.key for column in contact_columns(["last_name", "first_name"])],
+                         ["id", "first_name", "last_name"])
+        with self.assertRaises(ValueError):
+            contact_columns(["password"])
+
+    def test_birthday_ordinal(self):
+        self.assertEqual(birthday_ordinal(date(1990, 12, 31)), 1231)
+        self.assertEqual(birthday_ordinal(date(2000, 2, 29)), 229)
+        self.assertIsNone(birthday_ordinal(None))
+
+
+USERS = [{"id": 1, "email": "one@example.com", "password": "x"}, {"id": 2, "email": "two@example.com", "password": "x"}]
+
+
+class TestContactsSqlite(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            conn.execute(insert(User), USERS)
+        self.session = sessionmaker(bind=self.engine, autoflush=False)()
+        self.user = self.session.get(User, 1)
+
+    async def asyncTearDown(self):
+        self.session.close()
+        self.engine.dispose()
+
+    async def execute(self, stmt):
+        return await maybe_await(self.session.execute(stmt))
+
+    def contact(self, n: int, **values) -> ContactCreate:
+        return ContactCreate(**{"first_name": f"First{n}", "last_name": f"Last{n}", "email": f"c{n}@example.com",
+                                "phone_number": "+380500000000", "birthday": date(1990, 1, 1), **values})
+
+    async def test_changes_are_numbered_per_user_from_the_collection_version(self):
+        for returning in (True, False):
+            with self.subTest(returning=returning):
+                original = settings.db_write_returning
+                settings.db_write_returning = returning
+                try:
+                    offset = await get_collection_version(self.user, self.session)
+                    first = await create_contact(self.user, self.session, self.contact(offset + 1))
+                    await create_contact(User(id=2), self.session, self.contact(offset + 2))
+                    await update_contact(self.user, self.session, first.id, ContactUpdate(**self.contact(offset + 1).dict()))
+                    await delete_contact(self.user, self.session, first.id)
+                finally:
+                    settings.db_write_returning = original
+                changes = await get_changes(self.user, self.session, since=offset)
+                self.assertEqual([(row.seq, row.op) for row in changes],
+                                 [(offset + 1, "create"), (offset + 2, "update"), (offset + 3, "delete")])
+                self.assertEqual(await get_collection_version(self.user, self.session), offset + 3)
+
+    async def test_changes_are_pruned_beyond_retention(self):
+        original = settings.contact_changes_retention
+        settings.contact_changes_retention = 3
+        try:
+            for n in range(5):
+                await create_contact(self.user, self.session, self.contact(n))
+        finally:
+            settings.contact_changes_retention = original
+        seqs = (await self.execute(select(ContactChange.seq).filter(ContactChange.user_id == 1))).scalars().all()
+        self.assertEqual(sorted(seqs), [3, 4, 5])
+
+    async def test_stream_contacts_fetches_in_batches(self):
+        for n in range(5):
+            await create_contact(self.user, self.session, self.contact(n))
+        await create_contact(User(id=2), self.session, self.contact(5))
+        batches = [batch async for batch in stream_contacts(self.user, self.session, batch_size=2)]
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual([row["email"] for batch in batches for row in batch], [f"c{n}@example.com" for n in range(5)])
+
+    async def test_apply_contact_batch(self):
+        first, second, third = [await create_contact(self.user, self.session, self.contact(n)) for n in range(3)]
+        other = await create_contact(User(id=2), self.session, self.contact(9))
+        version = await get_collection_version(self.user, self.session)
+        operations = [
+            ContactBatchOperation(op="create", contact=self.contact(4)),
+            ContactBatchOperation(op="update", id=first.id, contact=self.contact(0, last_name="Renamed")),
+            ContactBatchOperation(op="delete", id=second.id),
+            ContactBatchOperation(op="delete", id=999),
+            ContactBatchOperation(op="update", id=other.id, contact=self.contact(9, last_name="Mine")),
+            ContactBatchOperation(op="update", id=third.id, contact=self.contact(0)),
+            ContactBatchOperation(op="create", contact=self.contact(9)),
+            ContactBatchOperation(op="delete", id=first.id),
+            # The email of a contact deleted earlier in the batch is free again
+            ContactBatchOperation(op="create", contact=self.contact(1)),
+        ]
+        results = await apply_contact_batch(self.user, self.session, operations)
+        self.assertEqual([result["status"] for result in results], [201, 200, 200, 404, 404, 409, 409, 409, 201])
+        created = [results[0]["id"], results[8]["id"]]
+
+        contacts = {contact.id: contact for contact in (await self.execute(select(Contact))).scalars()}
+        self.assertEqual(sorted(contacts), sorted([first.id, third.id, other.id, *created]))
+        self.assertEqual(contacts[first.id].last_name, "Renamed")
+        self.assertEqual(contacts[first.id].version, 2)
+        self.assertEqual(contacts[first.id].search_text, "first0 renamed c0@example.com")
+        self.assertEqual(contacts[third.id].email, "c2@example.com")
+        self.assertEqual(contacts[other.id].last_name, "Last9")
+        self.assertEqual(contacts[created[1]].email, "c1@example.com")
+
+        self.assertEqual(await get_collection_version(self.user, self.session), version + 4)
+        changes = await get_changes(self.user, self.session, since=version)
+        self.assertEqual(sorted((row.op, row.contact_id) for row in changes),
+                         sorted([("delete", second.id), ("update", first.id), ("create", created[0]),
+                                 ("create", created[1])]))
+
+    async def test_apply_contact_batch_all_failed_writes_nothing(self):
+        contact = await create_contact(self.user, self.session, self.contact(0))
+        version = await get_collection_version(self.user, self.session)
+        results = await apply_contact_batch(self.user, self.session, [
+            ContactBatchOperation(op="create", contact=self.contact(0)),
+            ContactBatchOperation(op="delete", id=contact.id + 1),
+        ])
+        self.assertEqual([result["status"] for result in results], [409, 404])
+        self.assertEqual(await get_collection_version(self.user, self.session), version)
+
+    async def test_get_upcoming_birthdays_across_new_year(self):
+        birthdays = [date(1990, 12, 27), date(1991, 12, 28), date(1992, 12, 31), date(1993, 1, 1), date(1994, 1, 4),
+                     date(1995, 1, 5), date(1996, 6, 1)]
+        for n, birthday in enumerate(birthdays):
+            await create_contact(self.user, self.session, self.contact(n, birthday=birthday))
+        await create_contact(User(id=2), self.session, self.contact(9, birthday=date(1990, 12, 30)))
+        result = await get_upcoming_birthdays(self.user, self.session, days=7, today=date(2026, 12, 28))
+        self.assertEqual([row.birthday for row in result], birthdays[1:5])
+
+    async def test_get_upcoming_birthdays_within_year(self):
+        birthdays = [date(1990, 2, 24), date(1991, 2, 25), date(1992, 2, 29), date(1993, 3, 4), date(1994, 3, 5),
+                     date(1995, 12, 31)]
+        for n, birthday in enumerate(birthdays):
+            await create_contact(self.user, self.session, self.contact(n, birthday=birthday))
+        result = await get_upcoming_birthdays(self.user, self.session, days=7, today=date(2027, 2, 25))
+        self.assertEqual([row.birthday for row in result], birthdays[1:4])
+
+
+
+class TestContactsAioSqlite(TestContactsSqlite):
+    """
+    Runs the SQLite tests on an ``AsyncSession``, as in async database mode.
+    """
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(User), USERS)
+        self.session = async_sessionmaker(bind=self.engine, autoflush=False, expire_on_commit=False)()
+        self.user = await self.session.get(User, 1)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+
 
 if __name__ == '__main__':
     unittest.main()
-
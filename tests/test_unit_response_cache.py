@@ -0,0 +1,32 @@
+import unittest
+
+import fakeredis
+
+from REST_API.services.response_cache import ResponseCache
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache()
+        self.cache.init(fakeredis.aioredis.FakeRedis(decode_responses=True))
+
+    async def test_miss_then_hit(self):
+        self.assertIsNone(await self.cache.get(1, 3, "list", {"skip": 0}))
+        await self.cache.set(1, 3, "list", {"skip": 0}, "[]", ttl=60)
+        self.assertEqual(await self.cache.get(1, 3, "list", {"skip": 0}), "[]")
+        self.assertIsNone(await self.cache.get(1, 3, "list", {"skip": 10}))
+        self.assertIsNone(await self.cache.get(2, 3, "list", {"skip": 0}))
+
+    async def test_new_version_misses(self):
+        await self.cache.set(1, 3, "list", {}, "[]", ttl=60)
+        self.assertIsNone(await self.cache.get(1, 4, "list", {}))
+
+    async def test_disabled_without_redis(self):
+        cache = ResponseCache()
+        await cache.set(1, 3, "list", {}, "[]", ttl=60)
+        self.assertIsNone(await cache.get(1, 3, "list", {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
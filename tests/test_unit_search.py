@@ -0,0 +1,44 @@
+import re
+import unittest
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from REST_API.database.models import Contact
+from REST_API.database.search import normalize, search_text, tokenize, fts_match_expression, word_prefix_pattern
+
+
+class TestSearch(unittest.TestCase):
+
+    def test_normalize(self):
+        self.assertEqual(normalize("  José   ÁLVAREZ "), "jose alvarez")
+        self.assertEqual(normalize(None), "")
+
+    def test_search_text(self):
+        self.assertEqual(search_text("John", "Doe", "John.Doe@Example.com"), "john doe john.doe@example.com")
+        self.assertEqual(search_text("John", "Doe", None), "john doe")
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Jo  DOE@ex"), ["jo", "doe", "ex"])
+        self.assertEqual(tokenize('"*'), [])
+
+    def test_fts_match_expression(self):
+        self.assertEqual(fts_match_expression(["jo", "doe"]), '"jo"* "doe"*')
+
+    def test_word_prefix_pattern_matches_word_starts_only(self):
+        text = search_text("John", "Doe", "John.Doe@Example.com")
+        # The same pattern in Python syntax, which has no POSIX classes
+        matches = lambda token: re.search(word_prefix_pattern(token).replace("[^[:alnum:]]", r"[\W_]"), text)
+        for token in ("jo", "doe", "exam", "com"):
+            self.assertIsNotNone(matches(token), token)
+        for token in ("oe", "ample", "hn"):
+            self.assertIsNone(matches(token), token)
+        self.assertEqual(word_prefix_pattern("a_b%"), r"(^|[^[:alnum:]])a_b\%")
+
+    def test_word_prefix_pattern_compiles_to_postgres_regex(self):
+        stmt = select(Contact.id).filter(Contact.search_text.regexp_match(word_prefix_pattern("jo")))
+        self.assertIn("contacts.search_text ~", str(stmt.compile(dialect=postgresql.dialect())))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import time
+import unittest
+
+import fakeredis
+
+from REST_API.services.cache import TokenCache
+from REST_API.services.sessions import SessionStore
+
+
+class TestSessionStore(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        self.tokens = TokenCache(maxsize=10, max_ttl=900)
+        self.store = SessionStore(self.tokens, refresh_ttl=3600, access_ttl=900, max_sessions=2)
+        self.store.init(self.redis)
+
+    async def asyncTearDown(self):
+        await self.store.close()
+
+    async def test_rotate(self):
+        sid = await self.store.create("user@example.com", "jti-1")
+        self.assertTrue(await self.store.rotate("user@example.com", sid, "jti-1", "jti-2"))
+        self.assertTrue(await self.store.rotate("user@example.com", sid, "jti-2", "jti-3"))
+        self.assertFalse(await self.store.rotate("user@example.com", "unknown", "jti-3", "jti-4"))
+
+    async def test_reuse_revokes_session(self):
+        sid = await self.store.create("user@example.com", "jti-1")
+        await self.store.rotate("user@example.com", sid, "jti-1", "jti-2")
+        self.assertFalse(await self.store.rotate("user@example.com", sid, "jti-1", "jti-3"))
+        self.assertFalse(await self.store.rotate("user@example.com", sid, "jti-2", "jti-3"))
+        self.assertTrue(self.tokens.is_revoked(b"key", {"sid": sid}))
+        self.assertEqual(await self.store.sessions("user@example.com"), [])
+
+    async def test_oldest_sessions_are_evicted(self):
+        sids = [await self.store.create("user@example.com", f"jti-{n}") for n in range(3)]
+        self.assertEqual({sid for sid, _ in await self.store.sessions("user@example.com")}, set(sids[1:]))
+        self.assertTrue(self.tokens.is_revoked(b"key", {"sid": sids[0]}))
+        self.assertFalse(await self.store.rotate("user@example.com", sids[0], "jti-0", "jti-9"))
+
+    async def test_revoke_all(self):
+        sids = [await self.store.create("user@example.com", f"jti-{n}") for n in range(2)]
+        other = await self.store.create("other@example.com", "jti-0")
+        await self.store.revoke_all("user@example.com")
+        self.assertEqual(await self.store.sessions("user@example.com"), [])
+        self.assertTrue(all(self.tokens.is_revoked(b"key", {"sid": sid}) for sid in sids))
+        self.assertTrue(self.tokens.is_revoked(b"key", {"sub": "user@example.com", "iat": int(time.time()) - 1}))
+        self.assertTrue(await self.store.rotate("other@example.com", other, "jti-0", "jti-1"))
+
+    async def test_revocations_reach_other_workers(self):
+        tokens = TokenCache(maxsize=10, max_ttl=900)
+        worker = SessionStore(tokens, refresh_ttl=3600, access_ttl=900, max_sessions=2)
+        worker.init(self.redis)
+        await self.store.deny(["before-start"])
+        await worker.start()
+        await asyncio.sleep(0.1)
+        sid = await self.store.create("user@example.com", "jti-1")
+        await self.store.revoke("user@example.com", sid)
+        for _ in range(50):
+            if tokens.is_revoked(b"key", {"sid": sid}):
+                break
+            await asyncio.sleep(0.01)
+        self.assertTrue(tokens.is_revoked(b"key", {"sid": sid}))
+        self.assertTrue(tokens.is_revoked(b"key", {"jti": "before-start"}))
+        await worker.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
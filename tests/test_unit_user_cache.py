@@ -0,0 +1,138 @@
+import json
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from fastapi import HTTPException
+from jose import jwt
+from redis.exceptions import RedisError
+
+from REST_API.database.models import User
+from REST_API.services.auth import auth_service
+from REST_API.services.cache import LRUCache, TokenCache, UserCache, token_cache, user_cache
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_expires_entries(self):
+        cache = LRUCache(maxsize=2, ttl=10)
+        with patch("REST_API.services.cache.time.monotonic", return_value=100):
+            cache.set("a", 1)
+        with patch("REST_API.services.cache.time.monotonic", return_value=111):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+
+class TestUserCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.redis = AsyncMock()
+        self.redis.get.return_value = None
+        self.cache = UserCache(maxsize=10, ttl=30, redis_ttl=300)
+        self.cache.init(self.redis)
+        self.user = User(id=1, email="test@example.com", password="hash", confirmed=True)
+
+    async def test_miss_then_local_hit(self):
+        self.assertIsNone(await self.cache.get(self.user.email))
+        await self.cache.set(self.user)
+        cached = await self.cache.get(self.user.email)
+        self.assertEqual(cached.id, 1)
+        self.assertTrue(cached.confirmed)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    async def test_sensitive_fields_are_not_cached(self):
+        await self.cache.set(self.user)
+        stored = json.loads(self.redis.set.call_args.args[1])
+        self.assertNotIn("password", stored)
+
+    async def test_redis_hit_fills_local_tier(self):
+        self.redis.get.return_value = json.dumps({"id": 1, "email": self.user.email, "confirmed": True})
+        self.assertEqual((await self.cache.get(self.user.email)).id, 1)
+        self.assertEqual((await self.cache.get(self.user.email)).id, 1)
+        self.redis.get.assert_awaited_once()
+        self.assertEqual(self.cache.stats()["redis_hits"], 1)
+
+    async def test_redis_errors_are_misses(self):
+        self.redis.get.side_effect = RedisError
+        self.assertIsNone(await self.cache.get(self.user.email))
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    async def test_invalidate(self):
+        await self.cache.set(self.user)
+        await self.cache.invalidate(self.user.email)
+        self.assertIsNone(await self.cache.get(self.user.email))
+        self.redis.delete.assert_awaited_once_with("auth:user:test@example.com")
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = TokenCache(maxsize=10, max_ttl=900)
+        self.key = TokenCache.key("header.payload.signature")
+        self.claims = {"sub": "test@example.com", "iat": int(time.time()) - 1, "exp": time.time() + 60}
+
+    def test_caches_until_exp(self):
+        self.assertIsNone(self.cache.get(self.key))
+        self.cache.set(self.key, self.claims)
+        self.assertEqual(self.cache.get(self.key), self.claims)
+        with patch("REST_API.services.cache.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertIsNone(self.cache.get(self.key))
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_expired_token_is_not_cached(self):
+        self.cache.set(self.key, {**self.claims, "exp": time.time() - 1})
+        self.assertIsNone(self.cache.get(self.key))
+
+    def test_revoke(self):
+        self.cache.set(self.key, self.claims)
+        self.cache.revoke(self.key, self.claims)
+        self.assertIsNone(self.cache.get(self.key))
+        self.assertTrue(self.cache.is_revoked(self.key, self.claims))
+
+    def test_revoke_subject(self):
+        self.cache.revoke_subject("test@example.com")
+        self.assertTrue(self.cache.is_revoked(self.key, self.claims))
+        self.assertFalse(self.cache.is_revoked(self.key, {**self.claims, "iat": int(time.time()) + 1}))
+        self.assertFalse(self.cache.is_revoked(self.key, {**self.claims, "sub": "other@example.com"}))
+
+
+class TestCurrentUser(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        token_cache.claims.clear()
+        user_cache.local.set("cached@example.com", {"id": 7, "email": "cached@example.com", "confirmed": True})
+        self.token = await auth_service.create_access_token({"sub": "cached@example.com"})
+
+    async def asyncTearDown(self):
+        user_cache.local.pop("cached@example.com")
+        token_cache.revoked_subjects.clear()
+
+    async def test_verifies_token_once(self):
+        with patch("REST_API.services.auth.jwt.decode", wraps=jwt.decode) as decode:
+            for _ in range(3):
+                self.assertEqual((await auth_service.get_current_user(self.token, None)).id, 7)
+        decode.assert_called_once()
+
+    async def test_revoked_subject_is_rejected(self):
+        await auth_service.get_current_user(self.token, None)
+        # A second later, so the token's iat is before the revocation
+        with patch("REST_API.services.cache.time.time", return_value=time.time() + 1):
+            token_cache.revoke_subject("cached@example.com")
+        with self.assertRaises(HTTPException) as e:
+            await auth_service.get_current_user(self.token, None)
+        self.assertEqual(e.exception.status_code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
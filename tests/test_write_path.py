@@ -0,0 +1,9 @@
+import asyncio
+from argparse import Namespace
+
+from benchmarks.write_path import run
+
+
+def test_returning_saves_round_trips(tmp_path):
+    args = Namespace(database=tmp_path / "writes.db", contacts=100, repeat=5, check=True)
+    assert asyncio.run(run(args)) == 0